@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: loading the patient mapping from the CSV vs. the compiled snapshot.
+
+For each size, writes a synthetic patient CSV (benchmarks/synthetic.py) and
+measures PatientPharmacyLookup.load_csv_data():
+- csv: parsing the CSV (snapshot disabled)
+- build: parsing the CSV and writing the snapshot (first run)
+- snapshot: loading the snapshot (CSV unchanged)
+
+Times are the best of --repeat runs. Memory (Python allocations, via
+tracemalloc) is measured in separate runs: "peak" during the load and
+"kept" by the loaded index afterwards.
+
+Usage:
+    python benchmarks/bench_csv_load.py [--rows 10000 100000 1000000]
+        [--repeat 3] [--no-memory] [--seed 1]
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.csv_lookup import PatientPharmacyLookup
+from synthetic import make_patients, pharmacy_keys, write_kim_csv, write_patient_csv
+
+
+def load(patient_csv: Path, kim_csv: Path, snapshot_file) -> PatientPharmacyLookup:
+    """Load a lookup with the [INFO] output suppressed."""
+    lookup = PatientPharmacyLookup(patient_csv, kim_csv, snapshot_file)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not lookup.load_csv_data():
+            raise SystemExit("[ERROR] Loading the synthetic CSV failed")
+    return lookup
+
+
+def best_time(func, repeat: int) -> float:
+    """Best wall time of `repeat` calls in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def memory(func) -> tuple:
+    """
+    Python memory used by a call.
+
+    Returns:
+        Tuple of (peak MiB during the call, MiB still allocated by the result).
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20, current / 2**20
+
+
+def run_size(rows: int, folder: Path, repeat: int, with_memory: bool, seed: int) -> dict:
+    """Run all measurements for one CSV size."""
+    rng = random.Random(seed)
+    keys = pharmacy_keys(25)
+    patient_csv = folder / f"patients_{rows}.csv"
+    kim_csv = folder / "kim.csv"
+    snapshot_file = folder / f"patients_{rows}.snapshot"
+    write_patient_csv(patient_csv, make_patients(rows, keys, rng))
+    write_kim_csv(kim_csv, keys)
+
+    def build():
+        snapshot_file.unlink(missing_ok=True)
+        return load(patient_csv, kim_csv, snapshot_file)
+
+    result = {
+        "rows": rows,
+        "csv_mb": patient_csv.stat().st_size / 2**20,
+        "csv_s": best_time(lambda: load(patient_csv, kim_csv, None), repeat),
+        "build_s": best_time(build, repeat),
+        "snapshot_mb": snapshot_file.stat().st_size / 2**20,
+        "snapshot_s": best_time(lambda: load(patient_csv, kim_csv, snapshot_file), repeat),
+    }
+    if with_memory:
+        result["csv_mem"] = memory(lambda: load(patient_csv, kim_csv, None))
+        result["snapshot_mem"] = memory(lambda: load(patient_csv, kim_csv, snapshot_file))
+
+    patient_csv.unlink()
+    snapshot_file.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc runs")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>9} {'csv MiB':>8} {'csv s':>7} {'build s':>8} {'snap MiB':>9}"
+        f" {'snap s':>7} {'speedup':>8}"
+        + ("" if args.no_memory else f" {'csv peak/kept MiB':>18} {'snap peak/kept MiB':>19}")
+    )
+    with tempfile.TemporaryDirectory(prefix="erezept_csv_") as folder:
+        for rows in args.rows:
+            r = run_size(rows, Path(folder), args.repeat, not args.no_memory, args.seed)
+            line = (
+                f"{r['rows']:>9} {r['csv_mb']:>8.1f} {r['csv_s']:>7.3f} {r['build_s']:>8.3f}"
+                f" {r['snapshot_mb']:>9.1f} {r['snapshot_s']:>7.3f} {r['csv_s'] / r['snapshot_s']:>7.1f}x"
+            )
+            if not args.no_memory:
+                line += (
+                    f" {r['csv_mem'][0]:>9.1f}/{r['csv_mem'][1]:<8.1f}"
+                    f" {r['snapshot_mem'][0]:>10.1f}/{r['snapshot_mem'][1]:<8.1f}"
+                )
+            print(line, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: patient extraction throughput.
+
+Compares PatientExtractor (src/pdf_processor.py) with the previous
+implementation of extract_patient_info, which ran up to six uncompiled
+re.search calls over the whole text. Both are first checked for identical
+results on the unit test fixtures and on a synthetic OCR corpus.
+
+Usage:
+    python benchmarks/bench_extractor.py [--documents 20000] [--seed 1]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.pdf_processor import extract_patient_info
+
+
+def legacy_extract_patient_info(text):
+    """Previous extract_patient_info implementation (reference)."""
+    if not text:
+        return None
+    
+    pattern_same_line = r"für\s+geboren\s+am\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+(?:\s+[A-ZÄÖÜ][a-zäöüß]+)+)\s+(\d{2}\.\d{2}\.\d{4})"
+    
+    match = re.search(pattern_same_line, text, re.IGNORECASE)
+    if match:
+        name = match.group(1).strip()
+        birth_date = match.group(2).strip()
+        if not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
+            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
+    
+    pattern_separate = r"für\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+\s+[A-ZÄÖÜ][a-zäöüß]+)\s*[\r\n]+"
+    
+    match = re.search(pattern_separate, text)
+    if match:
+        name = match.group(1).strip()
+        date_match = re.search(r"geboren\s+am\s*[\r\n]+\s*(\d{2}\.\d{2}\.\d{4})", text, re.IGNORECASE)
+        if date_match and not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
+            birth_date = date_match.group(1).strip()
+            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
+    
+    name_match = re.search(r"für\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+\s+[A-ZÄÖÜ][a-zäöüß]+)", text)
+    date_match = re.search(r"geboren\s+am\s*[\r\n]+\s*(\d{2}\.\d{2}\.\d{4})", text, re.IGNORECASE)
+    
+    if name_match and date_match:
+        name = name_match.group(1).strip()
+        birth_date = date_match.group(1).strip()
+        if not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
+            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
+    
+    return None
+
+
+FIXTURES = [
+    "Ausdruck zur Einlösung Ihres E-Rezeptes\n\nfür geboren am\n\nHarry Heilmann 29.04.1949\n\n"
+    "ausgestellt von ausgestellt am\nDr. med. Tobias Frank 15.01.2026\n",
+    "Ausdruck zur Einlösung Ihres E-Rezeptes\n\nfür\n\nAstrid Pföhler\n\nausgestellt von\n\n"
+    "Dr. med. Tobias Frank\nNeuro GP Göttingen\n\ngeboren am\n\n27.03.1939\n\nausgestellt am\n\n15.01.2026\n",
+    "für\n\nElisabeth Großmann\n\ngeboren am\n\n16.08.1946\n",
+    "für\n\nDr. med. Tobias Frank\n\ngeboren am\n\n01.01.1970\n",
+    "",
+    "This is just random text without any patient information.",
+    "Praxis İstanbul\nFÜR GEBOREN AM\nHarry Heilmann 29.04.1949\n",
+]
+
+FIRST_NAMES = ["Harry", "Astrid", "Elisabeth", "Reinhold", "Ömer", "Jürgen", "Anna Maria", "Tobias"]
+LAST_NAMES = ["Heilmann", "Pföhler", "Großmann", "Hartje", "Frank", "Überall", "Messerschmidt"]
+NOISE = [
+    "Ausdruck zur Einlösung Ihres E-Rezeptes",
+    "ausgestellt von",
+    "Dr. med. Tobias Frank",
+    "Neuro GP Göttingen",
+    "Rezeptcode: 160.000.100.000.001.07",
+    "Bitte bringen Sie diesen Ausdruck in Ihre Apotheke",
+    "Levetiracetam 500 mg Filmtabletten N3 200 St. PZN 04940215",
+    "Dosierung: 1-0-1 Dosierangabe auf Medikationsplan",
+    "Zuzahlung: gebührenpflichtig",
+    "Die Einlösung ist in jeder Apotheke möglich, die am E-Rezept teilnimmt.",
+    "Scannen Sie den Code mit der E-Rezept-App oder legen Sie den Ausdruck vor.",
+    "Seite 1 von 1",
+]
+
+
+def synthetic_document(rng: random.Random) -> str:
+    """Generate one OCR-like text in a random layout, with noise and errors."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    date = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1920, 2010)}"
+    newline = rng.choice(["\n", "\n\n", "\r\n"])
+    fuer = rng.choice(["für", "für", "Für", "fur"])
+    layout = rng.random()
+    
+    if layout < 0.45:
+        lines = [f"{fuer} geboren am", f"{name} {date}"]
+    elif layout < 0.9:
+        lines = [fuer, name, rng.choice(NOISE), "geboren am", date]
+    else:
+        lines = [fuer, rng.choice(NOISE), "geboren am", rng.choice([date, "unleserlich"])]
+    
+    # Header noise before, medication and footer lines after the patient block
+    lines = rng.sample(NOISE, 2) + lines + rng.sample(NOISE * 3, rng.randint(6, 24))
+    return newline.join(lines) + newline
+
+
+def check_equivalence(documents) -> None:
+    """Fail loudly if the new extractor differs from the reference."""
+    for text in documents:
+        expected = legacy_extract_patient_info(text)
+        actual = extract_patient_info(text)
+        if actual is not None:
+            actual = {k: v for k, v in actual.items() if k != "format"}
+        if actual != expected:
+            raise AssertionError(f"Mismatch for {text!r}: {actual} != {expected}")
+
+
+def measure(function, documents, rounds: int = 3) -> float:
+    """Return the best documents/second over several rounds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in documents:
+            function(text)
+        best = min(best, time.perf_counter() - start)
+    return len(documents) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    corpus = [synthetic_document(rng) for _ in range(args.documents)]
+    
+    check_equivalence(FIXTURES)
+    check_equivalence(corpus)
+    print(f"Results identical on {len(FIXTURES)} fixtures and {len(corpus)} synthetic documents")
+    
+    for label, documents in (("fixtures", FIXTURES * 1000), ("synthetic", corpus)):
+        legacy = measure(legacy_extract_patient_info, documents)
+        current = measure(extract_patient_info, documents)
+        print(
+            f"{label:10s} legacy: {legacy:10.0f} docs/s   "
+            f"extractor: {current:10.0f} docs/s   speedup: {current / legacy:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
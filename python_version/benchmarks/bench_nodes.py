@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput of several main.py --node processes on one input folder.
+
+For each node count, generates the same synthetic data set (benchmarks/
+synthetic.py) in a fresh temporary base folder, starts that many
+`main.py --node` processes at once (EREZEPT_BASE_DIR) and reports:
+- wall time until the last node exits, documents per second, speedup
+  over one node
+- PDFs processed per node (how evenly the leases spread the work)
+- PDFs routed more than once or lost (must both be 0); content duplicates
+  of the synthetic data stay in the input folder and are counted apart
+
+All nodes run on this machine, so the speedup is bounded by its CPU
+count; on several hosts sharing the input folder it is bounded by the
+share instead.
+
+Usage:
+    python benchmarks/bench_nodes.py [--nodes 1 2 4] [--documents 200]
+        [--patients 10000] [--image] [--seed 1]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from synthetic import generate_dataset
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+_PROCESSED_PATTERN = re.compile(r"\[INFO\] Node \S+ processed (\d+) PDF")
+
+
+def run_nodes(nodes: int, args: argparse.Namespace) -> dict:
+    """Run `nodes` processes on a fresh data set and collect the results."""
+    base_dir = Path(tempfile.mkdtemp(prefix="erezept_nodes_"))
+    try:
+        expected = generate_dataset(
+            base_dir, documents=args.documents, patients=args.patients, image=args.image, seed=args.seed
+        )
+        env = dict(os.environ, EREZEPT_BASE_DIR=str(base_dir))
+
+        # Build the patient snapshot once, so no node pays for it
+        subprocess.run(
+            [sys.executable, "-c", "from src.csv_lookup import PatientPharmacyLookup; PatientPharmacyLookup().load_csv_data()"],
+            cwd=PROJECT_DIR, env=env, capture_output=True,
+        )
+
+        start = time.perf_counter()
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "main.py", "--node", "--node-id", f"node-{number}"],
+                cwd=PROJECT_DIR,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+            for number in range(nodes)
+        ]
+        outputs = [process.communicate()[0] for process in processes]
+        wall_seconds = time.perf_counter() - start
+
+        per_node = []
+        for output in outputs:
+            match = _PROCESSED_PATTERN.search(output)
+            per_node.append(int(match.group(1)) if match else 0)
+
+        routed = {}
+        for pdf_path in (base_dir / "output").rglob("*.pdf"):
+            name = pdf_path.name
+            if name not in expected:
+                # "<name>_1.pdf" is a second copy of "<name>.pdf"
+                name = re.sub(r"_\d+\.pdf$", ".pdf", name)
+            routed[name] = routed.get(name, 0) + 1
+
+        left = {path.name for path in (base_dir / "input").glob("*.pdf")}
+
+        return {
+            "nodes": nodes,
+            "wall_seconds": wall_seconds,
+            "docs_per_second": len(expected) / wall_seconds,
+            "per_node": per_node,
+            "twice": sum(1 for count in routed.values() if count > 1),
+            "left": len(left),
+            "missing": sum(1 for name in expected if name not in routed and name not in left),
+        }
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--image", action="store_true", help="Image-only PDFs (full OCR path)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.documents} documents, {os.cpu_count()} CPU(s)")
+    print(f"{'nodes':>5} {'wall s':>8} {'docs/s':>8} {'speedup':>8} {'twice':>6} {'left':>5} {'missing':>8}  per node")
+    baseline = None
+    for nodes in args.nodes:
+        result = run_nodes(nodes, args)
+        baseline = baseline or result["docs_per_second"]
+        print(
+            f"{nodes:>5} {result['wall_seconds']:>8.2f} {result['docs_per_second']:>8.1f}"
+            f" {result['docs_per_second'] / baseline:>7.2f}x {result['twice']:>6} {result['left']:>5}"
+            f" {result['missing']:>8}"
+            f"  {result['per_node']}",
+            flush=True,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-page cost of the OCR engines.
+
+OCRs synthetic prescription pages (benchmarks/synthetic.py) with every
+installed engine (src/pdf_processor.py: tesserocr, pytesseract) in the two
+configurations analyze_pdf() uses: the patient header region (OCR_ROI_*)
+and the full page (OCR_DPI, OCR_PSM). Rendering is left out; the page
+images are drawn once up front.
+
+Reports per engine and configuration:
+- setup: creating the engine and the first call (loads the language data)
+- p50 / p95 per page afterwards
+- how many pages yielded the right patient
+
+The difference of the p50 values is the fixed per-page overhead of
+starting tesseract as a process (pytesseract) that tesserocr avoids.
+
+Usage:
+    python benchmarks/bench_ocr_engine.py [--pages 20] [--seed 1]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import OCR_DPI, OCR_PSM, OCR_ROI_BOX, OCR_ROI_DPI, OCR_ROI_PSM
+from src.metrics import percentile
+from src.pdf_processor import create_ocr_engine, extract_patient_info
+from synthetic import make_page_image, make_patients, pharmacy_keys, prescription_lines
+
+
+def make_pages(count: int, dpi: int, region, seed: int) -> list:
+    """
+    Draw prescription pages.
+
+    Returns:
+        List of (image, expected patient name).
+    """
+    rng = random.Random(seed)
+    pages = []
+    for patient in make_patients(count, pharmacy_keys(3), rng):
+        image = make_page_image(prescription_lines(patient, rng.choice("AB")), dpi)
+        if region:
+            left, top, right, bottom = region
+            width, height = image.size
+            image = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+        pages.append((image, f"{patient['first_name']} {patient['last_name']}"))
+    return pages
+
+
+def run_engine(name: str, pages: list, psm: int) -> dict:
+    """OCR all pages with one engine."""
+    start = time.perf_counter()
+    engine = create_ocr_engine(name)
+    if engine.name != name:
+        return None
+    engine.image_to_string(pages[0][0], psm)
+    setup = time.perf_counter() - start
+
+    times = []
+    correct = 0
+    for image, expected in pages:
+        start = time.perf_counter()
+        text = engine.image_to_string(image, psm)
+        times.append(time.perf_counter() - start)
+        info = extract_patient_info(text)
+        correct += bool(info and info["name"] == expected)
+
+    times.sort()
+    return {
+        "setup_ms": setup * 1000,
+        "p50_ms": percentile(times, 0.50) * 1000,
+        "p95_ms": percentile(times, 0.95) * 1000,
+        "correct": correct,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    configurations = [
+        ("region", OCR_ROI_DPI, OCR_ROI_PSM, OCR_ROI_BOX),
+        ("full page", OCR_DPI, OCR_PSM, None),
+    ]
+    print(f"{'configuration':<14} {'engine':<12} {'setup ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'correct':>9}")
+    for label, dpi, psm, region in configurations:
+        pages = make_pages(args.pages, dpi, region, args.seed)
+        p50 = {}
+        for name in ("pytesseract", "tesserocr"):
+            try:
+                result = run_engine(name, pages, psm)
+            except (ImportError, OSError):
+                # Package or tesseract binary / language data missing
+                result = None
+            if result is None:
+                print(f"{label:<14} {name:<12} {'not available':>9}")
+                continue
+            p50[name] = result["p50_ms"]
+            print(
+                f"{label:<14} {name:<12} {result['setup_ms']:>9.0f} {result['p50_ms']:>8.0f}"
+                f" {result['p95_ms']:>8.0f} {result['correct']:>5}/{len(pages)}"
+            )
+        if len(p50) == 2:
+            print(f"{'':<14} saved per page: {p50['pytesseract'] - p50['tesserocr']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
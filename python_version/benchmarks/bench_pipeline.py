@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark: end-to-end throughput of main.py on synthetic prescriptions.
+
+Generates N synthetic PDFs (layouts A and B) and a patient CSV of the given
+size in a temporary base folder (benchmarks/synthetic.py), runs main.py on
+it in a subprocess (EREZEPT_BASE_DIR) and reports:
+- documents per second (whole run, including start-up and CSV load)
+- p50 / p95 / max per stage, from the metrics JSONL written by main.py
+- peak RSS of the main.py process tree (where the platform reports it)
+- routing accuracy against the generated ground truth
+
+The result is printed and saved as JSON for comparing runs.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--documents 200] [--patients 10000]
+        [--mode serial|parallel|pipeline] [--workers N] [--image]
+        [--seed 1] [--output results.json] [--keep]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.metrics import STAGE_ORDER, percentile
+from synthetic import generate_dataset
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak RSS of the largest finished child process in MiB.
+
+    Returns:
+        Peak RSS, or None where resource is not available (Windows).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def read_metrics(logs_folder: Path) -> list:
+    """Read all entries of the metrics JSONL files."""
+    entries = []
+    for metrics_file in sorted(logs_folder.glob("metrics_*.jsonl")):
+        with open(metrics_file, "r", encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    return entries
+
+
+def stage_latencies(entries: list) -> dict:
+    """p50 / p95 / max wall milliseconds per stage."""
+    samples = {}
+    for entry in entries:
+        for stage, timing in entry["stages"].items():
+            samples.setdefault(stage, []).append(timing["wall_ms"])
+
+    order = STAGE_ORDER + sorted(set(samples) - set(STAGE_ORDER))
+    latencies = {}
+    for stage in order:
+        if stage in samples:
+            values = sorted(samples[stage])
+            latencies[stage] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50),
+                "p95_ms": percentile(values, 0.95),
+                "max_ms": values[-1],
+            }
+    return latencies
+
+
+def routing_accuracy(base_dir: Path, expected: dict) -> dict:
+    """Compare the output folders with the generated ground truth."""
+    actual = {}
+    for folder in (base_dir / "output").glob("*"):
+        if folder.is_dir():
+            for pdf_path in folder.glob("*.pdf"):
+                actual[pdf_path.name] = folder.name
+
+    correct = sum(1 for name, destination in expected.items() if actual.get(name) == destination)
+    return {
+        "correct": correct,
+        "wrong": sum(1 for name, destination in expected.items() if name in actual and actual[name] != destination),
+        "missing": sum(1 for name in expected if name not in actual),
+    }
+
+
+def run_benchmark(args: argparse.Namespace, base_dir: Path) -> dict:
+    """Generate the data set, run main.py once and collect the results."""
+    start = time.perf_counter()
+    expected = generate_dataset(
+        base_dir,
+        documents=args.documents,
+        patients=args.patients,
+        image=args.image,
+        seed=args.seed,
+    )
+    generate_seconds = time.perf_counter() - start
+    print(f"[INFO] Generated {len(expected)} PDFs and {args.patients} patients in {generate_seconds:.1f}s")
+
+    command = [sys.executable, str(PROJECT_DIR / "main.py"), "--mode", args.mode]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    env = dict(os.environ, EREZEPT_BASE_DIR=str(base_dir))
+
+    print(f"[INFO] Running: {' '.join(command)}")
+    start = time.perf_counter()
+    with open(base_dir / "main_output.txt", "w", encoding="utf-8") as log:
+        completed = subprocess.run(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wall_seconds = time.perf_counter() - start
+
+    entries = read_metrics(base_dir / "logs")
+    statuses = {}
+    for entry in entries:
+        statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parameters": {
+            "documents": args.documents,
+            "patients": args.patients,
+            "mode": args.mode,
+            "workers": args.workers,
+            "image": args.image,
+            "seed": args.seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "exit_code": completed.returncode,
+        "wall_seconds": round(wall_seconds, 3),
+        "docs_per_second": round(len(expected) / wall_seconds, 2) if wall_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "statuses": statuses,
+        "routing": routing_accuracy(base_dir, expected),
+        "stages": stage_latencies(entries),
+    }
+
+
+def print_results(results: dict) -> None:
+    """Print the benchmark results."""
+    print()
+    print(f"Mode:        {results['parameters']['mode']}")
+    print(f"Documents:   {results['parameters']['documents']} ({'image' if results['parameters']['image'] else 'text layer'})")
+    print(f"Wall time:   {results['wall_seconds']:.2f}s (exit code {results['exit_code']})")
+    print(f"Throughput:  {results['docs_per_second']} docs/s")
+    print(f"Peak RSS:    {results['peak_rss_mb']} MiB")
+    print(f"Statuses:    {results['statuses']}")
+    print(f"Routing:     {results['routing']}")
+    print()
+    print(f"  {'stage':<11} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for stage, stats in results["stages"].items():
+        print(
+            f"  {stage:<11} {stats['count']:>6} {stats['p50_ms']:>9.1f}"
+            f" {stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--mode", choices=["serial", "parallel", "pipeline"], default="serial")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--image", action="store_true", help="Image-only PDFs (full OCR path)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, default=None, help="Save results as JSON")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary base folder")
+    args = parser.parse_args()
+
+    base_dir = Path(tempfile.mkdtemp(prefix="erezept_bench_"))
+    try:
+        results = run_benchmark(args, base_dir)
+    finally:
+        if args.keep:
+            print(f"[INFO] Kept base folder: {base_dir}")
+        else:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    print_results(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n[INFO] Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
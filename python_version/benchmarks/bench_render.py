@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: page rendering speed and peak memory.
+
+Writes N synthetic image-only prescription PDFs (benchmarks/synthetic.py)
+and renders the first page of each at OCR_DPI with:
+- rgb: pdf2image.convert_from_path, the renderer used before (if installed)
+- gray: src.pdf_processor.render_page (pdftoppm -gray into memory)
+- threshold: render_page binarized at --threshold
+
+Every renderer runs in a fresh interpreter over the whole batch, rendering
+one page at a time and releasing it like extract_text_from_pdf() does, so
+the reported peak RSS is that of a batch run and not of a single page.
+OCR is left out; see bench_ocr_engine.py for that and
+`bench_pipeline.py --image --documents 500` for the peak RSS of main.py.
+
+Usage:
+    python benchmarks/bench_render.py [--documents 500] [--threshold 160]
+        [--seed 1]
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import OCR_DPI
+from synthetic import make_image_pdf, make_patients, pharmacy_keys, prescription_lines
+
+RENDERERS = ("rgb", "gray", "threshold")
+
+
+def render_batch(renderer: str, folder: Path, threshold: int) -> dict:
+    """
+    Render every PDF in a folder (runs in the child interpreter).
+
+    Returns:
+        Dict with pages, seconds, image mode, bytes per page image and the
+        peak RSS of this process in MiB.
+    """
+    import resource
+
+    if renderer == "rgb":
+        from pdf2image import convert_from_path
+
+        def render(pdf_path):
+            return convert_from_path(pdf_path, dpi=OCR_DPI, first_page=1, last_page=1)[0]
+    else:
+        from src.pdf_processor import render_page
+
+        def render(pdf_path):
+            return render_page(pdf_path, 1, OCR_DPI, threshold=threshold if renderer == "threshold" else None)
+
+    pdf_files = sorted(folder.glob("*.pdf"))
+    start = time.perf_counter()
+    for pdf_path in pdf_files:
+        image = render(pdf_path)
+        mode, size = image.mode, len(image.tobytes())
+        image.close()
+    seconds = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "pages": len(pdf_files),
+        "seconds": seconds,
+        "mode": mode,
+        "image_mb": size / 2**20,
+        # Linux reports KiB, macOS bytes
+        "peak_rss_mb": peak / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def run_renderer(renderer: str, folder: Path, threshold: int) -> dict:
+    """Run one renderer in a fresh interpreter; None if it is not available."""
+    completed = subprocess.run(
+        [sys.executable, __file__, "--child", renderer, str(folder), "--threshold", str(threshold)],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        last_line = (completed.stderr.strip().splitlines() or ["failed"])[-1]
+        print(f"{renderer:<10} not available: {last_line}")
+        return None
+    return json.loads(completed.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--threshold", type=int, default=160)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--child", nargs=2, metavar=("RENDERER", "FOLDER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        renderer, folder = args.child
+        print(json.dumps(render_batch(renderer, Path(folder), args.threshold)))
+        return
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="erezept_render_") as folder:
+        folder = Path(folder)
+        for number, patient in enumerate(make_patients(args.documents, pharmacy_keys(3), rng)):
+            pdf = make_image_pdf(prescription_lines(patient, rng.choice("AB")))
+            (folder / f"rezept_{number:05d}.pdf").write_bytes(pdf)
+
+        print(f"{args.documents} documents, {OCR_DPI} dpi")
+        print(f"{'renderer':<10} {'mode':>4} {'pages/s':>8} {'image MiB':>10} {'peak RSS MiB':>13}")
+        for renderer in RENDERERS:
+            result = run_renderer(renderer, folder, args.threshold)
+            if result is None:
+                continue
+            print(
+                f"{renderer:<10} {result['mode']:>4} {result['pages'] / result['seconds']:>8.1f}"
+                f" {result['image_mb']:>10.1f} {result['peak_rss_mb']:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
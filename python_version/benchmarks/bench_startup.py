@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: start-up time of main.py with an empty input folder.
+
+Scheduled runs mostly find no PDFs, so this path should cost little more
+than starting the interpreter. Runs main.py N times in a temporary base
+folder (EREZEPT_BASE_DIR) and reports min / median / max wall time,
+compared with a bare `python -c pass` and a budget. Exits with code 1 when
+the median is over budget, so it can be used as a check.
+
+With --importtime the slowest imports of `import main` are listed as well
+(python -X importtime).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--budget-ms 500]
+        [--importtime] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+def time_runs(command: list, env: dict, runs: int) -> list:
+    """
+    Run a command several times.
+
+    Args:
+        command: Command line.
+        env: Environment of the subprocess.
+        runs: Number of runs.
+
+    Returns:
+        Sorted wall times in milliseconds.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=PROJECT_DIR, env=env, capture_output=True, text=True)
+        times.append((time.perf_counter() - start) * 1000)
+        if completed.returncode != 0:
+            print(completed.stdout + completed.stderr)
+            raise SystemExit(f"[ERROR] {' '.join(command)} exited with code {completed.returncode}")
+    return sorted(times)
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """
+    Get the imports with the highest cumulative time for `import main`.
+
+    Args:
+        env: Environment of the subprocess.
+        top: Number of entries.
+
+    Returns:
+        List of (cumulative microseconds, module name).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            entries.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--importtime", action="store_true", help="List the slowest imports")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="erezept_startup_") as base_dir:
+        env = dict(os.environ, EREZEPT_BASE_DIR=base_dir)
+
+        interpreter = time_runs([sys.executable, "-c", "pass"], env, args.runs)
+        startup = time_runs([sys.executable, str(PROJECT_DIR / "main.py")], env, args.runs)
+
+        median = statistics.median(startup)
+        print(f"Runs:          {args.runs}")
+        print(f"Interpreter:   median {statistics.median(interpreter):.0f} ms")
+        print(
+            f"main.py:       min {startup[0]:.0f} ms, median {median:.0f} ms,"
+            f" max {startup[-1]:.0f} ms (budget {args.budget_ms:.0f} ms)"
+        )
+
+        if args.importtime:
+            print()
+            print(f"  {'cumulative ms':>13}  module")
+            for microseconds, module in slowest_imports(env, args.top):
+                print(f"  {microseconds / 1000:>13.1f}  {module}")
+
+    if median > args.budget_ms:
+        print(f"\n[ERROR] Median start-up {median:.0f} ms is over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
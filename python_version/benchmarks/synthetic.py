@@ -0,0 +1,294 @@
+"""
+Synthetic eRezept test data for the benchmarks.
+
+Generates a base folder laid out like python_version/ (data/, input/) with
+- data/patient_apo_mapping.csv: N patients in the practice software export
+  format (semicolon-delimited, UTF-8 with BOM, CRLF, APO key in column 35)
+- data/KIM_apo_mapping.CSV: one KIM address per pharmacy
+- input/*.pdf: prescriptions in layout A ("für geboren am" on one line) and
+  layout B (name and birth date on separate lines), either with a text
+  layer or as scanned images (no text layer, needs OCR)
+
+No real patient data is involved; names are drawn from fixed lists.
+"""
+import csv
+import io
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+FIRST_NAMES = [
+    "Harry", "Astrid", "Elisabeth", "Reinhold", "Bernd", "Gisela", "Jürgen",
+    "Ursula", "Günter", "Renate", "Klaus", "Brigitte", "Dieter", "Hannelore",
+    "Wolfgang", "Ingrid", "Manfred", "Helga", "Horst", "Karin", "Jörg",
+    "Bärbel", "Uwe", "Monika", "Heinz", "Erika", "Siegfried", "Rosemarie",
+]
+LAST_NAMES = [
+    "Heilmann", "Pföhler", "Großmann", "Hartje", "Messerschmidt", "Müller",
+    "Schäfer", "Köhler", "Weiß", "Böhm", "Krüger", "Schröder", "Wagner",
+    "Becker", "Hoffmann", "Schulz", "Koch", "Richter", "Klein", "Wolf",
+    "Neumann", "Schwarz", "Zimmermann", "Braun", "Hofmann", "Lange", "Fuchs",
+    "Jäger", "Vogel", "Günther", "Lehmann", "Sommer", "Bäcker", "Löffler",
+]
+
+# Column count and positions of the practice software export
+CSV_COLUMN_COUNT = 45
+CSV_LAST_NAME = 2
+CSV_FIRST_NAME = 4
+CSV_BIRTH_DATE = 5
+CSV_SOZIALANAMNESE = 34
+
+
+def pharmacy_keys(count: int) -> List[str]:
+    """
+    Create APO keys (letters only, as matched by APO_[A-Z_]+).
+
+    Args:
+        count: Number of pharmacies.
+
+    Returns:
+        Keys like "APO_SYN_A", "APO_SYN_B", ..., "APO_SYN_AA", ...
+    """
+    keys = []
+    for i in range(count):
+        suffix = ""
+        n = i + 1
+        while n:
+            n, remainder = divmod(n - 1, 26)
+            suffix = chr(ord("A") + remainder) + suffix
+        keys.append(f"APO_SYN_{suffix}")
+    return keys
+
+
+def make_patients(
+    count: int,
+    pharmacies: List[str],
+    rng: random.Random,
+    years: Tuple[int, int] = (1925, 1995)
+) -> List[dict]:
+    """
+    Create unique synthetic patients.
+
+    Args:
+        count: Number of patients.
+        pharmacies: APO keys to assign.
+        rng: Random number generator.
+        years: Range of birth years.
+
+    Returns:
+        List of dicts with 'first_name', 'last_name', 'birth_date', 'apo_key'.
+    """
+    patients = []
+    seen = set()
+    while len(patients) < count:
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        birth_date = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(*years)}"
+        if (first, last, birth_date) in seen:
+            continue
+        seen.add((first, last, birth_date))
+        patients.append({
+            "first_name": first,
+            "last_name": last,
+            "birth_date": birth_date,
+            "apo_key": rng.choice(pharmacies),
+        })
+    return patients
+
+
+def write_patient_csv(path: Path, patients: List[dict]) -> None:
+    """Write patients in the practice software export format."""
+    header = [f"Spalte {i + 1}" for i in range(CSV_COLUMN_COUNT)]
+    header[CSV_LAST_NAME] = "Name"
+    header[CSV_FIRST_NAME] = "Vorname"
+    header[CSV_BIRTH_DATE] = "Geburtsdatum"
+    header[CSV_SOZIALANAMNESE] = "Inhalt"
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";", lineterminator="\r\n")
+        writer.writerow(header)
+        for number, patient in enumerate(patients, 1):
+            row = [""] * CSV_COLUMN_COUNT
+            row[0] = "01.01.2099"
+            row[1] = str(20000 + number)
+            row[CSV_LAST_NAME] = patient["last_name"]
+            row[CSV_FIRST_NAME] = patient["first_name"]
+            row[CSV_BIRTH_DATE] = patient["birth_date"]
+            row[CSV_SOZIALANAMNESE] = f"POST, Zi. {number % 900}, {patient['apo_key']} (Apotheke), Pflegegrad 2"
+            writer.writerow(row)
+
+
+def write_kim_csv(path: Path, pharmacies: List[str]) -> None:
+    """Write one KIM address per pharmacy."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";", lineterminator="\r\n")
+        writer.writerow(["KIM_APO", "KIM_ADDR", "APO_NAME"])
+        for key in pharmacies:
+            name = key[len("APO_"):].lower()
+            writer.writerow([key, f"{name}@kim.test", f"Apotheke {name}"])
+
+
+def prescription_lines(patient: dict, layout: str) -> List[str]:
+    """
+    Text lines of a prescription in layout "A" or "B".
+
+    Args:
+        patient: Patient dict from make_patients().
+        layout: "A" or "B".
+
+    Returns:
+        Lines in reading order.
+    """
+    name = f"{patient['first_name']} {patient['last_name']}"
+    header = ["Ausdruck zur Einlösung Ihres E-Rezeptes", "Dr. med. Anna Frank"]
+    footer = ["ausgestellt am 02.01.2025", "1 x Metamizol 500 mg N2", "Einlösbar in jeder Apotheke"]
+    if layout == "A":
+        return header + ["für geboren am", f"{name} {patient['birth_date']}"] + footer
+    return header + ["für", name] + footer[:1] + ["geboren am", patient["birth_date"]] + footer[1:]
+
+
+def _pdf_string(text: str) -> str:
+    """Escape text for a PDF literal string (WinAnsi encoded)."""
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def make_text_pdf(lines: List[str]) -> bytes:
+    """
+    Build a one-page A4 PDF with a text layer.
+
+    Args:
+        lines: Text lines (Latin-1 characters only).
+
+    Returns:
+        PDF file content.
+    """
+    content = ["BT", "/F1 11 Tf", "14 TL", "56 780 Td"]
+    for line in lines:
+        content.append(f"{_pdf_string(line)} Tj T*")
+    content.append("ET")
+    stream = "\n".join(content).encode("cp1252")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_page_image(lines: List[str], dpi: int = 150):
+    """
+    Draw an A4 page with the given text lines with Pillow.
+
+    Args:
+        lines: Text lines.
+        dpi: Resolution of the page image.
+
+    Returns:
+        Grayscale PIL image.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size=dpi // 6)
+    except OSError:
+        font = ImageFont.load_default()
+
+    y = dpi // 2
+    for line in lines:
+        draw.text((dpi // 2, y), line, fill=0, font=font)
+        y += dpi // 4
+    return image
+
+
+def make_image_pdf(lines: List[str], dpi: int = 150) -> bytes:
+    """
+    Build a one-page A4 "scan" (image only, no text layer) with Pillow.
+
+    Args:
+        lines: Text lines.
+        dpi: Resolution of the page image.
+
+    Returns:
+        PDF file content.
+    """
+    image = make_page_image(lines, dpi)
+    out = io.BytesIO()
+    image.save(out, format="PDF", resolution=dpi)
+    return out.getvalue()
+
+
+def generate_dataset(
+    base_dir: Path,
+    documents: int,
+    patients: int,
+    pharmacies: int = 25,
+    unknown_ratio: float = 0.05,
+    image: bool = False,
+    seed: int = 1
+) -> Dict[str, str]:
+    """
+    Write CSVs and prescription PDFs below base_dir.
+
+    Args:
+        base_dir: Target folder (gets data/ and input/).
+        documents: Number of PDFs.
+        patients: Number of patients in the CSV.
+        pharmacies: Number of pharmacies.
+        unknown_ratio: Share of PDFs for patients missing from the CSV.
+        image: Write image-only PDFs (OCR) instead of text-layer PDFs.
+        seed: Random seed; the same arguments give the same files.
+
+    Returns:
+        Dict of PDF file name -> expected destination folder (APO key or
+        "unklar").
+    """
+    rng = random.Random(seed)
+    keys = pharmacy_keys(pharmacies)
+    known = make_patients(patients, keys, rng)
+    # Patients missing from the CSV, born before every known patient so the
+    # birth date fallback cannot match them either
+    unknown = make_patients(max(10, documents // 10), keys, rng, years=(1900, 1920))
+
+    write_patient_csv(base_dir / "data" / "patient_apo_mapping.csv", known)
+    write_kim_csv(base_dir / "data" / "KIM_apo_mapping.CSV", keys)
+
+    input_folder = base_dir / "input"
+    input_folder.mkdir(parents=True, exist_ok=True)
+    expected = {}
+    for number in range(documents):
+        if unknown and rng.random() < unknown_ratio:
+            patient, destination = rng.choice(unknown), "unklar"
+        else:
+            patient = rng.choice(known)
+            destination = patient["apo_key"]
+        lines = prescription_lines(patient, rng.choice("AB"))
+
+        name = f"ERP_{number:06d}.pdf"
+        content = make_image_pdf(lines) if image else make_text_pdf(lines)
+        (input_folder / name).write_bytes(content)
+        expected[name] = destination
+
+    return expected
+
@@ -1,16 +1,20 @@
 """
 Configuration settings for eRezept-Automatisierung.
 """
+import os
 from pathlib import Path
 
-# Base directory (python_version folder)
-BASE_DIR = Path(__file__).parent.parent
+# Base directory (python_version folder); EREZEPT_BASE_DIR points all folders
+# below somewhere else (used by benchmarks/bench_pipeline.py)
+BASE_DIR = Path(os.environ.get("EREZEPT_BASE_DIR") or Path(__file__).parent.parent)
 
 # Folder paths
 INPUT_FOLDER = BASE_DIR / "input"
 OUTPUT_FOLDER = BASE_DIR / "output"
 LOGS_FOLDER = BASE_DIR / "logs"
 DATA_FOLDER = BASE_DIR / "data"
+CACHE_FOLDER = BASE_DIR / "cache"
+STATE_FOLDER = BASE_DIR / "state"
 
 # CSV file paths
 PATIENT_APO_MAPPING_CSV = DATA_FOLDER / "patient_apo_mapping.csv"
@@ -24,10 +28,159 @@ CSV_COLUMNS = {
     "apo_key": 34,       # Column 35 in 1-indexed = Inhalt (APO_KEY)
 }
 
+# Compiled snapshot of the parsed patient CSV: loaded instead of parsing the
+# CSV as long as it is unchanged (same mtime and size, or same SHA-256)
+PATIENT_SNAPSHOT_ENABLED = True
+PATIENT_SNAPSHOT_FILE = CACHE_FOLDER / "patient_mapping.snapshot"
+
+# Check the CSV files for changes every N seconds in watch mode and reload
+# them in the background (0 = never)
+CSV_RELOAD_INTERVAL = 60.0
+
+# Fuzzy name matching for OCR errors (only among patients with the same birth date)
+FUZZY_MATCH_ENABLED = True
+FUZZY_MATCH_THRESHOLD = 0.85  # Minimum confidence: 1 - edit distance / name length
+FUZZY_MAX_DISTANCE = 2  # Maximum edit distance after folding umlauts and ß
+
+# Route a PDF whose name matches no patient to the only patient with its
+# birth date. Off by default: the name is ignored, so a patient missing from
+# the CSV ends up at another patient's pharmacy instead of in 'unklar'
+BIRTH_DATE_FALLBACK_ENABLED = False
+
 # OCR settings
 OCR_LANGUAGE = "deu"
 OCR_DPI = 300
+OCR_PSM = 1  # Full page: automatic page segmentation with OSD
+
+# Pages are rendered with pdftoppm straight into memory as 8-bit grayscale.
+# OCR_THRESHOLD (0-255) also binarizes them to 1 bit per pixel: darker
+# pixels become black (None = leave binarization to tesseract).
+OCR_THRESHOLD = None
+RENDER_TIMEOUT = 60  # Seconds per rendered page
+
+# OCR engine: "tesserocr" (tesseract API loaded once per process / thread,
+# images passed in memory; optional package), "pytesseract" (one tesseract
+# process per image) or "auto" (tesserocr if installed, else pytesseract)
+OCR_ENGINE = "auto"
+
+# Region-of-interest OCR: OCR only the patient header block ("für ...
+# geboren am") at a lower DPI first, full page only if that finds nothing
+OCR_ROI_ENABLED = True
+OCR_ROI_BOX = (0.0, 0.0, 1.0, 0.35)  # left, top, right, bottom (fractions of the page)
+OCR_ROI_DPI = 200
+OCR_ROI_PSM = 6  # Single uniform block of text
+
+# OCR result cache (SQLite, keyed by PDF content hash + OCR settings)
+OCR_CACHE_ENABLED = True
+OCR_CACHE_DB = CACHE_FOLDER / "ocr_cache.sqlite3"
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Least recently used entries are evicted beyond this
+
+# Read the embedded text layer (pdftotext) first and only OCR when it
+# yields no patient data
+TEXT_LAYER_FIRST = True
+TEXT_LAYER_TIMEOUT = 30  # seconds
+
+# Multi-page PDFs (collective printouts): every page is analyzed and the PDF
+# is split into one PDF per patient with poppler's pdfseparate / pdfunite.
+# Consecutive pages of the same patient, and pages without patient data,
+# stay with the patient before them.
+MULTI_PAGE_ENABLED = True
+PAGE_OCR_THREADS = 4  # Pages of one PDF rendered + OCRed at a time (per worker process)
+SPLIT_FOLDER = STATE_FOLDER / "split"  # Parts wait here until they are routed
+SPLIT_TIMEOUT = 60  # Seconds per pdfseparate / pdfunite call
 
 # Processing settings
 DRY_RUN = True  # If True, don't send emails
 FILE_PATTERN = "*.pdf"
+
+# KIM service (mirrors $KIMConfig / $ErrorConfig in config/settings.ps1;
+# DRY_RUN takes the place of EnableSend)
+KIM_SMTP_SERVER = "testserver"  # e.g. "kv.dox.kim.telematik"
+KIM_SMTP_PORT = 587
+KIM_USE_SSL = True  # STARTTLS
+KIM_EMAIL_FROM = "praxis@domain.de"  # Adjust!
+KIM_EMAIL_SUBJECT = "eRezept für {0}"
+KIM_USERNAME = os.environ.get("KIM_USERNAME")  # No login if unset
+KIM_PASSWORD = os.environ.get("KIM_PASSWORD")
+KIM_ATTACHMENTS_PER_MESSAGE = 10  # PDFs per message to the same pharmacy
+KIM_RETRY_ATTEMPTS = 3
+KIM_RETRY_DELAY = 5.0  # Seconds before the first retry, doubled for each further one
+KIM_TIMEOUT = 30  # Seconds per SMTP command
+
+# Metrics: wall / CPU time per stage for every PDF in
+# LOGS_FOLDER/metrics_YYYY-MM-DD.jsonl (p50 / p95 / max in the summary)
+METRICS_ENABLED = True
+# p50 / p95 are taken from the last N timings per stage (count and max cover
+# all of them), so --watch keeps a bounded amount in memory
+METRICS_SUMMARY_SAMPLES = 10000
+
+# Profile the run with cProfile and write LOGS_FOLDER/profile_<time>.prof
+# (in parallel / pipeline mode only the main process is profiled)
+PROFILE_ENABLED = False
+
+# Live status: serve Prometheus metrics (documents per status, backlog,
+# documents in flight, stage latency histograms, CSV data size / age) on
+# http://STATUS_HTTP_HOST:STATUS_HTTP_PORT/metrics while main.py runs
+STATUS_HTTP_PORT = None  # None = off (also: --status-port)
+STATUS_HTTP_HOST = "127.0.0.1"  # Local only; "0.0.0.0" to allow remote scrapes
+# Upper bounds (seconds) of the latency histogram buckets
+STATUS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Duplicate protection: skip PDFs whose content (SHA-256) was already routed
+# to a pharmacy, before any OCR work
+DUPLICATE_CHECK_ENABLED = True
+DUPLICATE_INDEX_FILE = STATE_FOLDER / "processed_hashes.txt"
+
+# Batch journal: each PDF's progress (claimed, analyzed, looked_up, routed,
+# sent) is appended to a JSONL write-ahead log, so a run that died halfway
+# resumes where it stopped: routed PDFs are not processed again, finished
+# analyses are reused and unsent KIM messages are re-queued
+JOURNAL_ENABLED = True
+JOURNAL_FILE = STATE_FOLDER / "journal.jsonl"
+JOURNAL_BATCH_SIZE = 20  # Records buffered before they are written
+JOURNAL_FLUSH_INTERVAL = 2.0  # Write buffered records at least every N seconds
+JOURNAL_FSYNC = True  # Force each write to disk (one fsync per batch)
+# Rewrite the journal with only the unfinished PDFs (not routed yet, or KIM
+# message not sent) every N records and at the end of each run
+JOURNAL_COMPACT_RECORDS = 5000
+
+# Routing: "move" (rename out of the input folder, which drains it), "link"
+# (hard link, original stays in input) or "copy" (original stays in input).
+# Move and link fall back to copying across file systems.
+ROUTING_MODE = "move"
+
+# Per-folder counts of routed PDFs, kept in OUTPUT_FOLDER for the summary
+# (check against the disk with: python main.py --verify-routing)
+ROUTING_MANIFEST_NAME = ".routing_manifest.json"
+
+# Multi-node mode (--node): several main.py processes, on one host or on
+# several hosts sharing the input folder, split the PDFs between them. Each
+# PDF is claimed with a lease file in LEASE_FOLDER (created exclusively, so
+# one node wins); leases are renewed while the PDF is processed and taken
+# over by another node once they are LEASE_TTL seconds old (crashed node).
+# Hosts need synchronized clocks (NTP).
+NODE_MODE = False
+# Name of this node in the leases and its journal (None = host name); give
+# each process its own when running several on one host
+NODE_ID = None
+LEASE_FOLDER = INPUT_FOLDER / ".leases"
+LEASE_TTL = 300.0  # Seconds a lease is valid without renewal
+LEASE_RENEW_INTERVAL = 60.0  # Seconds between renewals of held leases
+CLAIM_BATCH_SIZE = 8  # PDFs claimed and processed at a time
+MANIFEST_LOCK_TIMEOUT = 10.0  # Seconds to wait for the routing manifest lock
+
+# Execution mode: "serial", "parallel" (OCR + patient extraction in a process
+# pool) or "pipeline" (hash, OCR, routing and KIM dispatch overlap as stages)
+PROCESSING_MODE = "serial"
+WORKER_COUNT = None  # Worker processes for "parallel" mode (None = CPU count)
+
+# Pipeline mode: stages are connected by bounded queues (backpressure)
+PIPELINE_QUEUE_SIZE = 8  # Max files waiting in front of each stage
+PIPELINE_HASH_WORKERS = 2  # Threads hashing input files for the duplicate check
+PIPELINE_REPORT_INTERVAL = 5.0  # Seconds between queue depth reports (0 = off)
+
+# Watch mode (--watch): keep running and process new PDFs as they arrive
+WATCH_USE_EVENTS = True  # File system events via watchdog if installed, else polling
+WATCH_POLL_INTERVAL = 2.0  # Seconds between checks when polling / while files are pending
+WATCH_RESCAN_INTERVAL = 60.0  # Full folder scan as a safety net when using events
+WATCH_STABLE_SECONDS = 2.0  # Size and mtime must be unchanged this long before processing
@@ -7,110 +7,629 @@ Processes e-prescription PDFs:
 2. Look up assigned pharmacy from CSV
 3. Route PDFs to pharmacy-specific folders
 """
+import argparse
+import os
+import random
+import re
+import signal
+import subprocess
 import sys
+import threading
 from pathlib import Path
 from datetime import datetime
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from config.settings import INPUT_FOLDER, OUTPUT_FOLDER, LOGS_FOLDER, FILE_PATTERN
-from src.pdf_processor import extract_text_from_pdf, extract_patient_info
+from config.settings import (
+    INPUT_FOLDER,
+    OUTPUT_FOLDER,
+    LOGS_FOLDER,
+    FILE_PATTERN,
+    PROCESSING_MODE,
+    WORKER_COUNT,
+    DUPLICATE_CHECK_ENABLED,
+    DRY_RUN,
+    PROFILE_ENABLED,
+    ROUTING_MODE,
+    JOURNAL_ENABLED,
+    JOURNAL_FILE,
+    NODE_MODE,
+    NODE_ID,
+    CLAIM_BATCH_SIZE,
+    STATUS_HTTP_PORT,
+)
+from src.pdf_processor import analyze_pdf
 from src.csv_lookup import PatientPharmacyLookup
-from src.file_router import route_pdf, get_routing_summary
+from src.duplicate_index import DuplicateIndex
+from src.file_router import RoutingManifest, find_routed, route_pdf, get_routing_summary, split_pdf
+from src.hashing import file_sha256
+from src.journal import (
+    BatchJournal,
+    STAGE_ANALYZED,
+    STAGE_CLAIMED,
+    STAGE_LOOKED_UP,
+    STAGE_ROUTED,
+    STAGE_ROUTING,
+    STAGE_SENT,
+)
+from src.lease import LeaseManager
+from src.metrics import (
+    MetricsLog,
+    StageTimer,
+    STATUS_DUPLICATE,
+    STATUS_ERROR,
+    STATUS_ROUTED,
+    STATUS_UNKLAR,
+)
+from src.watcher import InputWatcher
 
+# Only needed once there is work to do; imported on first use to keep the
+# start-up (mostly: "no PDFs, exit") fast
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+    from src.kim_sender import KIMSender
+    from src.pipeline import StagedPipeline
+    from src.status_server import RunStatus, StatusServer
 
-def process_pdfs():
+
+def handle_analysis(
+    pdf_path: Path,
+    analysis: dict,
+    lookup: PatientPharmacyLookup,
+    results: dict,
+    file_hash: Optional[str] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+    sender: Optional["KIMSender"] = None,
+    metrics: Optional[MetricsLog] = None,
+    journal: Optional[BatchJournal] = None
+) -> None:
     """
-    Main processing function.
-    
-    Processes all PDFs in the input folder.
+    Look up the pharmacy for an analysed PDF and route it.
+
+    Runs in the main process, in input order, so routing and the summary
+    counters are identical for serial and parallel runs.
+
+    Args:
+        pdf_path: Path to the source PDF.
+        analysis: Result of analyze_pdf() for this file.
+        lookup: Loaded patient-pharmacy lookup.
+        results: Summary counters, updated in place.
+        file_hash: SHA-256 of the PDF, recorded in `duplicates` once the
+            file has been routed to a pharmacy.
+        duplicates: Duplicate index, or None if the check is disabled.
+        sender: KIM sender; PDFs routed to a pharmacy with a KIM address
+            are queued for sending.
+        metrics: Metrics log; gets one entry with the stage timings of
+            this file.
+        journal: Batch journal; gets the "looked_up" and "routed" stages
+            of this file (by `file_hash`). A PDF with a KIM address also
+            gets "routing" before it is moved, and both are written to
+            disk right away, so its message survives a crash.
     """
-    print("=" * 60)
-    print("eRezept-Automatisierung (Python Version)")
-    print("=" * 60)
-    print(f"Input folder: {INPUT_FOLDER}")
-    print(f"Output folder: {OUTPUT_FOLDER}")
-    print()
-    
-    # Initialize lookup
-    lookup = PatientPharmacyLookup()
-    if not lookup.load_csv_data():
-        print("[ERROR] Failed to load CSV data. Exiting.")
-        return False
-    
-    # Find PDFs
-    pdf_files = list(INPUT_FOLDER.glob(FILE_PATTERN))
-    
-    if not pdf_files:
-        print(f"[INFO] No PDF files found in {INPUT_FOLDER}")
-        return True
-    
-    print(f"[INFO] Found {len(pdf_files)} PDF files to process")
-    print("-" * 60)
-    
-    # Process each PDF
-    results = {
+    if len(analysis.get("groups") or ()) > 1:
+        handle_split(pdf_path, analysis, lookup, results, file_hash, duplicates, sender, metrics, journal)
+        return
+
+    results["cache_hits"] += analysis["cache_hits"]
+    results["cache_misses"] += analysis["cache_misses"]
+
+    timer = metrics.timer(pdf_path) if metrics else StageTimer()
+    timer.merge(analysis.get("timings", {}))
+    status, message, patient_name, apo_key = STATUS_ERROR, "", "", None
+    dest, kim_address = None, None
+
+    try:
+        if analysis["error"]:
+            raise RuntimeError(analysis["error"])
+
+        # Step 1: OCR
+        if not analysis["text_ok"]:
+            print(f"  [ERROR] OCR failed")
+            results["error"] += 1
+            message = "OCR failed"
+            with timer.stage("route"):
+                dest = route_pdf(pdf_path, None)
+            return
+
+        results[analysis["source"]] += 1
+        print(f"  [INFO] Text source: {analysis['source']}")
+
+        # Step 2: Extract patient info
+        patient_info = analysis["patient_info"]
+
+        if not patient_info:
+            print(f"  [WARN] No patient data found")
+            results["no_patient"] += 1
+            status, message = STATUS_UNKLAR, "No patient data found"
+            with timer.stage("route"):
+                dest = route_pdf(pdf_path, None, patient_info)
+            return
+
+        print(f"  [INFO] Patient: {patient_info['full_name']}")
+        patient_name = patient_info["name"]
+
+        # Step 3: Look up pharmacy
+        with timer.stage("lookup"):
+            apo_key = lookup.find_pharmacy(
+                patient_info["name"],
+                patient_info["birth_date"]
+            )
+        if journal is not None:
+            journal.record(file_hash, STAGE_LOOKED_UP, apo_key=apo_key)
+
+        if not apo_key:
+            print(f"  [WARN] No pharmacy found for patient")
+            results["no_pharmacy"] += 1
+            status, message = STATUS_UNKLAR, "No pharmacy found"
+            with timer.stage("route"):
+                dest = route_pdf(pdf_path, None, patient_info)
+            return
+
+        print(f"  [INFO] Pharmacy: {apo_key}")
+
+        # Step 4: Get KIM address (optional)
+        with timer.stage("lookup"):
+            kim_info = lookup.get_kim_address(apo_key)
+        if kim_info:
+            print(f"  [INFO] KIM: {kim_info['kim_address']}")
+
+        # Step 5: Route file
+        if journal is not None and sender and kim_info:
+            journal.record(
+                file_hash,
+                STAGE_ROUTING,
+                file=pdf_path.name,
+                apo_key=apo_key,
+                kim_address=kim_info["kim_address"],
+                patient=patient_name,
+            )
+            journal.flush()
+        with timer.stage("route"):
+            dest = route_pdf(pdf_path, apo_key, patient_info)
+        print(f"  [OK] Routed to: {dest.parent.name}/")
+        results["success"] += 1
+        status, message = STATUS_ROUTED, f"Routed to {dest.parent.name}/"
+        if duplicates is not None and file_hash:
+            duplicates.add(file_hash)
+        if sender and kim_info:
+            kim_address = kim_info["kim_address"]
+            sender.add(dest, apo_key, kim_address, patient_info["name"], key=file_hash)
+
+    except Exception as e:
+        print(f"  [ERROR] Processing failed: {e}")
+        results["error"] += 1
+        status, message = STATUS_ERROR, f"Processing failed: {e}"
+        # The file may already have been moved before the error
+        if pdf_path.exists():
+            dest = route_pdf(pdf_path, None)
+
+    finally:
+        if metrics:
+            source = analysis.get("source") if analysis.get("text_ok") else ""
+            metrics.record(pdf_path, status, message, patient_name, apo_key, file_hash, source)
+        if journal is not None and dest is not None:
+            journal.record(
+                file_hash,
+                STAGE_ROUTED,
+                file=pdf_path.name,
+                status=status,
+                dest=str(dest),
+                apo_key=apo_key,
+                kim_address=kim_address,
+                patient=patient_name,
+            )
+            if kim_address:
+                journal.flush()
+
+
+def handle_split(
+    pdf_path: Path,
+    analysis: dict,
+    lookup: PatientPharmacyLookup,
+    results: dict,
+    file_hash: Optional[str] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+    sender: Optional["KIMSender"] = None,
+    metrics: Optional[MetricsLog] = None,
+    journal: Optional[BatchJournal] = None
+) -> None:
+    """
+    Split a PDF with several patients and route every part on its own.
+
+    Each part goes through handle_analysis() with the patient of its page
+    group. The source PDF counts as processed (duplicate index) once any
+    part was routed to a pharmacy; in "move" mode it is removed after the
+    split, like a routed PDF, otherwise the parts are removed once they
+    are copied / linked. If splitting fails, the whole PDF goes to
+    'unklar'.
+
+    The journal tracks the source PDF as a whole: it is "routed" once all
+    parts are; KIM messages of the parts are not re-sent after a restart.
+
+    Args:
+        pdf_path: Path to the source PDF.
+        analysis: Result of analyze_pdf() with more than one page group.
+        lookup, results, file_hash, duplicates, sender, metrics, journal:
+            As for handle_analysis().
+    """
+    groups = analysis["groups"]
+    print(f"  [INFO] {len(groups)} patients on {analysis['pages']} pages, splitting")
+
+    try:
+        parts = split_pdf(pdf_path, [group["pages"] for group in groups])
+    except (OSError, subprocess.SubprocessError) as e:
+        failed = dict(analysis, groups=None, error=f"Splitting failed: {e}")
+        handle_analysis(pdf_path, failed, lookup, results, file_hash, duplicates, sender, metrics, journal)
+        return
+
+    # Work done on the whole PDF is accounted to the first part
+    timings = StageTimer()
+    timings.merge(analysis["timings"])
+    if metrics:
+        timings.merge(metrics.take_timings(pdf_path))
+
+    routed_before = results["success"]
+    for index, (part, group) in enumerate(zip(parts, groups)):
+        print(f"  [SPLIT] {part.name} (pages {group['pages'][0]}-{group['pages'][-1]})")
+        part_analysis = {
+            "text_ok": group["text_ok"],
+            "patient_info": group["patient_info"],
+            "source": group["source"],
+            "cache_hits": analysis["cache_hits"] if index == 0 else 0,
+            "cache_misses": analysis["cache_misses"] if index == 0 else 0,
+            "timings": timings.timings if index == 0 else {},
+            "error": None,
+        }
+        handle_analysis(part, part_analysis, lookup, results, None, None, sender, metrics)
+        if ROUTING_MODE != "move" and part.exists():
+            # Copied or linked: the part itself is not needed any more
+            part.unlink()
+
+    if duplicates is not None and file_hash and results["success"] > routed_before:
+        duplicates.add(file_hash)
+    if journal is not None:
+        journal.record(file_hash, STAGE_ROUTED, file=pdf_path.name, parts=[part.name for part in parts])
+    if ROUTING_MODE == "move":
+        pdf_path.unlink()
+
+
+def new_results() -> dict:
+    """Create zeroed summary counters."""
+    return {
         "success": 0,
         "no_patient": 0,
         "no_pharmacy": 0,
         "error": 0,
+        "duplicate": 0,
+        "resumed": 0,
+        "kim_sent": 0,
+        "kim_failed": 0,
+        "kim_messages": 0,
+        "text_layer": 0,
+        "ocr_roi": 0,
+        "ocr": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
     }
-    
-    for pdf_path in pdf_files:
+
+
+def process_batch(
+    pdf_files: List[Path],
+    lookup: PatientPharmacyLookup,
+    results: dict,
+    pool: Optional["ProcessPoolExecutor"] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+    sender: Optional["KIMSender"] = None,
+    metrics: Optional[MetricsLog] = None,
+    journal: Optional[BatchJournal] = None,
+    status: Optional["RunStatus"] = None
+) -> None:
+    """
+    Process a list of PDFs.
+
+    Args:
+        pdf_files: PDFs to process.
+        lookup: Loaded patient-pharmacy lookup.
+        results: Summary counters, updated in place.
+        pool: Process pool for OCR and patient extraction, or None to
+            run them in this process.
+        duplicates: Duplicate index; PDFs already routed to a pharmacy are
+            skipped before OCR. None disables the check.
+        sender: KIM sender; routed PDFs are sent per pharmacy at the end
+            of the batch.
+        metrics: Metrics log for the per-file stage timings.
+        journal: Batch journal; PDFs it has as routed are skipped and
+            stored analyses are used instead of OCR. None disables it.
+        status: Run status for the status server (backlog and documents
+            in flight), or None.
+    """
+    if duplicates is not None or journal is not None:
+        pdf_files, hashes = skip_duplicates(pdf_files, duplicates, results, metrics, journal)
+    else:
+        hashes = [None] * len(pdf_files)
+    if status is not None:
+        status.queue(len(pdf_files))
+
+    # Analyses finished before a restart
+    resumed = {}
+    if journal is not None:
+        for pdf_path, file_hash in zip(pdf_files, hashes):
+            analysis = journal.analysis(file_hash)
+            if analysis:
+                resumed[pdf_path] = analysis
+            else:
+                journal.record(file_hash, STAGE_CLAIMED, file=pdf_path.name)
+
+    pending = [(pdf_path, file_hash) for pdf_path, file_hash in zip(pdf_files, hashes) if pdf_path not in resumed]
+    if pool:
+        futures = [pool.submit(analyze_pdf, pdf_path, file_hash) for pdf_path, file_hash in pending]
+        if status is not None:
+            mark_started = track_started(futures, [item[0] for item in pending], status)
+            for future in futures:
+                future.add_done_callback(mark_started)
+            mark_started()
+        analyses = (future.result() for future in futures)
+    else:
+        # Lazy, so each file is analysed right before it is routed
+        analyses = (analyze_pdf(pdf_path, file_hash) for pdf_path, file_hash in pending)
+    analyses = iter(analyses)
+
+    for pdf_path, file_hash in zip(pdf_files, hashes):
         print(f"\n[PROCESSING] {pdf_path.name}")
-        
-        try:
-            # Step 1: OCR
-            text = extract_text_from_pdf(pdf_path)
-            
-            if not text:
-                print(f"  [ERROR] OCR failed")
-                results["error"] += 1
-                route_pdf(pdf_path, None)
-                continue
-            
-            # Step 2: Extract patient info
-            patient_info = extract_patient_info(text)
-            
-            if not patient_info:
-                print(f"  [WARN] No patient data found")
-                results["no_patient"] += 1
-                route_pdf(pdf_path, None, patient_info)
+        if status is not None:
+            status.start(pdf_path)
+        if pdf_path in resumed:
+            print("  [RESUME] Analysis from the journal, no OCR")
+            analysis = resumed[pdf_path]
+        else:
+            analysis = next(analyses)
+            journal_analysis(journal, file_hash, analysis)
+        handle_analysis(pdf_path, analysis, lookup, results, file_hash, duplicates, sender, metrics, journal)
+        if status is not None:
+            status.finish(pdf_path)
+
+    if sender and sender.pending:
+        send_queued(sender, results, metrics, journal)
+
+
+def track_started(futures: list, pdf_files: List[Path], status: "RunStatus") -> Callable[..., None]:
+    """
+    Build a callback that moves PDFs from the backlog to in flight once the
+    process pool has handed them to a worker.
+
+    The pool hands out calls in submission order and marks them running
+    when it does, so a cursor over the futures is enough. concurrent.futures
+    has no callback for that, so the result is called whenever a future is
+    done (from the pool's thread) and once after submitting.
+
+    Args:
+        futures: Futures of analyze_pdf(), in submission order.
+        pdf_files: PDF of each future.
+        status: Run status to update.
+
+    Returns:
+        Callback that takes an optional (ignored) future.
+    """
+    lock = threading.Lock()
+    cursor = 0
+
+    def mark_started(_future=None) -> None:
+        nonlocal cursor
+        with lock:
+            while cursor < len(futures) and (futures[cursor].running() or futures[cursor].done()):
+                status.start(pdf_files[cursor])
+                cursor += 1
+
+    return mark_started
+
+
+def journal_analysis(journal: Optional[BatchJournal], file_hash: Optional[str], analysis: dict) -> None:
+    """Record a finished analysis; failed ones are redone after a restart."""
+    if journal is not None and not analysis["error"]:
+        journal.record(file_hash, STAGE_ANALYZED, analysis=analysis)
+
+
+def send_queued(
+    sender: "KIMSender",
+    results: dict,
+    metrics: Optional[MetricsLog] = None,
+    journal: Optional[BatchJournal] = None
+) -> None:
+    """
+    Send the queued KIM messages.
+
+    The journal is written first, so every PDF that goes out is on disk as
+    routed, and the sent PDFs are recorded afterwards.
+
+    Args:
+        sender: KIM sender with queued PDFs.
+        results: Summary counters, updated in place.
+        metrics: Metrics log for the "mail" stage timing.
+        journal: Batch journal, or None.
+    """
+    print(f"\n[KIM] Sending {sender.pending} PDF(s)")
+    if journal is not None:
+        journal.flush()
+    timer = StageTimer()
+    with timer.stage("mail"):
+        stats = sender.flush()
+    if metrics:
+        metrics.add_sample("mail", timer.timings["mail"]["wall"])
+    if journal is not None:
+        journal.mark_sent(stats["done"])
+    results["kim_sent"] += stats["sent"]
+    results["kim_failed"] += stats["failed"]
+    results["kim_messages"] += stats["messages"]
+
+
+def requeue_unsent(journal: BatchJournal, sender: "KIMSender") -> int:
+    """
+    Queue the PDFs that were routed before a restart but never sent.
+
+    A PDF the run died on while routing it is looked up in its pharmacy
+    folder by content hash; if it is not there, it is left to be processed
+    again (still in the input folder) or dropped with a warning.
+
+    Args:
+        journal: Loaded batch journal.
+        sender: KIM sender.
+
+    Returns:
+        Number of PDFs queued.
+    """
+    count = 0
+    for entry in journal.unsent():
+        if entry["stage"] == STAGE_ROUTING:
+            dest = find_routed(entry["file"], entry["apo_key"], entry["hash"])
+            if dest is None:
+                if (INPUT_FOLDER / entry["file"]).exists():
+                    # Not moved yet: processed again with the stored analysis
+                    continue
+                print(f"[WARN] {entry['file']} was being routed before the restart and is gone, not sent")
+                journal.record(entry["hash"], STAGE_SENT, skipped="routed PDF missing")
                 continue
-            
-            print(f"  [INFO] Patient: {patient_info['full_name']}")
-            
-            # Step 3: Look up pharmacy
-            apo_key = lookup.find_pharmacy(
-                patient_info["name"],
-                patient_info["birth_date"]
+            journal.record(
+                entry["hash"],
+                STAGE_ROUTED,
+                file=entry["file"],
+                status=STATUS_ROUTED,
+                dest=str(dest),
+                apo_key=entry["apo_key"],
+                kim_address=entry["kim_address"],
+                patient=entry.get("patient", ""),
             )
-            
-            if not apo_key:
-                print(f"  [WARN] No pharmacy found for patient")
-                results["no_pharmacy"] += 1
-                route_pdf(pdf_path, None, patient_info)
-                continue
-            
-            print(f"  [INFO] Pharmacy: {apo_key}")
-            
-            # Step 4: Get KIM address (optional)
-            kim_info = lookup.get_kim_address(apo_key)
-            if kim_info:
-                print(f"  [INFO] KIM: {kim_info['kim_address']}")
-            
-            # Step 5: Route file
-            dest = route_pdf(pdf_path, apo_key, patient_info)
-            print(f"  [OK] Routed to: {dest.parent.name}/")
-            results["success"] += 1
-            
-        except Exception as e:
-            print(f"  [ERROR] Processing failed: {e}")
-            results["error"] += 1
-            route_pdf(pdf_path, None)
-    
-    # Summary
+        else:
+            dest = Path(entry["dest"])
+        if not dest.exists():
+            print(f"[WARN] {dest.name} is no longer in {dest.parent}, not sent")
+            journal.record(entry["hash"], STAGE_SENT, skipped="routed PDF missing")
+            continue
+        sender.add(dest, entry["apo_key"], entry["kim_address"], entry.get("patient", ""), key=entry["hash"])
+        count += 1
+
+    if count:
+        print(f"[RESUME] {count} routed PDF(s) not sent before the restart, queued")
+    return count
+
+
+def skip_duplicates(
+    pdf_files: List[Path],
+    duplicates: Optional[DuplicateIndex],
+    results: dict,
+    metrics: Optional[MetricsLog] = None,
+    journal: Optional[BatchJournal] = None
+) -> Tuple[List[Path], List[Optional[str]]]:
+    """
+    Hash the PDFs and drop those that were already processed.
+
+    Duplicates stay in the input folder. A second copy within the same batch
+    is skipped as well; it is picked up by a later run if the first copy
+    could not be routed to a pharmacy.
+
+    Args:
+        pdf_files: PDFs to check.
+        duplicates: Duplicate index, or None to only check the journal.
+        results: Summary counters, updated in place.
+        metrics: Metrics log; hashing is timed as the "hash" stage and
+            duplicates get a DUPLICATE_BLOCKED entry.
+        journal: Batch journal; PDFs it has as routed (also to 'unklar')
+            are skipped, e.g. when a run died before the summary (the
+            journal forgets them when it is compacted).
+
+    Returns:
+        Tuple of (PDFs to process, their SHA-256 hashes).
+    """
+    remaining = []
+    hashes = []
+    seen = set()
+
+    for pdf_path in pdf_files:
+        timer = metrics.timer(pdf_path) if metrics else StageTimer()
+        try:
+            with timer.stage("hash"):
+                file_hash = file_sha256(pdf_path)
+        except OSError as e:
+            # Let the normal processing report the problem
+            print(f"[WARN] Could not hash {pdf_path.name}: {e}")
+            file_hash = None
+
+        if file_hash and duplicates is not None and (file_hash in duplicates or file_hash in seen):
+            print(f"\n[DUPLICATE] {pdf_path.name} was already processed, skipped")
+            results["duplicate"] += 1
+            if metrics:
+                metrics.record(pdf_path, STATUS_DUPLICATE, "Already processed", file_hash=file_hash)
+            continue
+
+        if journal is not None and journal.is_routed(file_hash):
+            print(f"\n[RESUME] {pdf_path.name} was routed before the restart, skipped")
+            results["resumed"] += 1
+            if metrics:
+                metrics.record(pdf_path, STATUS_DUPLICATE, "Already routed (journal)", file_hash=file_hash)
+            continue
+
+        seen.add(file_hash)
+        remaining.append(pdf_path)
+        hashes.append(file_hash)
+
+    return remaining, hashes
+
+
+def make_pipeline(
+    lookup: PatientPharmacyLookup,
+    results: dict,
+    duplicates: Optional[DuplicateIndex],
+    sender: "KIMSender",
+    metrics: MetricsLog,
+    workers: int,
+    pool: Optional["ProcessPoolExecutor"] = None,
+    journal: Optional[BatchJournal] = None,
+    status: Optional["RunStatus"] = None
+) -> "StagedPipeline":
+    """
+    Create a staged pipeline whose route stage is handle_analysis().
+
+    Args:
+        lookup: Loaded patient-pharmacy lookup.
+        results: Summary counters, updated in place.
+        duplicates: Duplicate index, or None if the check is disabled.
+        sender: KIM sender used by the mail stage.
+        metrics: Metrics log for the per-file stage timings.
+        workers: Concurrent analyses.
+        pool: Process pool to reuse between runs, or None to create one
+            per run.
+        journal: Batch journal, or None.
+        status: Run status for the status server, or None; its queue
+            depths are taken from the pipeline.
+
+    Returns:
+        StagedPipeline instance.
+    """
+    from src.pipeline import StagedPipeline
+
+    def route(pdf_path: Path, analysis: dict, file_hash: Optional[str]) -> None:
+        print(f"\n[PROCESSING] {pdf_path.name}")
+        handle_analysis(pdf_path, analysis, lookup, results, file_hash, duplicates, sender, metrics, journal)
+
+    pipeline = StagedPipeline(
+        route,
+        results,
+        duplicates=duplicates,
+        sender=sender,
+        metrics=metrics,
+        workers=workers,
+        executor=pool,
+        journal=journal,
+        status=status,
+    )
+    if status is not None:
+        status.pipeline = pipeline
+    return pipeline
+
+
+def print_summary(results: dict, metrics: Optional[MetricsLog] = None) -> None:
+    """Print the processing summary, the stage timings and the routing summary."""
     print("\n" + "=" * 60)
     print("PROCESSING SUMMARY")
     print("=" * 60)
@@ -118,18 +637,479 @@ def process_pdfs():
     print(f"  No patient:   {results['no_patient']}")
     print(f"  No pharmacy:  {results['no_pharmacy']}")
     print(f"  Errors:       {results['error']}")
+    print(f"  Duplicates:   {results['duplicate']}")
+    if results["resumed"]:
+        print(f"  Resumed:      {results['resumed']} already routed before a restart")
+    if DRY_RUN:
+        print(f"  KIM:          dry run, {results['kim_messages']} message(s) not sent")
+    else:
+        print(f"  KIM:          {results['kim_sent']} PDF(s) sent in {results['kim_messages']} message(s), {results['kim_failed']} failed")
+    print(f"  Text layer:   {results['text_layer']}")
+    print(f"  OCR (region): {results['ocr_roi']}")
+    print(f"  OCR (page):   {results['ocr']}")
+    print(f"  OCR cache:    {results['cache_hits']} hit(s), {results['cache_misses']} miss(es)")
     print()
-    
+
+    if metrics:
+        metrics.print_summary()
+
     # Routing summary
     routing = get_routing_summary(OUTPUT_FOLDER)
     if routing:
         print("Files routed to:")
         for folder, count in sorted(routing.items()):
             print(f"  {folder}: {count} file(s)")
-    
+
+
+def load_duplicate_index() -> Optional[DuplicateIndex]:
+    """Load the duplicate index, or return None if the check is disabled."""
+    if not DUPLICATE_CHECK_ENABLED:
+        return None
+
+    duplicates = DuplicateIndex()
+    count = duplicates.load()
+    print(f"[INFO] Duplicate index: {count} processed file(s)")
+    return duplicates
+
+
+def load_journal(node_id: Optional[str] = None) -> Optional[BatchJournal]:
+    """
+    Load the batch journal, or return None if it is disabled.
+
+    Args:
+        node_id: Node name in multi-node mode; every node keeps its own
+            journal ("journal_<node>.jsonl").
+    """
+    if not JOURNAL_ENABLED:
+        return None
+
+    if node_id:
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", node_id)
+        journal = BatchJournal(JOURNAL_FILE.with_name(f"{JOURNAL_FILE.stem}_{safe_id}{JOURNAL_FILE.suffix}"))
+    else:
+        journal = BatchJournal()
+    if journal.load():
+        print(f"[INFO] Journal: {len(journal)} file(s)")
+    return journal
+
+
+def send_unsent(journal: BatchJournal) -> bool:
+    """
+    Send the KIM messages left over from an interrupted run.
+
+    Used when there are no new PDFs, so the CSV files are not needed.
+
+    Returns:
+        True if nothing failed.
+    """
+    from src.kim_sender import KIMSender
+
+    results = new_results()
+    with KIMSender() as sender:
+        if requeue_unsent(journal, sender):
+            send_queued(sender, results, journal=journal)
+    journal.close()
+    return results["kim_failed"] == 0
+
+
+def print_header() -> None:
+    """Print the start banner."""
+    print("=" * 60)
+    print("eRezept-Automatisierung (Python Version)")
+    print("=" * 60)
+    print(f"Input folder: {INPUT_FOLDER}")
+    print(f"Output folder: {OUTPUT_FOLDER}")
+    print()
+
+
+def start_status_server(
+    port: Optional[int],
+    results: dict,
+    metrics: MetricsLog,
+    lookup: PatientPharmacyLookup
+) -> Optional["StatusServer"]:
+    """
+    Serve the live status of the run on http://<host>:<port>/metrics.
+
+    Args:
+        port: TCP port, or None to serve nothing.
+        results: Summary counters of the run.
+        metrics: Metrics log of the run.
+        lookup: Loaded patient-pharmacy lookup.
+
+    Returns:
+        Running StatusServer (its `status` is to be passed to the
+        processing), or None if disabled or the port is not available.
+    """
+    if port is None:
+        return None
+
+    from src.status_server import RunStatus, StatusServer
+
+    server = StatusServer(RunStatus(results, metrics, lookup), port=port)
+    try:
+        server.start()
+    except OSError as e:
+        print(f"[WARN] Could not start status server on port {port}: {e}")
+        return None
+    print(f"[INFO] Status: {server.url}")
+    return server
+
+
+def process_claimed(
+    claims: LeaseManager,
+    pdf_files: List[Path],
+    run_batch: Callable[[List[Path]], None],
+    batch_size: int = CLAIM_BATCH_SIZE
+) -> int:
+    """
+    Process the PDFs this node can claim, a few at a time (multi-node mode).
+
+    Each batch is claimed right before it is processed, so nodes that are
+    faster take more of the files. When the list is used up, the input
+    folder is listed again for files that arrived or were released in the
+    meantime, until a pass claims nothing.
+
+    Args:
+        claims: Lease manager of this node.
+        pdf_files: PDFs in the input folder.
+        run_batch: Processes a list of claimed PDFs.
+        batch_size: PDFs claimed at a time.
+
+    Returns:
+        Number of PDFs processed by this node.
+    """
+    processed = 0
+    claims.start_renewal()
+    try:
+        while pdf_files:
+            # Start at a random file, so the nodes do not all compete for
+            # the first ones
+            start = random.randrange(len(pdf_files))
+            claimed = 0
+            for batch in claims.claim_batches(pdf_files[start:] + pdf_files[:start], batch_size):
+                run_batch(batch)
+                claims.release(batch)
+                claimed += len(batch)
+            if not claimed:
+                break
+            processed += claimed
+            pdf_files = list(INPUT_FOLDER.glob(FILE_PATTERN))
+    finally:
+        claims.stop_renewal()
+        # Claimed but not processed (interrupted): free them for other nodes
+        claims.abandon()
+
+    claims.prune(INPUT_FOLDER)
+    return processed
+
+
+def process_pdfs(
+    mode: str = PROCESSING_MODE,
+    workers: Optional[int] = WORKER_COUNT,
+    node: bool = NODE_MODE,
+    node_id: Optional[str] = NODE_ID,
+    status_port: Optional[int] = STATUS_HTTP_PORT
+):
+    """
+    Main processing function.
+
+    Processes all PDFs in the input folder.
+
+    Args:
+        mode: "serial", "parallel" or "pipeline". In parallel mode OCR and
+            patient extraction run in a process pool; lookup and routing stay
+            in this process and happen in input order. In pipeline mode
+            hashing, analysis, routing and KIM dispatch run as overlapping
+            stages (see src/pipeline.py); files are routed as their
+            analysis finishes.
+        workers: Number of worker processes (None = CPU count).
+        node: Multi-node mode: only process the PDFs this process can
+            claim with a lease (src/lease.py), so several processes or
+            hosts can work on one input folder.
+        node_id: Name of this node (None = host name).
+        status_port: Serve Prometheus metrics on this port while the PDFs
+            are processed (src/status_server.py); None = off.
+    """
+    print_header()
+
+    # Find PDFs first: most scheduled runs find none and can skip loading
+    # the CSV files
+    pdf_files = list(INPUT_FOLDER.glob(FILE_PATTERN))
+    claims = LeaseManager(node_id=node_id) if node else None
+    journal = load_journal(claims.node_id if claims else None)
+
+    if not pdf_files:
+        print(f"[INFO] No PDF files found in {INPUT_FOLDER}")
+        if journal is not None and journal.unsent():
+            return send_unsent(journal)
+        return True
+
+    print(f"[INFO] Found {len(pdf_files)} PDF files to process")
+
+    # Initialize lookup
+    lookup = PatientPharmacyLookup()
+    if not lookup.load_csv_data():
+        print("[ERROR] Failed to load CSV data. Exiting.")
+        return False
+
+    duplicates = load_duplicate_index()
+
+    workers = min(workers or os.cpu_count() or 1, len(pdf_files))
+    if claims:
+        print(f"[INFO] Node mode: node {claims.node_id}, leases in {claims.lease_folder}")
+    if mode == "parallel" and workers > 1:
+        print(f"[INFO] Parallel mode: {workers} worker processes")
+    elif mode == "pipeline":
+        print(f"[INFO] Pipeline mode: {workers} analysis worker process(es)")
+    print("-" * 60)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from src.kim_sender import KIMSender
+
+    # Process each PDF
+    results = new_results()
+    metrics = MetricsLog()
+    use_pool = mode == "pipeline" or (mode == "parallel" and workers > 1)
+    pool = ProcessPoolExecutor(max_workers=workers) if use_pool else None
+    sender = KIMSender()
+    server = start_status_server(status_port, results, metrics, lookup)
+    status = server.status if server else None
+    pipeline = make_pipeline(lookup, results, duplicates, sender, metrics, workers, pool, journal, status) if mode == "pipeline" else None
+
+    def run_batch(batch: List[Path]) -> None:
+        if pipeline:
+            pipeline.run(batch)
+        else:
+            process_batch(batch, lookup, results, pool, duplicates, sender, metrics, journal, status)
+
+    try:
+        if journal is not None:
+            requeue_unsent(journal, sender)
+        if claims:
+            processed = process_claimed(claims, pdf_files, run_batch)
+            print(f"\n[INFO] Node {claims.node_id} processed {processed} PDF(s)"
+                  f" ({claims.taken_over} taken over from other nodes)")
+        else:
+            run_batch(pdf_files)
+        if pipeline:
+            print(f"\n[INFO] Max queue depth: {pipeline.max_depths}")
+    finally:
+        sender.close()
+        if pool:
+            pool.shutdown()
+        if journal is not None:
+            journal.close()
+        if server:
+            server.stop()
+
+    print_summary(results, metrics)
+
     return results["error"] == 0
 
 
+def watch_pdfs(
+    mode: str = PROCESSING_MODE,
+    workers: Optional[int] = WORKER_COUNT,
+    node: bool = NODE_MODE,
+    node_id: Optional[str] = NODE_ID,
+    status_port: Optional[int] = STATUS_HTTP_PORT
+):
+    """
+    Long-running mode: process new PDFs as they arrive in the input folder.
+
+    The CSV lookup (and the process pool in parallel mode) stay loaded
+    between files; changed CSV files are reloaded in the background every
+    CSV_RELOAD_INTERVAL seconds. Runs until interrupted (Ctrl+C / SIGTERM)
+    and then prints the summary for the whole session.
+
+    Args:
+        mode: "serial", "parallel" or "pipeline" (see process_pdfs()).
+        workers: Number of worker processes (None = CPU count).
+        node, node_id: Multi-node mode (see process_pdfs()). Files claimed
+            by other nodes are checked again later, so the leases of a node
+            that died are taken over once they expire.
+        status_port: Serve Prometheus metrics on this port (see
+            process_pdfs()); also shows the files the watcher waits on.
+    """
+    print_header()
+
+    lookup = PatientPharmacyLookup()
+    if not lookup.load_csv_data():
+        print("[ERROR] Failed to load CSV data. Exiting.")
+        return False
+    lookup.start_auto_reload()
+    duplicates = load_duplicate_index()
+    claims = LeaseManager(node_id=node_id) if node else None
+    journal = load_journal(claims.node_id if claims else None)
+
+    # Turn SIGTERM (service stop) into the same clean shutdown as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    watcher = InputWatcher(INPUT_FOLDER)
+    watcher.start()
+    print(f"[INFO] Watching {INPUT_FOLDER} ({'events' if watcher.using_events else 'polling'})")
+    if claims:
+        print(f"[INFO] Node mode: node {claims.node_id}, leases in {claims.lease_folder}")
+        claims.start_renewal()
+
+    from concurrent.futures import ProcessPoolExecutor
+    from src.kim_sender import KIMSender
+
+    workers = workers or os.cpu_count() or 1
+    use_pool = mode == "pipeline" or (mode == "parallel" and workers > 1)
+    pool = ProcessPoolExecutor(max_workers=workers) if use_pool else None
+    sender = KIMSender()
+    results = new_results()
+    metrics = MetricsLog()
+    server = start_status_server(status_port, results, metrics, lookup)
+    status = server.status if server else None
+    if status is not None:
+        status.watcher = watcher
+    pipeline = make_pipeline(lookup, results, duplicates, sender, metrics, workers, pool, journal, status) if mode == "pipeline" else None
+    if journal is not None:
+        requeue_unsent(journal, sender)
+
+    try:
+        while True:
+            pdf_files = watcher.wait_for_ready()
+            if claims and pdf_files:
+                busy = [pdf_path for pdf_path in pdf_files if not claims.claim(pdf_path)]
+                # Held by another node: try again later (takeover on expiry)
+                watcher.forget([pdf_path for pdf_path in busy if not claims.is_done(pdf_path)])
+                pdf_files = [pdf_path for pdf_path in pdf_files if pdf_path not in busy]
+            if pipeline and pdf_files:
+                pipeline.run(pdf_files)
+            elif pdf_files:
+                process_batch(pdf_files, lookup, results, pool, duplicates, sender, metrics, journal, status)
+            if claims and pdf_files:
+                claims.release(pdf_files)
+    except KeyboardInterrupt:
+        print("\n[INFO] Stopping watch mode")
+    finally:
+        watcher.stop()
+        lookup.stop_auto_reload()
+        sender.close()
+        if claims:
+            claims.stop_renewal()
+            claims.abandon()
+        if journal is not None:
+            journal.close()
+        if pool:
+            pool.shutdown()
+        if server:
+            server.stop()
+
+    print_summary(results, metrics)
+
+    return results["error"] == 0
+
+
+def verify_routing() -> bool:
+    """
+    Check the routing manifest against the output folders and rebuild it.
+
+    Returns:
+        True if the manifest matched the files on disk.
+    """
+    manifest = RoutingManifest(OUTPUT_FOLDER)
+    differences = manifest.verify()
+
+    if not differences:
+        print("[OK] Routing manifest matches the output folders")
+        return True
+
+    for folder, (recorded, actual) in differences.items():
+        print(f"[WARN] {folder}: manifest {recorded}, on disk {actual}")
+    manifest.rebuild()
+    print(f"[INFO] Routing manifest rebuilt: {manifest.path}")
+    return False
+
+
+def run_profiled(func, *args, **kwargs):
+    """
+    Run a function under cProfile.
+
+    The stats are written to LOGS_FOLDER/profile_<time>.prof (open with
+    pstats or snakeviz) and the top functions are printed.
+
+    Returns:
+        The function's return value.
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        LOGS_FOLDER.mkdir(parents=True, exist_ok=True)
+        profile_path = LOGS_FOLDER / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof"
+        profiler.dump_stats(profile_path)
+        print(f"\n[INFO] Profile written to {profile_path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line arguments (defaults come from config/settings.py)."""
+    parser = argparse.ArgumentParser(description="eRezept-Automatisierung")
+    parser.add_argument(
+        "--mode",
+        choices=["serial", "parallel", "pipeline"],
+        default=PROCESSING_MODE,
+        help="Execution mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKER_COUNT,
+        help="Worker processes for parallel and pipeline mode (default: CPU count)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and process new PDFs as they arrive",
+    )
+    parser.add_argument(
+        "--node",
+        action="store_true",
+        default=NODE_MODE,
+        help="Multi-node mode: share the input folder with other processes / hosts via lease files",
+    )
+    parser.add_argument(
+        "--node-id",
+        default=NODE_ID,
+        help="Name of this node in multi-node mode (default: host name)",
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=STATUS_HTTP_PORT,
+        help="Serve Prometheus metrics on http://STATUS_HTTP_HOST:PORT/metrics while running (default: %(default)s = off)",
+    )
+    parser.add_argument(
+        "--verify-routing",
+        action="store_true",
+        help="Check the routing manifest against the output folders, rebuild it and exit",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    success = process_pdfs()
+    args = parse_args()
+    if args.verify_routing:
+        success = verify_routing()
+    else:
+        run = watch_pdfs if args.watch else process_pdfs
+        options = dict(
+            mode=args.mode,
+            workers=args.workers,
+            node=args.node,
+            node_id=args.node_id,
+            status_port=args.status_port,
+        )
+        if PROFILE_ENABLED:
+            success = run_profiled(run, **options)
+        else:
+            success = run(**options)
     sys.exit(0 if success else 1)
@@ -2,29 +2,275 @@
 CSV lookup module for patient-to-pharmacy mapping.
 
 Reads customer CSV files and provides lookup functions.
+
+Patients are indexed twice:
+- by "normalized name;birth date", with the name in both "Vorname Nachname"
+  and "Nachname Vorname" order
+- by birth date, for fuzzy matching among patients with the OCR'd birth
+  date and the "only patient with this birth date" fallback
+
+The patient CSV is streamed line by line: only the configured columns are
+split off, rows without "APO_" are skipped before any parsing, and the
+encoding (UTF-8, UTF-8 with BOM or cp1252) is detected on the way.
+
+Both indexes are also written to a compiled snapshot (see
+src/patient_snapshot.py), which is loaded instead of the patient CSV as
+long as the CSV is unchanged.
 """
+import codecs
 import csv
 import re
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from config.settings import (
     PATIENT_APO_MAPPING_CSV,
     KIM_APO_MAPPING_CSV,
     CSV_COLUMNS,
+    FUZZY_MATCH_ENABLED,
+    BIRTH_DATE_FALLBACK_ENABLED,
+    CSV_RELOAD_INTERVAL,
+    PATIENT_SNAPSHOT_ENABLED,
+    PATIENT_SNAPSHOT_FILE,
 )
+from src.hashing import file_sha256
+from src.name_matching import best_fuzzy_match
+from src.patient_snapshot import load_snapshot, save_snapshot
+
+_APO_KEY_PATTERN = re.compile(r"(APO_[A-Z_]+)")
+
+# Version of the patient CSV parsing (normalize_name(), the APO_ pattern,
+# the record splitting); bump it when they change, so existing patient
+# snapshots are rebuilt
+PARSER_VERSION = 1
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a name for index lookups (collapse whitespace, ignore case).
+
+    Args:
+        name: Name as read from CSV or OCR.
+
+    Returns:
+        Normalized name.
+    """
+    return " ".join(name.split()).casefold()
+
+
+class LookupIndex:
+    """
+    Immutable snapshot of the loaded CSV data.
+
+    A reload builds a complete new snapshot and replaces the old one in a
+    single attribute assignment, so readers never see a half-loaded index.
+    """
+    
+    def __init__(
+        self,
+        name_index: Dict[str, str],
+        date_index: Dict[str, Tuple[str, ...]],
+        kim_cache: Dict[str, dict],
+        signatures: Dict[Path, tuple]
+    ):
+        # "normalized name;birth date" -> APO_KEY
+        self.name_index = name_index
+        # birth date -> normalized "Vorname Nachname" of every patient born that day
+        self.date_index = date_index
+        # APO_KEY -> {"kim_address", "apo_name"}
+        self.kim_cache = kim_cache
+        # CSV path -> (mtime_ns, size, sha256) at load time
+        self.signatures = signatures
+        # Wall clock time the index was built
+        self.loaded_at = time.time()
+    
+    @property
+    def patient_count(self) -> int:
+        """Number of distinct patients (name + birth date)."""
+        return sum(len(names) for names in self.date_index.values())
+
+
+def file_signature(path: Path) -> Optional[tuple]:
+    """
+    Get the change-detection signature of a file.
+
+    Args:
+        path: File path.
+
+    Returns:
+        Tuple of (mtime_ns, size, sha256), or None if the file is missing.
+    """
+    stat_signature = _stat_signature(path)
+    if stat_signature is None:
+        return None
+    return stat_signature + (file_sha256(path),)
+
+
+def _stat_signature(path: Path) -> Optional[tuple]:
+    """Get (mtime_ns, size) of a file, or None if it is missing."""
+    try:
+        stat = path.stat()
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+class DecodedLines:
+    """
+    Lines of a binary file decoded in a single pass.
+
+    Lines are decoded as UTF-8 (a leading BOM is dropped) until the first
+    line that is not valid UTF-8; from there on the file is read as cp1252,
+    the other encoding of the practice software export. Lines before the
+    switch decode the same either way unless they contain umlauts, which
+    would already have failed as UTF-8 in a cp1252 file.
+    """
+    
+    def __init__(self, f):
+        """
+        Args:
+            f: File opened in binary mode.
+        """
+        self._f = f
+        # "utf-8", "utf-8-sig" or "cp1252" (as far as read)
+        self.encoding = "utf-8"
+        self.count = 0
+    
+    def __iter__(self) -> Iterator[str]:
+        first = True
+        for raw in self._f:
+            self.count += 1
+            if first:
+                first = False
+                if raw.startswith(codecs.BOM_UTF8):
+                    raw = raw[len(codecs.BOM_UTF8):]
+                    self.encoding = "utf-8-sig"
+            
+            if self.encoding != "cp1252":
+                try:
+                    yield raw.decode("utf-8")
+                    continue
+                except UnicodeDecodeError:
+                    self.encoding = "cp1252"
+            
+            yield raw.decode("cp1252", errors="replace")
+
+
+def iter_records(lines, delimiter: str = ";", max_column: int = -1, contains: str = "") -> Iterator[List[str]]:
+    """
+    Split CSV lines into records, without parsing more than needed.
+
+    Lines without quotes are split with str.split() up to `max_column`;
+    quoted records (possibly spanning lines) go through csv.reader.
+
+    Args:
+        lines: Iterable of text lines.
+        delimiter: Field delimiter.
+        max_column: Last column that is needed; later columns stay joined in
+            the following field (-1 = split all).
+        contains: Skip records that do not contain this text (checked before
+            splitting; the header is never skipped).
+
+    Returns:
+        Iterator of field lists.
+    """
+    pending = ""
+    first = True
+    for line in lines:
+        if pending:
+            line = pending + line
+            pending = ""
+        
+        quoted = '"' in line
+        if quoted and _ends_in_quoted_field(line, delimiter):
+            # Quoted field continues on the next line
+            pending = line
+            continue
+        
+        if contains and contains not in line and not first:
+            continue
+        first = False
+        
+        if quoted:
+            yield next(csv.reader([line], delimiter=delimiter))
+        else:
+            yield line.rstrip("\r\n").split(delimiter, max_column + 1 if max_column >= 0 else -1)
+
+
+def _ends_in_quoted_field(text: str, delimiter: str) -> bool:
+    """
+    Check whether a record ends inside a quoted field, like csv.reader.
+
+    A quote only opens a field at the start of the record or right after a
+    delimiter; elsewhere (e.g. '5" Verband') it is part of the text.
+    """
+    in_quotes = False
+    field_start = True
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_quotes:
+            if char == '"':
+                if text.startswith('"', i + 1):
+                    # Escaped quote ("")
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and field_start:
+            in_quotes = True
+        field_start = not in_quotes and char == delimiter
+        i += 1
+    return in_quotes
 
 
 class PatientPharmacyLookup:
     """
     Handles patient-to-pharmacy lookups from CSV data.
+
+    The CSVs can be reloaded while lookups are running (see
+    start_auto_reload()); lookups always use one complete LookupIndex.
     """
     
-    def __init__(self):
-        """Initialize the lookup with empty caches."""
-        self._patient_cache: Dict[str, str] = {}
-        self._kim_cache: Dict[str, dict] = {}
+    def __init__(
+        self,
+        patient_csv: Path = PATIENT_APO_MAPPING_CSV,
+        kim_csv: Path = KIM_APO_MAPPING_CSV,
+        snapshot_file: Optional[Path] = PATIENT_SNAPSHOT_FILE
+    ):
+        """
+        Initialize the lookup with empty caches.
+
+        Args:
+            patient_csv: Path to the patient-to-pharmacy CSV.
+            kim_csv: Path to the KIM address CSV.
+            snapshot_file: Compiled snapshot of the patient CSV (None = always
+                parse the CSV).
+        """
+        self.patient_csv = patient_csv
+        self.kim_csv = kim_csv
+        self.snapshot_file = snapshot_file if PATIENT_SNAPSHOT_ENABLED else None
+        self._index = LookupIndex({}, {}, {}, {})
         self._loaded = False
+        self._reload_lock = threading.Lock()
+        self._reload_stop: Optional[threading.Event] = None
+        self._reload_thread: Optional[threading.Thread] = None
+    
+    @property
+    def patient_count(self) -> int:
+        """Number of distinct patients (name + birth date) in the index."""
+        return self._index.patient_count
+    
+    @property
+    def kim_count(self) -> int:
+        """Number of pharmacies with a KIM address in the index."""
+        return len(self._index.kim_cache)
+    
+    @property
+    def loaded_at(self) -> Optional[float]:
+        """Wall clock time the current index was loaded, or None."""
+        return self._index.loaded_at if self._loaded else None
     
     def load_csv_data(self) -> bool:
         """
@@ -33,72 +279,208 @@ class PatientPharmacyLookup:
         Returns:
             True if both files loaded successfully, False otherwise.
         """
-        patient_ok = self._load_patient_mapping()
-        kim_ok = self._load_kim_mapping()
-        self._loaded = patient_ok and kim_ok
-        return self._loaded
+        with self._reload_lock:
+            index = self._build_index()
+            self._index = index
+            self._loaded = len(index.signatures) == 2
+            return self._loaded
+    
+    def reload_if_changed(self) -> bool:
+        """
+        Rebuild the index if either CSV file has changed.
+
+        Changes are detected by mtime and size, confirmed by content hash
+        (a touched but unchanged file does not trigger a rebuild). The
+        current index stays in use if the new one cannot be loaded
+        completely, e.g. because the file is still being written.
+
+        Returns:
+            True if a new index was swapped in.
+        """
+        with self._reload_lock:
+            old = self._index
+            
+            changed = False
+            for path in (self.patient_csv, self.kim_csv):
+                previous = old.signatures.get(path)
+                if previous and _stat_signature(path) == previous[:2]:
+                    continue
+                current = file_signature(path)
+                if current and not (previous and previous[2] == current[2]):
+                    changed = True
+            
+            if not changed:
+                return False
+            
+            start = time.perf_counter()
+            index = self._build_index()
+            
+            # Reject a snapshot of a file that changed while we read it
+            if len(index.signatures) != 2 or any(
+                _stat_signature(path) != signature[:2]
+                for path, signature in index.signatures.items()
+            ):
+                print("[WARN] CSV changed or failed during reload, keeping current data")
+                return False
+            
+            self._index = index
+            self._loaded = True
+            duration = time.perf_counter() - start
+            print(
+                f"[INFO] Reloaded CSV data in {duration:.2f}s "
+                f"(patients: {old.patient_count} -> {index.patient_count}, "
+                f"{index.patient_count - old.patient_count:+d}; "
+                f"KIM: {len(old.kim_cache)} -> {len(index.kim_cache)}, "
+                f"{len(index.kim_cache) - len(old.kim_cache):+d})"
+            )
+            return True
+    
+    def start_auto_reload(self, interval: float = CSV_RELOAD_INTERVAL) -> None:
+        """
+        Check the CSV files for changes in a background thread.
+
+        Args:
+            interval: Seconds between checks (0 disables auto reload).
+        """
+        if interval <= 0 or self._reload_thread:
+            return
+        
+        self._reload_stop = threading.Event()
+        
+        def run():
+            while not self._reload_stop.wait(interval):
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"[ERROR] CSV reload failed: {e}")
+        
+        self._reload_thread = threading.Thread(target=run, name="csv-reload", daemon=True)
+        self._reload_thread.start()
+    
+    def stop_auto_reload(self) -> None:
+        """Stop the background reload thread."""
+        if self._reload_thread:
+            self._reload_stop.set()
+            self._reload_thread.join()
+            self._reload_thread = None
+    
+    def _build_index(self) -> LookupIndex:
+        """
+        Load both CSV files into a new index.
+
+        A file that fails to load contributes empty data and no signature.
+
+        Returns:
+            New LookupIndex.
+        """
+        signatures = {}
+        
+        # A snapshot is only valid for the column mapping and parser that built it
+        layout = {"columns": CSV_COLUMNS, "parser": PARSER_VERSION}
+        snapshot = load_snapshot(self.snapshot_file, self.patient_csv, layout) if self.snapshot_file else None
+        if snapshot:
+            patient_signature, name_index, date_index = snapshot
+            signatures[self.patient_csv] = patient_signature
+            print(f"[INFO] Loaded {sum(len(names) for names in date_index.values())} patients (snapshot)")
+        else:
+            patient_signature = file_signature(self.patient_csv)
+            patient_data = self._load_patient_mapping()
+            if patient_data is not None and patient_signature:
+                signatures[self.patient_csv] = patient_signature
+                # Only snapshot what was read from an unchanged file
+                if self.snapshot_file and _stat_signature(self.patient_csv) == patient_signature[:2]:
+                    save_snapshot(self.snapshot_file, self.patient_csv, patient_signature, *patient_data, layout=layout)
+            name_index, date_index = patient_data or ({}, {})
+        
+        kim_signature = file_signature(self.kim_csv)
+        kim_cache = self._load_kim_mapping()
+        if kim_cache is not None and kim_signature:
+            signatures[self.kim_csv] = kim_signature
+        
+        return LookupIndex(name_index, date_index, kim_cache or {}, signatures)
     
-    def _load_patient_mapping(self) -> bool:
+    def _load_patient_mapping(self) -> Optional[Tuple[Dict[str, str], Dict[str, Tuple[str, ...]]]]:
         """
         Load patient-to-pharmacy mapping from CSV.
 
         Returns:
-            True if loaded successfully.
+            Tuple of (name index, date index), or None on failure.
         """
         try:
-            if not PATIENT_APO_MAPPING_CSV.exists():
-                print(f"[ERROR] Patient CSV not found: {PATIENT_APO_MAPPING_CSV}")
-                return False
+            if not self.patient_csv.exists():
+                print(f"[ERROR] Patient CSV not found: {self.patient_csv}")
+                return None
+            
+            name_index: Dict[str, str] = {}
+            date_index: Dict[str, Tuple[str, ...]] = {}
             
-            with open(PATIENT_APO_MAPPING_CSV, "r", encoding="utf-8") as f:
-                reader = csv.reader(f, delimiter=";")
+            last_name_column = CSV_COLUMNS["last_name"]
+            first_name_column = CSV_COLUMNS["first_name"]
+            birth_date_column = CSV_COLUMNS["birth_date"]
+            apo_key_column = CSV_COLUMNS["apo_key"]
+            max_column = max(CSV_COLUMNS.values())
+            
+            start = time.perf_counter()
+            with open(self.patient_csv, "rb") as f:
+                lines = DecodedLines(f)
+                # Rows without "APO_" cannot yield a patient and are not split
+                records = iter_records(lines, ";", max_column, contains="APO_")
                 
                 # Skip header row
-                next(reader, None)
+                next(records, None)
                 
-                for row in reader:
-                    if len(row) <= CSV_COLUMNS["apo_key"]:
+                for row in records:
+                    if len(row) <= max_column:
                         continue
                     
-                    last_name = row[CSV_COLUMNS["last_name"]].strip()
-                    first_name = row[CSV_COLUMNS["first_name"]].strip()
-                    birth_date = row[CSV_COLUMNS["birth_date"]].strip()
-                    sozialanamnese = row[CSV_COLUMNS["apo_key"]]
+                    last_name = row[last_name_column].strip()
+                    first_name = row[first_name_column].strip()
+                    birth_date = row[birth_date_column].strip()
+                    sozialanamnese = row[apo_key_column]
                     
                     # Extract APO_KEY from Sozialanamnese text
                     apo_key = self._extract_apo_key(sozialanamnese)
                     
                     if last_name and first_name and birth_date and apo_key:
-                        # Create multiple key variants for flexible matching
-                        keys = [
-                            f"{last_name};{first_name};{birth_date}",
-                            f"{first_name} {last_name};{birth_date}",
-                            f"{last_name} {first_name};{birth_date}",
-                        ]
-                        for key in keys:
-                            self._patient_cache[key] = apo_key
+                        # Index both name orders for flexible matching
+                        full_name = normalize_name(f"{first_name} {last_name}")
+                        reversed_name = normalize_name(f"{last_name} {first_name}")
+                        name_index[f"{full_name};{birth_date}"] = apo_key
+                        name_index[f"{reversed_name};{birth_date}"] = apo_key
+                        
+                        # Tuples are much smaller than per-date dicts or lists
+                        names = date_index.get(birth_date, ())
+                        if full_name not in names:
+                            date_index[birth_date] = names + (full_name,)
+            duration = time.perf_counter() - start
             
-            print(f"[INFO] Loaded {len(self._patient_cache)} patient cache entries")
-            return True
+            print(
+                f"[INFO] Loaded {sum(len(names) for names in date_index.values())} patients "
+                f"from {lines.count} lines in {duration:.2f}s "
+                f"({lines.count / max(duration, 1e-6):,.0f} rows/s, {lines.encoding})"
+            )
+            return name_index, date_index
         
         except Exception as e:
             print(f"[ERROR] Failed to load patient CSV: {e}")
-            return False
+            return None
     
-    def _load_kim_mapping(self) -> bool:
+    def _load_kim_mapping(self) -> Optional[Dict[str, dict]]:
         """
         Load KIM address mapping from CSV.
 
         Returns:
-            True if loaded successfully.
+            Dict of APO_KEY -> KIM info, or None on failure.
         """
         try:
-            if not KIM_APO_MAPPING_CSV.exists():
-                print(f"[ERROR] KIM CSV not found: {KIM_APO_MAPPING_CSV}")
-                return False
+            if not self.kim_csv.exists():
+                print(f"[ERROR] KIM CSV not found: {self.kim_csv}")
+                return None
+            
+            kim_cache: Dict[str, dict] = {}
             
-            with open(KIM_APO_MAPPING_CSV, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f, delimiter=";")
+            with open(self.kim_csv, "rb") as f:
+                reader = csv.DictReader(DecodedLines(f), delimiter=";")
                 
                 for row in reader:
                     apo_key = row.get("KIM_APO", "").strip()
@@ -106,17 +488,17 @@ class PatientPharmacyLookup:
                     apo_name = row.get("APO_NAME", "").strip()
                     
                     if apo_key and kim_addr:
-                        self._kim_cache[apo_key] = {
+                        kim_cache[apo_key] = {
                             "kim_address": kim_addr,
                             "apo_name": apo_name,
                         }
             
-            print(f"[INFO] Loaded {len(self._kim_cache)} KIM cache entries")
-            return True
+            print(f"[INFO] Loaded {len(kim_cache)} KIM cache entries")
+            return kim_cache
         
         except Exception as e:
             print(f"[ERROR] Failed to load KIM CSV: {e}")
-            return False
+            return None
     
     def _extract_apo_key(self, text: str) -> Optional[str]:
         """
@@ -128,7 +510,7 @@ class PatientPharmacyLookup:
         Returns:
             APO_KEY string (e.g., "APO_BAEREN") or None.
         """
-        match = re.search(r"(APO_[A-Z_]+)", text)
+        match = _APO_KEY_PATTERN.search(text)
         if match:
             return match.group(1)
         return None
@@ -147,33 +529,37 @@ class PatientPharmacyLookup:
         if not self._loaded:
             self.load_csv_data()
         
-        # Try different name formats
-        # OCR gives us "Vorname Nachname", CSV has "Nachname;Vorname"
+        # Use one snapshot for the whole lookup (a reload may swap it)
+        index = self._index
+        
+        # OCR gives us "Vorname Nachname", CSV has "Nachname;Vorname".
+        # Both name orders are indexed, so the OCR name is tried as read
+        # and with its first word moved to the end.
         name_parts = patient_name.split()
         
         if len(name_parts) >= 2:
             first_name = name_parts[0]
             last_name = " ".join(name_parts[1:])  # Handle multi-part last names
             
-            # Try: Nachname;Vorname;Datum (primary CSV format)
-            key1 = f"{last_name};{first_name};{birth_date}"
-            if key1 in self._patient_cache:
-                return self._patient_cache[key1]
-            
-            # Try: Vorname Nachname;Datum
-            key2 = f"{first_name} {last_name};{birth_date}"
-            if key2 in self._patient_cache:
-                return self._patient_cache[key2]
-            
-            # Try: Nachname Vorname;Datum
-            key3 = f"{last_name} {first_name};{birth_date}"
-            if key3 in self._patient_cache:
-                return self._patient_cache[key3]
+            for name in (f"{first_name} {last_name}", f"{last_name} {first_name}"):
+                apo_key = index.name_index.get(f"{normalize_name(name)};{birth_date}")
+                if apo_key:
+                    return apo_key
+        
+        names = index.date_index.get(birth_date, ())
+        
+        # Fuzzy match against patients with the same birth date (OCR errors)
+        if FUZZY_MATCH_ENABLED and len(name_parts) >= 2:
+            match = best_fuzzy_match(patient_name, names)
+            if match:
+                name, confidence = match
+                print(f"  [INFO] Fuzzy name match: {name} (confidence {confidence:.2f})")
+                return index.name_index[f"{name};{birth_date}"]
         
         # Fallback: Search by birth date only (if unique)
-        matching = [k for k in self._patient_cache.keys() if k.endswith(f";{birth_date}")]
-        if len(matching) == 1:
-            return self._patient_cache[matching[0]]
+        if BIRTH_DATE_FALLBACK_ENABLED and len(names) == 1:
+            print(f"  [WARN] No name match, using the only patient born {birth_date}: {names[0]}")
+            return index.name_index[f"{names[0]};{birth_date}"]
         
         return None
     
@@ -190,4 +576,4 @@ class PatientPharmacyLookup:
         if not self._loaded:
             self.load_csv_data()
         
-        return self._kim_cache.get(apo_key)
+        return self._index.kim_cache.get(apo_key)
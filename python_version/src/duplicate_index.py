@@ -0,0 +1,75 @@
+"""
+Persistent index of already processed PDFs (by SHA-256 of the content).
+
+Counterpart of the PowerShell duplicate check (Test-DuplicateFile), which
+scans the JSONL logs. Here the hashes are kept in an append-only text file
+(one hex digest per line) and loaded into a set, so lookups stay O(1) and
+recording a file is a single appended line.
+"""
+from pathlib import Path
+from typing import Optional, Set
+
+from config.settings import DUPLICATE_INDEX_FILE
+
+# Length of a SHA-256 hex digest
+_HASH_LENGTH = 64
+
+
+class DuplicateIndex:
+    """
+    Set of content hashes of PDFs that were routed to a pharmacy.
+
+    A line that was only partly written (e.g. after a crash) is ignored on
+    load, so the file never has to be rewritten.
+    """
+    
+    def __init__(self, index_file: Path = DUPLICATE_INDEX_FILE):
+        """
+        Initialize the index.
+
+        Args:
+            index_file: Path to the append-only hash file.
+        """
+        self.index_file = index_file
+        self._hashes: Set[str] = set()
+    
+    def load(self) -> int:
+        """
+        Load the recorded hashes from disk.
+
+        Returns:
+            Number of hashes loaded.
+        """
+        self._hashes = set()
+        
+        try:
+            with open(self.index_file, "r", encoding="ascii", errors="replace") as f:
+                for line in f:
+                    file_hash = line.strip()
+                    if len(file_hash) == _HASH_LENGTH:
+                        self._hashes.add(file_hash)
+        except FileNotFoundError:
+            pass
+        
+        return len(self._hashes)
+    
+    def __contains__(self, file_hash: Optional[str]) -> bool:
+        return file_hash in self._hashes
+    
+    def __len__(self) -> int:
+        return len(self._hashes)
+    
+    def add(self, file_hash: str) -> None:
+        """
+        Record a processed file.
+
+        Args:
+            file_hash: SHA-256 hex digest of the file.
+        """
+        if file_hash in self._hashes:
+            return
+        
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file, "a", encoding="ascii") as f:
+            f.write(file_hash + "\n")
+        self._hashes.add(file_hash)
@@ -2,64 +2,377 @@
 File routing module for organizing processed PDFs.
 
 Routes PDFs to pharmacy-specific folders or 'unklar' folder.
+Multi-patient PDFs are split into one PDF per patient first (split_pdf()).
 """
+import itertools
+import json
+import os
 import shutil
+import subprocess
+import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from config.settings import OUTPUT_FOLDER
+from config.settings import (
+    OUTPUT_FOLDER,
+    MANIFEST_LOCK_TIMEOUT,
+    ROUTING_MODE,
+    ROUTING_MANIFEST_NAME,
+    SPLIT_FOLDER,
+    SPLIT_TIMEOUT,
+)
+from src.hashing import file_sha256
+from src.lease import exclusive_lock
 
 
 def route_pdf(
     pdf_path: Path,
     apo_key: Optional[str],
-    patient_info: Optional[dict] = None
+    patient_info: Optional[dict] = None,
+    output_folder: Path = OUTPUT_FOLDER,
+    mode: str = ROUTING_MODE
 ) -> Path:
     """
     Route a PDF to the appropriate output folder.
 
+    Existing files are never overwritten: on a name collision the PDF is
+    stored as "<name>_1.pdf", "<name>_2.pdf", ...
+
     Args:
         pdf_path: Path to the source PDF.
         apo_key: Pharmacy key (e.g., "APO_BAEREN") or None.
         patient_info: Optional patient info dict for logging.
+        output_folder: Root of the pharmacy folders.
+        mode: "move" (rename; the input folder drains), "link" (hard link,
+            original stays) or "copy" (original stays). Move and link fall
+            back to copying across file systems.
 
     Returns:
         Path to the destination file.
     """
     if apo_key:
-        dest_folder = OUTPUT_FOLDER / apo_key
+        dest_folder = output_folder / apo_key
     else:
-        dest_folder = OUTPUT_FOLDER / "unklar"
+        dest_folder = output_folder / "unklar"
     
     # Create folder if needed
     dest_folder.mkdir(parents=True, exist_ok=True)
+    RoutingManifest(output_folder).ensure()
+    
+    if mode == "link":
+        for dest_path in _candidate_paths(dest_folder, pdf_path.name):
+            try:
+                os.link(pdf_path, dest_path)
+                RoutingManifest(output_folder).record(dest_folder.name)
+                return dest_path
+            except FileExistsError:
+                continue
+            except OSError:
+                # Different file system or no hard link support
+                break
     
-    # Copy file to destination
-    dest_path = dest_folder / pdf_path.name
-    shutil.copy2(pdf_path, dest_path)
+    dest_path = _reserve_path(dest_folder, pdf_path.name)
+    try:
+        if mode == "move":
+            try:
+                # Atomically replaces the empty placeholder
+                os.replace(pdf_path, dest_path)
+            except OSError:
+                # Different file system: copy, then remove the original
+                shutil.copy2(pdf_path, dest_path)
+                pdf_path.unlink()
+        else:
+            shutil.copy2(pdf_path, dest_path)
+    except Exception:
+        if dest_path.exists() and dest_path.stat().st_size == 0:
+            dest_path.unlink()
+        raise
     
+    RoutingManifest(output_folder).record(dest_folder.name)
     return dest_path
 
 
-def get_routing_summary(output_folder: Path) -> dict:
+def find_routed(
+    file_name: str,
+    apo_key: Optional[str],
+    file_hash: str,
+    output_folder: Path = OUTPUT_FOLDER
+) -> Optional[Path]:
     """
-    Get summary of routed files.
+    Find where route_pdf() put a PDF, by its content hash.
+
+    Used after a restart when the run died between routing a PDF and
+    journaling its destination. Checks "<name>", "<name>_1", ... in the
+    pharmacy folder up to the first name that does not exist.
+
+    Args:
+        file_name: Name of the PDF in the input folder.
+        apo_key: Pharmacy key, or None for 'unklar'.
+        file_hash: SHA-256 of the PDF.
+        output_folder: Root of the pharmacy folders.
+
+    Returns:
+        Path of the routed PDF, or None if it is not there.
+    """
+    dest_folder = output_folder / (apo_key or "unklar")
+    for dest_path in _candidate_paths(dest_folder, file_name):
+        try:
+            if file_sha256(dest_path) == file_hash:
+                return dest_path
+        except FileNotFoundError:
+            return None
+        except OSError:
+            continue
+
+
+def _candidate_paths(folder: Path, name: str) -> Iterator[Path]:
+    """Yield "<name>", "<stem>_1<suffix>", "<stem>_2<suffix>", ... in folder."""
+    yield folder / name
+    stem, suffix = os.path.splitext(name)
+    for number in itertools.count(1):
+        yield folder / f"{stem}_{number}{suffix}"
+
+
+def _reserve_path(folder: Path, name: str) -> Path:
+    """
+    Claim a free file name by creating an empty placeholder exclusively.
+
+    Creating with O_EXCL is atomic, so two routers can never pick the same
+    name. The caller replaces the placeholder with the real file.
+    """
+    for dest_path in _candidate_paths(folder, name):
+        try:
+            with open(dest_path, "xb"):
+                return dest_path
+        except FileExistsError:
+            continue
+
+
+def split_pdf(
+    pdf_path: Path,
+    page_groups: List[List[int]],
+    split_folder: Path = SPLIT_FOLDER
+) -> List[Path]:
+    """
+    Split a PDF into one PDF per group of consecutive pages.
+
+    Uses poppler's pdfseparate (one file per page) and pdfunite. Parts are
+    named "<name>_p<first>-<last>.pdf" ("<name>_p<page>.pdf" for a single
+    page) and stay in split_folder until they
+    are routed.
+
+    Args:
+        pdf_path: Source PDF (left unchanged).
+        page_groups: Page numbers (1-based, consecutive) per part.
+        split_folder: Folder for the parts.
+
+    Returns:
+        Paths of the parts, in the order of page_groups.
+
+    Raises:
+        OSError, subprocess.SubprocessError: If poppler is missing or fails;
+            parts written so far are removed.
+    """
+    split_folder.mkdir(parents=True, exist_ok=True)
+    parts: List[Path] = []
+    
+    try:
+        with tempfile.TemporaryDirectory(dir=split_folder) as tmp:
+            for pages in page_groups:
+                first, last = pages[0], pages[-1]
+                pattern = Path(tmp) / f"page_{first}_%d.pdf"
+                _run_poppler(["pdfseparate", "-f", str(first), "-l", str(last), str(pdf_path), str(pattern)])
+                page_files = [Path(tmp) / f"page_{first}_{page}.pdf" for page in range(first, last + 1)]
+                
+                pages_label = f"p{first}" if first == last else f"p{first}-{last}"
+                part = _reserve_path(split_folder, f"{pdf_path.stem}_{pages_label}.pdf")
+                parts.append(part)
+                if len(page_files) == 1:
+                    os.replace(page_files[0], part)
+                else:
+                    _run_poppler(["pdfunite"] + [str(path) for path in page_files] + [str(part)])
+    except (OSError, subprocess.SubprocessError):
+        for part in parts:
+            part.unlink(missing_ok=True)
+        raise
+    
+    return parts
+
+
+def _run_poppler(command: List[str]) -> None:
+    """Run a poppler tool, raising on failure."""
+    subprocess.run(command, capture_output=True, timeout=SPLIT_TIMEOUT, check=True)
+
+
+class RoutingManifest:
+    """
+    Persistent per-folder counts of routed PDFs.
+
+    Stored as JSON in the output folder and updated by route_pdf(), so the
+    routing summary does not have to list the whole output tree. Files
+    added or removed by hand are not tracked; verify() / rebuild()
+    reconcile the counts with the disk.
+
+    Updates hold a lock file next to the manifest, so several processes
+    (multi-node mode) can route into the same output folder without
+    losing counts.
+    """
+    
+    def __init__(self, output_folder: Path = OUTPUT_FOLDER):
+        """
+        Initialize the manifest.
+
+        Args:
+            output_folder: Path to output folder (the manifest lives inside).
+        """
+        self.output_folder = output_folder
+        self.path = output_folder / ROUTING_MANIFEST_NAME
+        self.lock_path = output_folder / (ROUTING_MANIFEST_NAME + ".lock")
+    
+    def counts(self) -> Dict[str, int]:
+        """
+        Get the routed file counts per folder.
+
+        A missing or unreadable manifest is rebuilt from the disk.
+
+        Returns:
+            Dict with folder names as keys and file counts as values.
+        """
+        counts = self._read()
+        if counts is None:
+            counts = self.rebuild()
+        return counts
+    
+    def ensure(self) -> None:
+        """
+        Create the manifest from the disk if there is none yet.
+
+        Called before files are routed: counting the disk later could
+        include files of another process that has not recorded them yet.
+        """
+        if self.path.exists():
+            return
+        try:
+            with exclusive_lock(self.lock_path, timeout=MANIFEST_LOCK_TIMEOUT):
+                if not self.path.exists():
+                    self._write(count_routed_files(self.output_folder))
+        except TimeoutError as e:
+            print(f"[WARN] Routing manifest not created: {e}")
+    
+    def record(self, folder_name: str, count: int = 1) -> None:
+        """
+        Add routed files to a folder's count.
+
+        Call after the files have been written: if the manifest has gone
+        missing, it is rebuilt from the disk, which already includes them.
+
+        Args:
+            folder_name: Destination folder name (APO key or "unklar").
+            count: Number of files routed.
+        """
+        try:
+            with exclusive_lock(self.lock_path, timeout=MANIFEST_LOCK_TIMEOUT):
+                counts = self._read()
+                if counts is None:
+                    self._write(count_routed_files(self.output_folder))
+                    return
+                counts[folder_name] = counts.get(folder_name, 0) + count
+                self._write(counts)
+        except TimeoutError as e:
+            # The file is routed; --verify-routing fixes the count
+            print(f"[WARN] Routing manifest not updated: {e}")
+    
+    def rebuild(self) -> Dict[str, int]:
+        """
+        Recount the PDFs on disk and rewrite the manifest.
+
+        Returns:
+            The recounted dict with folder names as keys and file counts as
+            values.
+        """
+        counts = count_routed_files(self.output_folder)
+        if self.output_folder.exists():
+            self._write(counts)
+        return counts
+    
+    def verify(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Compare the manifest with the PDFs on disk.
+
+        Returns:
+            Dict of folders whose counts differ, with
+            (manifest count, disk count) values. Empty if consistent.
+        """
+        recorded = self.counts()
+        actual = count_routed_files(self.output_folder)
+        return {
+            name: (recorded.get(name, 0), actual.get(name, 0))
+            for name in sorted(set(recorded) | set(actual))
+            if recorded.get(name, 0) != actual.get(name, 0)
+        }
+    
+    def _read(self) -> Optional[Dict[str, int]]:
+        """Read the manifest; None if it is missing or unreadable."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {name: int(count) for name, count in data["counts"].items()}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"[WARN] Routing manifest unreadable, rebuilding: {e}")
+            return None
+    
+    def _write(self, counts: Dict[str, int]) -> None:
+        """Write the manifest atomically (temp file + os.replace)."""
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "counts": counts}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def count_routed_files(output_folder: Path) -> Dict[str, int]:
+    """
+    Count the PDFs in each folder of the output tree.
 
     Args:
         output_folder: Path to output folder.
 
     Returns:
-        Dict with folder names as keys and file counts as values.
+        Dict with folder names as keys and file counts as values (folders
+        without PDFs are left out).
     """
-    summary = {}
+    counts = {}
     
     if not output_folder.exists():
-        return summary
+        return counts
     
     for folder in output_folder.iterdir():
         if folder.is_dir():
-            pdf_count = len(list(folder.glob("*.pdf")))
+            pdf_count = sum(1 for _ in folder.glob("*.pdf"))
             if pdf_count > 0:
-                summary[folder.name] = pdf_count
+                counts[folder.name] = pdf_count
+    
+    return counts
+
+
+def get_routing_summary(output_folder: Path) -> dict:
+    """
+    Get summary of routed files.
+
+    Reads the routing manifest instead of listing the output folders.
+
+    Args:
+        output_folder: Path to output folder.
+
+    Returns:
+        Dict with folder names as keys and file counts as values.
+    """
+    if not output_folder.exists():
+        return {}
     
-    return summary
+    return {
+        name: count
+        for name, count in RoutingManifest(output_folder).counts().items()
+        if count > 0
+    }
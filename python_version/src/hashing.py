@@ -0,0 +1,28 @@
+"""
+File hashing helpers.
+
+Hashes are computed in fixed-size chunks so large files never have to be
+loaded into memory at once.
+"""
+import hashlib
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Compute the SHA-256 hash of a file.
+
+    Args:
+        path: Path to the file.
+        chunk_size: Number of bytes read per chunk.
+
+    Returns:
+        Hex digest string.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
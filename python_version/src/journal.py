@@ -0,0 +1,297 @@
+"""
+Write-ahead journal of the batch progress, so a crashed run can resume.
+
+Every PDF (keyed by the SHA-256 of its content) passes through the stages
+
+    claimed -> analyzed -> looked_up [-> routing] -> routed -> sent
+
+and each stage is appended as one JSON line to JOURNAL_FILE. After a crash
+(OCR hang, reboot, service restart) the next run reads the journal back:
+- routed / sent: the PDF is not processed again, even if it is still in
+  the input folder ("copy" / "link" routing)
+- analyzed / looked_up: the stored analysis is used, no OCR
+- routed with a KIM address, but not sent: re-queued for sending
+- routing: the PDF was about to go to a pharmacy with a KIM address; if
+  its routed copy is found (by content hash) it is re-queued for sending,
+  otherwise it is processed again with the stored analysis
+
+Compacting (at the end of a run, and every JOURNAL_COMPACT_RECORDS
+records in between) keeps only the PDFs that are still unfinished: not
+routed yet, or routed with a KIM address but not sent. Finished PDFs are
+dropped, so the journal stays small and a PDF that was moved from
+'unklar' back into the input folder is processed again; PDFs routed to a
+pharmacy are still skipped by the duplicate index.
+
+Records are buffered and written in batches (one write and fsync per
+JOURNAL_BATCH_SIZE records or JOURNAL_FLUSH_INTERVAL seconds), and always
+before KIM messages go out. A crash loses at most the last batch. PDFs of
+that batch still in the input folder are processed again; one with a KIM
+address is not lost even if it had already been moved, because its
+"routing" record (with the KIM address) is written before the move and
+its "routed" record right after it. A line that was only partly written is
+ignored on load, like in the duplicate index.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import (
+    JOURNAL_FILE,
+    JOURNAL_BATCH_SIZE,
+    JOURNAL_COMPACT_RECORDS,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_FSYNC,
+)
+
+STAGE_CLAIMED = "claimed"
+STAGE_ANALYZED = "analyzed"
+STAGE_LOOKED_UP = "looked_up"
+STAGE_ROUTING = "routing"
+STAGE_ROUTED = "routed"
+STAGE_SENT = "sent"
+
+STAGES = [STAGE_CLAIMED, STAGE_ANALYZED, STAGE_LOOKED_UP, STAGE_ROUTING, STAGE_ROUTED, STAGE_SENT]
+
+# Analysis fields that describe the original run, not the document
+_RUN_FIELDS = ("timings", "cache_hits", "cache_misses")
+
+
+class BatchJournal:
+    """
+    Latest stage and data of every journaled PDF, backed by a JSONL file.
+
+    Thread-safe: the pipeline records from its route and mail threads.
+    """
+
+    def __init__(
+        self,
+        journal_file: Path = JOURNAL_FILE,
+        batch_size: int = JOURNAL_BATCH_SIZE,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+        fsync: bool = JOURNAL_FSYNC,
+        compact_records: int = JOURNAL_COMPACT_RECORDS
+    ):
+        """
+        Initialize the journal.
+
+        Args:
+            journal_file: Path to the JSONL file.
+            batch_size: Buffered records that trigger a write.
+            flush_interval: Seconds after which buffered records are written
+                with the next record (0 = only by batch size).
+            fsync: Force every write to disk.
+            compact_records: Records written (or loaded) after which the
+                journal is compacted (0 = only on close()).
+        """
+        self.journal_file = journal_file
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.compact_records = compact_records
+        self._entries: Dict[str, dict] = {}
+        self._buffer: List[str] = []
+        self._buffer_since = 0.0
+        # Lines in the file since the last compaction
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """
+        Read the journal from disk.
+
+        Returns:
+            Number of PDFs in the journal.
+        """
+        self._entries = {}
+        self._lines = 0
+
+        try:
+            with open(self.journal_file, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and record.get("stage") in STAGES and record.get("hash"):
+                        self._entries.setdefault(record["hash"], {}).update(record)
+        except FileNotFoundError:
+            pass
+
+        return len(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stage(self, file_hash: Optional[str]) -> Optional[str]:
+        """
+        Get the last recorded stage of a PDF.
+
+        Args:
+            file_hash: SHA-256 of the PDF.
+
+        Returns:
+            Stage name, or None if the PDF is not in the journal.
+        """
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            return entry["stage"] if entry else None
+
+    def is_routed(self, file_hash: Optional[str]) -> bool:
+        """Check whether a PDF was routed (and possibly sent) already."""
+        return self.stage(file_hash) in (STAGE_ROUTED, STAGE_SENT)
+
+    def analysis(self, file_hash: Optional[str]) -> Optional[dict]:
+        """
+        Get the stored analysis of a PDF that was analyzed but not routed.
+
+        Args:
+            file_hash: SHA-256 of the PDF.
+
+        Returns:
+            analyze_pdf() result without the timings of the original run,
+            or None.
+        """
+        with self._lock:
+            entry = self._entries.get(file_hash)
+            if not entry or entry["stage"] not in (STAGE_ANALYZED, STAGE_LOOKED_UP, STAGE_ROUTING):
+                return None
+            analysis = entry.get("analysis")
+        if not analysis:
+            return None
+        return dict(analysis, timings={}, cache_hits=0, cache_misses=0)
+
+    def unsent(self) -> List[dict]:
+        """
+        Get the PDFs that were routed (or were being routed) to a pharmacy
+        with a KIM address but not sent.
+
+        Returns:
+            List of dicts with 'hash', 'stage', 'file', 'apo_key',
+            'kim_address', 'patient' and, once routed, 'dest'.
+        """
+        with self._lock:
+            return [
+                dict(entry)
+                for entry in self._entries.values()
+                if entry.get("kim_address") and (
+                    entry["stage"] == STAGE_ROUTING or (entry["stage"] == STAGE_ROUTED and entry.get("dest"))
+                )
+            ]
+
+    def record(self, file_hash: Optional[str], stage: str, **fields) -> None:
+        """
+        Record that a PDF reached a stage.
+
+        Args:
+            file_hash: SHA-256 of the PDF (nothing is recorded without one).
+            stage: One of STAGES.
+            **fields: Data to keep with the PDF (JSON serializable), e.g.
+                analysis=... or dest=...
+        """
+        if not file_hash:
+            return
+        if "analysis" in fields:
+            fields["analysis"] = {
+                key: value for key, value in fields["analysis"].items() if key not in _RUN_FIELDS
+            }
+
+        record = {
+            "hash": file_hash,
+            "stage": stage,
+            "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+        with self._lock:
+            entry = self._entries.setdefault(file_hash, {})
+            entry.update(record)
+            if stage in (STAGE_ROUTED, STAGE_SENT):
+                # Not needed any more; keeps the compacted journal small
+                entry.pop("analysis", None)
+            if not self._buffer:
+                self._buffer_since = time.monotonic()
+            self._buffer.append(line)
+            due = len(self._buffer) >= self.batch_size or (
+                self.flush_interval > 0 and time.monotonic() - self._buffer_since >= self.flush_interval
+            )
+            if due:
+                self._flush_locked()
+                if self.compact_records and self._lines >= self.compact_records:
+                    self._compact_locked()
+
+    def mark_sent(self, file_hashes: Iterable[str]) -> None:
+        """Record the PDFs of a KIM flush as sent and write the journal."""
+        for file_hash in file_hashes:
+            self.record(file_hash, STAGE_SENT)
+        self.flush()
+
+    def flush(self) -> None:
+        """Write all buffered records to disk."""
+        with self._lock:
+            self._flush_locked()
+
+    def compact(self) -> None:
+        """
+        Rewrite the journal with one line per unfinished PDF.
+
+        PDFs that are routed (without a KIM message still to send) or sent
+        are dropped. Written to a temporary file and renamed, so a crash
+        leaves either the old or the new journal.
+        """
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        """Compact the journal (caller holds the lock)."""
+        self._flush_locked()
+        self._entries = {
+            file_hash: entry for file_hash, entry in self._entries.items() if not _finished(entry)
+        }
+        lines = [json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in self._entries.values()]
+        tmp_file = self.journal_file.with_name(self.journal_file.name + ".tmp")
+        try:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.journal_file)
+            self._lines = len(lines)
+        except OSError as e:
+            print(f"[WARN] Could not compact journal: {e}")
+
+    def close(self) -> None:
+        """Write buffered records and compact the journal."""
+        if self._entries:
+            self.compact()
+
+    def _flush_locked(self) -> None:
+        """Append the buffer to the file (caller holds the lock)."""
+        if not self._buffer:
+            return
+
+        try:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write("".join(self._buffer))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._lines += len(self._buffer)
+            self._buffer = []
+        except OSError as e:
+            print(f"[WARN] Could not write journal: {e}")
+
+
+def _finished(entry: dict) -> bool:
+    """Check whether a journaled PDF needs nothing more (routed and, if it has a KIM address, sent)."""
+    if entry["stage"] == STAGE_SENT:
+        return True
+    return entry["stage"] == STAGE_ROUTED and not (entry.get("kim_address") and entry.get("dest"))
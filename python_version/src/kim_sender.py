@@ -0,0 +1,293 @@
+"""
+KIM dispatch of routed prescriptions via SMTP.
+
+Python counterpart of scripts/email-sender.ps1. Instead of one SMTP session
+per prescription, routed PDFs are queued per pharmacy and sent over a single
+reused (and, if configured, authenticated) connection, with several PDFs
+attached to one message.
+"""
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.settings import (
+    DRY_RUN,
+    KIM_SMTP_SERVER,
+    KIM_SMTP_PORT,
+    KIM_USE_SSL,
+    KIM_EMAIL_FROM,
+    KIM_EMAIL_SUBJECT,
+    KIM_USERNAME,
+    KIM_PASSWORD,
+    KIM_ATTACHMENTS_PER_MESSAGE,
+    KIM_RETRY_ATTEMPTS,
+    KIM_RETRY_DELAY,
+    KIM_TIMEOUT,
+)
+
+EMAIL_BODY = """Sehr geehrte Apotheke,
+
+Anbei {count} eRezept(e) für:
+{patients}
+Apotheken-Key: {apo_key}
+
+Dies ist eine automatisch generierte Nachricht.
+Bei Fragen wenden Sie sich bitte an die Praxis.
+
+Mit freundlichen Grüßen
+Ihre Praxis
+
+---
+Gesendet via eRezept-Automatisierung (Python)
+"""
+
+
+class KIMSender:
+    """
+    Queues routed PDFs per pharmacy and sends them in batches.
+
+    Call add() for every routed PDF and flush() at the end of a batch. The
+    SMTP connection is opened on the first send and kept for later flushes
+    until close() is called.
+    """
+
+    def __init__(
+        self,
+        host: str = KIM_SMTP_SERVER,
+        port: int = KIM_SMTP_PORT,
+        use_ssl: bool = KIM_USE_SSL,
+        sender: str = KIM_EMAIL_FROM,
+        username: Optional[str] = KIM_USERNAME,
+        password: Optional[str] = KIM_PASSWORD,
+        attachments_per_message: int = KIM_ATTACHMENTS_PER_MESSAGE,
+        retry_attempts: int = KIM_RETRY_ATTEMPTS,
+        retry_delay: float = KIM_RETRY_DELAY,
+        timeout: float = KIM_TIMEOUT,
+        dry_run: bool = DRY_RUN
+    ):
+        """
+        Initialize the sender.
+
+        Args:
+            host: SMTP server.
+            port: SMTP port.
+            use_ssl: Upgrade the connection with STARTTLS.
+            sender: From address.
+            username: SMTP login, or None to send without login.
+            password: SMTP password.
+            attachments_per_message: Maximum PDFs attached to one message.
+            retry_attempts: Attempts per message.
+            retry_delay: Seconds before the first retry (doubled each time).
+            timeout: Seconds per SMTP command.
+            dry_run: Only report what would be sent.
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.attachments_per_message = max(1, attachments_per_message)
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.dry_run = dry_run
+
+        # KIM address -> queued prescriptions (add() and flush() may run in
+        # different threads in pipeline mode)
+        self._queue: Dict[str, List[dict]] = {}
+        self._queue_lock = threading.Lock()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._checked = False
+
+    def __enter__(self) -> "KIMSender":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        """Number of queued PDFs."""
+        with self._queue_lock:
+            return sum(len(items) for items in self._queue.values())
+
+    def add(
+        self,
+        pdf_path: Path,
+        apo_key: str,
+        kim_address: str,
+        patient_name: str,
+        key: Optional[str] = None
+    ) -> None:
+        """
+        Queue a routed PDF for its pharmacy.
+
+        Args:
+            pdf_path: Path to the routed PDF.
+            apo_key: Pharmacy key (e.g., "APO_BAEREN").
+            kim_address: KIM address of the pharmacy.
+            patient_name: Patient name for subject and body.
+            key: Optional identifier (the content hash), reported back by
+                flush() once the PDF was sent.
+        """
+        with self._queue_lock:
+            self._queue.setdefault(kim_address, []).append({
+                "pdf_path": pdf_path,
+                "apo_key": apo_key,
+                "patient_name": patient_name,
+                "key": key,
+            })
+
+    def flush(self) -> dict:
+        """
+        Send all queued PDFs.
+
+        Returns:
+            Dict with 'sent' and 'failed' (PDFs), 'messages' (messages
+            sent, or that would have been sent in dry-run mode) and 'done'
+            (keys of the PDFs that were sent or skipped by the dry run).
+        """
+        stats = {"sent": 0, "failed": 0, "messages": 0, "done": []}
+        with self._queue_lock:
+            queue, self._queue = self._queue, {}
+        # Check a kept connection once per flush before using it
+        self._checked = False
+
+        for kim_address, items in queue.items():
+            for start in range(0, len(items), self.attachments_per_message):
+                batch = items[start:start + self.attachments_per_message]
+
+                if self.dry_run:
+                    print(f"  [INFO] DRY_RUN: {len(batch)} PDF(s) not sent to {kim_address}")
+                    stats["messages"] += 1
+                    stats["done"].extend(item["key"] for item in batch if item["key"])
+                    continue
+
+                try:
+                    message = self._build_message(kim_address, batch)
+                except OSError as e:
+                    print(f"  [ERROR] KIM message for {kim_address} not created: {e}")
+                    stats["failed"] += len(batch)
+                    continue
+
+                if self._send_with_retry(message):
+                    print(f"  [OK] KIM: {len(batch)} PDF(s) sent to {kim_address}")
+                    stats["sent"] += len(batch)
+                    stats["messages"] += 1
+                    stats["done"].extend(item["key"] for item in batch if item["key"])
+                else:
+                    stats["failed"] += len(batch)
+
+        return stats
+
+    def close(self) -> None:
+        """Close the SMTP connection."""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def _build_message(self, kim_address: str, batch: List[dict]) -> EmailMessage:
+        """Create one message with all PDFs of the batch attached."""
+        names = [item["patient_name"] for item in batch]
+
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = kim_address
+        message["Subject"] = KIM_EMAIL_SUBJECT.format(", ".join(names))
+        message.set_content(EMAIL_BODY.format(
+            count=len(batch),
+            patients="".join(f"- {name}\n" for name in names),
+            apo_key=batch[0]["apo_key"],
+        ))
+
+        for item in batch:
+            pdf_path = Path(item["pdf_path"])
+            message.add_attachment(
+                pdf_path.read_bytes(),
+                maintype="application",
+                subtype="pdf",
+                filename=pdf_path.name,
+            )
+
+        return message
+
+    def _send_with_retry(self, message: EmailMessage) -> bool:
+        """
+        Send a message, reconnecting and retrying on temporary errors.
+
+        Returns:
+            True if the message was accepted by the server.
+        """
+        delay = self.retry_delay
+
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                self._connection().send_message(message)
+                return True
+            except smtplib.SMTPResponseException as e:
+                error = e
+                self._reset()
+                # 5xx: permanent (e.g. message too large), retrying will not help
+                if e.smtp_code >= 500:
+                    break
+            except smtplib.SMTPRecipientsRefused as e:
+                error = e
+                self._reset()
+                break
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+                # Connection may be broken: reconnect on the next attempt
+                self.close()
+
+            if attempt < self.retry_attempts:
+                print(f"  [WARN] KIM send failed (attempt {attempt}/{self.retry_attempts}): {error}")
+                time.sleep(delay)
+                delay *= 2
+
+        print(f"  [ERROR] KIM send to {message['To']} failed: {error}")
+        return False
+
+    def _connection(self) -> smtplib.SMTP:
+        """Return the open SMTP connection, (re)connecting if needed."""
+        if self._smtp is not None:
+            if self._checked:
+                return self._smtp
+            try:
+                # Idle connections are often dropped by the server
+                if self._smtp.noop()[0] == 250:
+                    self._checked = True
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_ssl:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+        except Exception:
+            smtp.close()
+            raise
+
+        self._smtp = smtp
+        self._checked = True
+        return smtp
+
+    def _reset(self) -> None:
+        """Abort the current mail transaction, keeping the connection."""
+        try:
+            self._smtp.rset()
+        except (AttributeError, smtplib.SMTPException, OSError):
+            self.close()
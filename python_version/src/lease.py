@@ -0,0 +1,413 @@
+"""
+Lease files for processing one input folder from several nodes.
+
+Several main.py processes, on one host or on several hosts sharing the
+input folder, split the PDFs between them by claiming each one with a
+lease file in LEASE_FOLDER:
+
+    <pdf name>.lease   {"owner": ..., "token": ..., "expires": ...}
+
+- claim: the lease file is created with O_EXCL, so exactly one node wins,
+  on local disks as well as on SMB / NFS shares
+- renew: the owner rewrites `expires` every LEASE_RENEW_INTERVAL seconds
+  (background thread) while it works on the PDF
+- takeover: a lease that has expired (its node died or hangs) is replaced
+  by another node, under a short-lived "<lease>.takeover" lock so that two
+  nodes cannot take over the same lease
+- renew, takeover and release all read, compare and rewrite a lease under
+  the same "<lease>.takeover" lock, so a renewal or done marker never
+  overwrites a lease another node has just taken over
+- release: when a PDF has been routed, its lease is removed if the PDF has
+  left the input folder ("move" routing); otherwise it is turned into a
+  "done" marker with the PDF's size and mtime, so no node claims the same
+  file again ("copy" / "link" routing)
+
+Expiry is compared with the local clock, so hosts need synchronized clocks
+(NTP); LEASE_TTL should be well above any expected clock difference.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config.settings import (
+    LEASE_FOLDER,
+    LEASE_TTL,
+    LEASE_RENEW_INTERVAL,
+)
+
+LEASE_SUFFIX = ".lease"
+# Seconds renew() / release() wait for another node's takeover of a lease
+GUARD_TIMEOUT = 5.0
+
+
+def default_node_id() -> str:
+    """Node name used when NODE_ID is not set: the host name."""
+    return socket.gethostname()
+
+
+@contextmanager
+def exclusive_lock(lock_path: Path, timeout: float = 10.0, stale_after: float = 60.0) -> Iterator[None]:
+    """
+    Hold a lock file created with O_EXCL.
+
+    Works across processes and hosts on a shared folder. A lock file older
+    than `stale_after` seconds was left by a crashed holder and is removed.
+
+    Args:
+        lock_path: Path of the lock file.
+        timeout: Seconds to wait for the lock (0 = try once).
+        stale_after: Age in seconds after which a lock is considered stale.
+
+    Raises:
+        TimeoutError: If the lock could not be acquired in time.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > stale_after:
+                    lock_path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Lock {lock_path.name} is held by another process")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    try:
+        os.close(fd)
+        yield
+    finally:
+        try:
+            lock_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class LeaseManager:
+    """
+    Claims input PDFs for this node and keeps the claims alive.
+
+    Thread-safe: the renewal thread runs next to the processing.
+    """
+
+    def __init__(
+        self,
+        lease_folder: Path = LEASE_FOLDER,
+        node_id: Optional[str] = None,
+        ttl: float = LEASE_TTL,
+        renew_interval: float = LEASE_RENEW_INTERVAL
+    ):
+        """
+        Initialize the lease manager.
+
+        Args:
+            lease_folder: Folder for the lease files (shared by all nodes).
+            node_id: Name of this node in the leases (default: host name).
+            ttl: Seconds a lease stays valid without renewal.
+            renew_interval: Seconds between renewals of held leases.
+        """
+        self.lease_folder = lease_folder
+        self.node_id = node_id or default_node_id()
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.taken_over = 0
+
+        # PDF path -> token of the lease we hold for it
+        self._held: Dict[Path, str] = {}
+        self._lock = threading.Lock()
+        self._renew_thread: Optional[threading.Thread] = None
+        self._renew_stop: Optional[threading.Event] = None
+
+    def lease_path(self, pdf_path: Path) -> Path:
+        """Path of the lease file of a PDF."""
+        return self.lease_folder / (pdf_path.name + LEASE_SUFFIX)
+
+    def claim(self, pdf_path: Path) -> bool:
+        """
+        Try to claim a PDF for this node.
+
+        Args:
+            pdf_path: Input PDF.
+
+        Returns:
+            True if this node now holds the lease and should process the
+            PDF; False if another node holds it or it was already done.
+        """
+        lease_path = self.lease_path(pdf_path)
+        token = uuid.uuid4().hex
+
+        try:
+            self.lease_folder.mkdir(parents=True, exist_ok=True)
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return self._take_over(pdf_path, lease_path, token)
+        except OSError as e:
+            print(f"[WARN] Could not create lease for {pdf_path.name}: {e}")
+            return False
+
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self._lease_data(token))
+        if not pdf_path.exists():
+            # Processed and moved away by another node since it was listed
+            self._unlink(lease_path)
+            return False
+        with self._lock:
+            self._held[pdf_path] = token
+        return True
+
+    def claim_batches(self, pdf_files: Iterable[Path], batch_size: int) -> Iterator[List[Path]]:
+        """
+        Claim PDFs lazily and yield them in batches.
+
+        The next batch is only claimed once the caller asks for it, so
+        other nodes get the rest of the files in the meantime.
+
+        Args:
+            pdf_files: Candidate PDFs.
+            batch_size: Maximum PDFs per batch.
+
+        Yields:
+            Lists of claimed PDFs.
+        """
+        batch = []
+        for pdf_path in pdf_files:
+            if self.claim(pdf_path):
+                batch.append(pdf_path)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def release(self, pdf_files: Iterable[Path]) -> None:
+        """
+        Give up the leases of processed PDFs.
+
+        A PDF that is still in the input folder gets a "done" marker, so it
+        is not claimed again unless it changes.
+
+        Args:
+            pdf_files: PDFs claimed by this node.
+        """
+        for pdf_path in pdf_files:
+            # Held until the marker is written, so a renewal running at the
+            # same time cannot overwrite it with a lease
+            with self._lock:
+                token = self._held.pop(pdf_path, None)
+                if token is None:
+                    continue
+
+                lease_path = self.lease_path(pdf_path)
+                try:
+                    with self._guard(lease_path):
+                        lease = self._read(lease_path)
+                        if lease is None or lease.get("token") != token:
+                            # Taken over while we were working on it
+                            continue
+
+                        try:
+                            stat = pdf_path.stat()
+                        except FileNotFoundError:
+                            self._unlink(lease_path)
+                            continue
+                        self._write(lease_path, {
+                            "owner": self.node_id,
+                            "token": token,
+                            "done": [stat.st_size, stat.st_mtime_ns],
+                        })
+                except (TimeoutError, OSError) as e:
+                    print(f"[WARN] Could not release lease for {pdf_path.name}: {e}")
+
+    def renew(self) -> int:
+        """
+        Extend all leases held by this node.
+
+        Returns:
+            Number of leases renewed. Leases that were taken over by
+            another node are dropped with a warning.
+        """
+        with self._lock:
+            held = list(self._held.items())
+
+        renewed = 0
+        for pdf_path, token in held:
+            with self._lock:
+                # Released (done marker written) since the list was taken
+                if self._held.get(pdf_path) != token:
+                    continue
+                lease_path = self.lease_path(pdf_path)
+                try:
+                    with self._guard(lease_path):
+                        lease = self._read(lease_path)
+                        if lease is None or lease.get("token") != token:
+                            print(f"[WARN] Lease for {pdf_path.name} was taken over by another node")
+                            self._held.pop(pdf_path, None)
+                            continue
+                        self._write(lease_path, json.loads(self._lease_data(token)))
+                except (TimeoutError, OSError) as e:
+                    # Checked again on the next renewal
+                    print(f"[WARN] Could not renew lease for {pdf_path.name}: {e}")
+                    continue
+            renewed += 1
+        return renewed
+
+    def is_done(self, pdf_path: Path) -> bool:
+        """Check whether a PDF has a done marker for its current content."""
+        lease = self._read(self.lease_path(pdf_path))
+        if lease is None or "done" not in lease:
+            return False
+        try:
+            stat = pdf_path.stat()
+        except FileNotFoundError:
+            return False
+        return lease["done"] == [stat.st_size, stat.st_mtime_ns]
+
+    def held(self) -> List[Path]:
+        """PDFs currently claimed by this node."""
+        with self._lock:
+            return list(self._held)
+
+    def start_renewal(self) -> None:
+        """Renew the held leases in a background thread."""
+        if self.renew_interval <= 0 or self._renew_thread:
+            return
+
+        self._renew_stop = threading.Event()
+
+        def run():
+            while not self._renew_stop.wait(self.renew_interval):
+                try:
+                    self.renew()
+                except Exception as e:
+                    print(f"[ERROR] Lease renewal failed: {e}")
+
+        self._renew_thread = threading.Thread(target=run, name="lease-renewal", daemon=True)
+        self._renew_thread.start()
+
+    def stop_renewal(self) -> None:
+        """Stop the background renewal thread."""
+        if self._renew_thread:
+            self._renew_stop.set()
+            self._renew_thread.join()
+            self._renew_thread = None
+
+    def abandon(self) -> None:
+        """Remove the leases of PDFs that were claimed but not processed."""
+        with self._lock:
+            held, self._held = self._held, {}
+        for pdf_path, token in held.items():
+            lease_path = self.lease_path(pdf_path)
+            lease = self._read(lease_path)
+            if lease is not None and lease.get("token") == token:
+                self._unlink(lease_path)
+
+    def prune(self, input_folder: Path) -> int:
+        """
+        Remove done markers and expired leases of PDFs that are gone.
+
+        Args:
+            input_folder: Folder the leased PDFs are in.
+
+        Returns:
+            Number of lease files removed.
+        """
+        removed = 0
+        for lease_path in self.lease_folder.glob("*" + LEASE_SUFFIX):
+            if (input_folder / lease_path.name[:-len(LEASE_SUFFIX)]).exists():
+                continue
+            lease = self._read(lease_path)
+            if lease is not None and ("done" in lease or lease.get("expires", 0) < time.time()):
+                self._unlink(lease_path)
+                removed += 1
+        return removed
+
+    def _take_over(self, pdf_path: Path, lease_path: Path, token: str) -> bool:
+        """Replace an expired lease (or an outdated done marker) with ours."""
+        if not self._claimable(pdf_path, lease_path):
+            return False
+
+        try:
+            with self._guard(lease_path, timeout=0):
+                # Another node may have taken over in the meantime
+                if not self._claimable(pdf_path, lease_path):
+                    return False
+                previous = self._read(lease_path) or {}
+                self._write(lease_path, json.loads(self._lease_data(token)))
+        except TimeoutError:
+            return False
+        except OSError as e:
+            print(f"[WARN] Could not take over lease for {pdf_path.name}: {e}")
+            return False
+
+        if "done" not in previous:
+            print(f"[INFO] Took over expired lease of {previous.get('owner', 'unknown node')} for {pdf_path.name}")
+            self.taken_over += 1
+        with self._lock:
+            self._held[pdf_path] = token
+        return True
+
+    def _guard(self, lease_path: Path, timeout: float = GUARD_TIMEOUT):
+        """Lock a lease against concurrent rewrites by any node ("<lease>.takeover")."""
+        return exclusive_lock(lease_path.with_name(lease_path.name + ".takeover"), timeout=timeout, stale_after=self.ttl)
+
+    def _claimable(self, pdf_path: Path, lease_path: Path) -> bool:
+        """Check whether an existing lease may be replaced."""
+        lease = self._read(lease_path)
+        if lease is None:
+            # Being written right now, or left empty by a crash
+            try:
+                return time.time() - lease_path.stat().st_mtime > self.ttl
+            except FileNotFoundError:
+                # Released meanwhile; claimed normally on the next pass
+                return False
+
+        if "done" in lease:
+            # Claim again only if the file changed since it was processed
+            return pdf_path.exists() and not self.is_done(pdf_path)
+
+        return lease.get("expires", 0) < time.time()
+
+    def _lease_data(self, token: str) -> str:
+        """Content of a lease held by this node."""
+        return json.dumps({
+            "owner": self.node_id,
+            "token": token,
+            "expires": time.time() + self.ttl,
+        })
+
+    @staticmethod
+    def _read(lease_path: Path) -> Optional[dict]:
+        """Read a lease; None if it is missing, empty or unreadable."""
+        try:
+            data = json.loads(lease_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    @staticmethod
+    def _write(lease_path: Path, data: dict) -> None:
+        """Replace a lease atomically (temp file + os.replace)."""
+        tmp_path = lease_path.with_name(f"{lease_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, lease_path)
+
+    @staticmethod
+    def _unlink(lease_path: Path) -> None:
+        """Remove a lease file if it still exists."""
+        try:
+            lease_path.unlink()
+        except FileNotFoundError:
+            pass
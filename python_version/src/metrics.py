@@ -0,0 +1,316 @@
+"""
+Per-document stage timings and JSONL metrics log.
+
+Each processed PDF gets one line in LOGS_FOLDER/metrics_YYYY-MM-DD.jsonl
+with the fields of the PowerShell audit log (scripts/logger.ps1:
+timestamp, status, message, patient, pharmacy, file_hash) plus the wall
+and CPU time of every stage it went through.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Sequence
+
+from config.settings import LOGS_FOLDER, METRICS_ENABLED, METRICS_SUMMARY_SAMPLES, STATUS_LATENCY_BUCKETS
+
+# Status codes of the PowerShell log ($LogConfig in config/settings.ps1)
+STATUS_ROUTED = "ROUTED"
+STATUS_UNKLAR = "UNKLAR"
+STATUS_ERROR = "ERROR"
+STATUS_DUPLICATE = "DUPLICATE_BLOCKED"
+
+# Order of the stages in the summary
+STAGE_ORDER = ["hash", "text_layer", "cache", "render", "ocr", "parse", "lookup", "route", "mail"]
+
+
+def cpu_time() -> float:
+    """
+    CPU seconds of the calling thread plus all finished child processes.
+
+    Child processes (pdftotext, pdftoppm, tesseract) are counted once they
+    have been waited for; os.times() reports them as 0 on Windows.
+    """
+    times = os.times()
+    return time.thread_time() + times.children_user + times.children_system
+
+
+class StageTimer:
+    """
+    Accumulates wall and CPU seconds per stage for one document.
+
+    Timings are plain dicts, so they can be returned from worker processes.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block of code as (part of) a stage.
+
+        Args:
+            name: Stage name (e.g., "ocr"). Repeated stages are summed.
+        """
+        wall_start = time.perf_counter()
+        cpu_start = cpu_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall_start, cpu_time() - cpu_start)
+
+    def add(self, name: str, wall: float, cpu: float) -> None:
+        """Add wall and CPU seconds to a stage."""
+        entry = self.timings.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+
+    def merge(self, timings: Dict[str, Dict[str, float]]) -> None:
+        """Add timings collected elsewhere (e.g., in a worker process)."""
+        for name, entry in timings.items():
+            self.add(name, entry["wall"], entry["cpu"])
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: Sorted sample values (not empty).
+        fraction: Percentile as a fraction (0.5 = median).
+
+    Returns:
+        The sample at that rank.
+    """
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+class MetricsLog:
+    """
+    Collects stage timings per document and writes them as JSONL.
+
+    Thread-safe, so the pipeline stages can record from their threads.
+    """
+
+    def __init__(
+        self,
+        logs_folder: Path = LOGS_FOLDER,
+        enabled: bool = METRICS_ENABLED,
+        buckets: Sequence[float] = STATUS_LATENCY_BUCKETS,
+        max_samples: int = METRICS_SUMMARY_SAMPLES
+    ):
+        """
+        Initialize the metrics log.
+
+        Args:
+            logs_folder: Folder for the metrics_YYYY-MM-DD.jsonl files.
+            enabled: Write the JSONL file (timings for the summary are
+                collected either way).
+            buckets: Upper bounds (seconds) of the latency histograms.
+            max_samples: Timings kept per stage for p50 / p95 (the most
+                recent ones).
+        """
+        self.logs_folder = logs_folder
+        self.enabled = enabled
+        self.buckets = sorted(buckets)
+        self._timers: Dict[Path, StageTimer] = {}
+        self.max_samples = max(1, max_samples)
+        # Stage -> most recent wall times (sliding window for p50 / p95)
+        self._samples: Dict[str, Deque[float]] = {}
+        self._max: Dict[str, float] = {}
+        # Stage -> samples per bucket, the last one for samples above all bounds
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._bucket_sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def timer(self, pdf_path: Path) -> StageTimer:
+        """
+        Get the timer of a document (created on first use).
+
+        Args:
+            pdf_path: Path of the input PDF.
+
+        Returns:
+            StageTimer for that document.
+        """
+        with self._lock:
+            return self._timers.setdefault(pdf_path, StageTimer())
+
+    def take_timings(self, pdf_path: Path) -> Dict[str, Dict[str, float]]:
+        """
+        Remove a document's timer without recording it.
+
+        Used when a PDF is split and its timings move to the first part.
+
+        Args:
+            pdf_path: Path of the input PDF.
+
+        Returns:
+            The timings collected so far (empty if there were none).
+        """
+        with self._lock:
+            timer = self._timers.pop(pdf_path, None)
+        return timer.timings if timer else {}
+
+    def record(
+        self,
+        pdf_path: Path,
+        status: str,
+        message: str,
+        patient: str = "",
+        pharmacy: str = "",
+        file_hash: str = "",
+        source: str = ""
+    ) -> dict:
+        """
+        Finish a document: write its metrics line and keep its timings.
+
+        Args:
+            pdf_path: Path of the input PDF.
+            status: Status code (STATUS_ROUTED, STATUS_UNKLAR, ...).
+            message: Short description.
+            patient: Patient name (truncated to 50 characters like the
+                PowerShell log).
+            pharmacy: APO key.
+            file_hash: SHA-256 of the PDF.
+            source: Where the patient data was read from ("text_layer",
+                "ocr_roi" or "ocr"; empty if no text was read).
+
+        Returns:
+            The log entry.
+        """
+        with self._lock:
+            timer = self._timers.pop(pdf_path, None) or StageTimer()
+            for name, entry in timer.timings.items():
+                self._add_sample_locked(name, entry["wall"])
+
+        stages = {
+            name: {
+                "wall_ms": round(entry["wall"] * 1000, 1),
+                "cpu_ms": round(entry["cpu"] * 1000, 1),
+            }
+            for name, entry in timer.timings.items()
+        }
+        entry = {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
+            "status": status,
+            "message": message,
+            "patient": (patient or "")[:50],
+            "pharmacy": pharmacy or "",
+            "file_hash": file_hash or "",
+            "source": source or "",
+            "file": pdf_path.name,
+            "stages": stages,
+            "total_ms": round(sum(stage["wall_ms"] for stage in stages.values()), 1),
+        }
+
+        if self.enabled:
+            self._write(entry)
+        return entry
+
+    def add_sample(self, stage: str, wall: float) -> None:
+        """
+        Add a timing that belongs to no single document (e.g., a KIM flush).
+
+        Args:
+            stage: Stage name.
+            wall: Wall seconds.
+        """
+        with self._lock:
+            self._add_sample_locked(stage, wall)
+
+    def histograms(self) -> Dict[str, dict]:
+        """
+        Get the wall time histogram of every stage.
+
+        Returns:
+            Dict with stage names as keys and dicts with 'buckets' (list of
+            (upper bound, cumulative count), the last bound being
+            float("inf")), 'count' and 'sum' (seconds) as values.
+        """
+        with self._lock:
+            counts = {name: list(values) for name, values in self._bucket_counts.items()}
+            sums = dict(self._bucket_sums)
+
+        histograms = {}
+        for name, values in counts.items():
+            cumulative, buckets = 0, []
+            for bound, count in zip(self.buckets + [float("inf")], values):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            histograms[name] = {"buckets": buckets, "count": cumulative, "sum": sums[name]}
+        return histograms
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get p50 / p95 / max wall time per stage.
+
+        Count and max cover every timing; p50 and p95 the last
+        `max_samples` of each stage.
+
+        Returns:
+            Dict with stage names as keys and dicts with 'count', 'p50',
+            'p95' and 'max' (seconds) as values, in pipeline order.
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items() if values}
+            counts = {name: sum(self._bucket_counts[name]) for name in samples}
+            maxima = {name: self._max[name] for name in samples}
+
+        order = STAGE_ORDER + sorted(set(samples) - set(STAGE_ORDER))
+        return {
+            name: {
+                "count": counts[name],
+                "p50": percentile(samples[name], 0.50),
+                "p95": percentile(samples[name], 0.95),
+                "max": maxima[name],
+            }
+            for name in order
+            if name in samples
+        }
+
+    def print_summary(self) -> None:
+        """Print the per-stage latency table."""
+        summary = self.stage_summary()
+        if not summary:
+            return
+
+        print("Stage timings (wall, ms):")
+        print(f"  {'stage':<11} {'count':>6} {'p50':>9} {'p95':>9} {'max':>9}")
+        for name, stats in summary.items():
+            print(
+                f"  {name:<11} {stats['count']:>6} {stats['p50'] * 1000:>9.1f}"
+                f" {stats['p95'] * 1000:>9.1f} {stats['max'] * 1000:>9.1f}"
+            )
+        print()
+
+    def _add_sample_locked(self, stage: str, wall: float) -> None:
+        """Keep a stage timing for the summary and the histogram (caller holds the lock)."""
+        window = self._samples.get(stage)
+        if window is None:
+            window = self._samples[stage] = deque(maxlen=self.max_samples)
+        window.append(wall)
+        self._max[stage] = max(self._max.get(stage, wall), wall)
+        counts = self._bucket_counts.get(stage)
+        if counts is None:
+            counts = self._bucket_counts[stage] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, wall)] += 1
+        self._bucket_sums[stage] = self._bucket_sums.get(stage, 0.0) + wall
+
+    def _write(self, entry: dict) -> None:
+        """Append one line to today's metrics file."""
+        try:
+            self.logs_folder.mkdir(parents=True, exist_ok=True)
+            metrics_file = self.logs_folder / f"metrics_{datetime.now().strftime('%Y-%m-%d')}.jsonl"
+            with self._lock, open(metrics_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[WARN] Could not write metrics: {e}")
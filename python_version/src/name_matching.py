@@ -0,0 +1,128 @@
+"""
+Fuzzy name matching for OCR errors.
+
+OCR regularly mangles umlauts and ß ("Großmann" -> "Grofmann",
+"Pföhler" -> "Pfohler"). Names are folded to a plain lowercase form and
+compared with a bounded edit distance. Callers pass only a small candidate
+set (patients sharing the OCR'd birth date), never the whole CSV.
+"""
+import unicodedata
+from typing import Iterable, Optional, Tuple
+
+from config.settings import FUZZY_MATCH_THRESHOLD, FUZZY_MAX_DISTANCE
+
+
+def fold_name(name: str) -> str:
+    """
+    Fold a name for fuzzy comparison.
+
+    Lowercases, maps ß to "s" and strips accents and umlaut dots, drops
+    everything except letters and single spaces.
+
+    Args:
+        name: Name as read from CSV or OCR.
+
+    Returns:
+        Folded name (e.g. "Großmann" -> "grosmann", "Pföhler" -> "pfohler").
+    """
+    decomposed = unicodedata.normalize("NFKD", name.lower().replace("ß", "s"))
+    letters = "".join(
+        c if c.isalpha() else " "
+        for c in decomposed
+        if not unicodedata.combining(c)
+    )
+    return " ".join(letters.split())
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Levenshtein distance, abandoned early once it exceeds max_distance.
+
+    Only the diagonal band |i - j| <= max_distance of the DP table is
+    computed; cells outside it can never lead to a distance within the
+    bound.
+
+    Args:
+        a: First string.
+        b: Second string.
+        max_distance: Largest distance of interest.
+
+    Returns:
+        Edit distance, or None if it is greater than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    
+    too_far = max_distance + 1
+    previous = [min(j, too_far) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        current[0] = min(i, too_far)
+        row_min = current[0]
+        char_a = a[i - 1]
+        
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])  # substitution
+            if previous[j] + 1 < cost:                    # deletion
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:                 # insertion
+                cost = current[j - 1] + 1
+            current[j] = min(cost, too_far)
+            if cost < row_min:
+                row_min = cost
+        
+        if row_min > max_distance:
+            return None
+        previous = current
+    
+    distance = previous[-1]
+    return distance if distance <= max_distance else None
+
+
+def best_fuzzy_match(
+    name: str,
+    candidates: Iterable[str],
+    threshold: float = FUZZY_MATCH_THRESHOLD,
+    max_distance: int = FUZZY_MAX_DISTANCE
+) -> Optional[Tuple[str, float]]:
+    """
+    Find the candidate that best matches an OCR'd name.
+
+    The OCR name is compared as read and with its first word moved to the
+    end ("Nachname Vorname" order). A match is only returned if it is
+    unambiguous: a tie between different candidates returns None.
+
+    Args:
+        name: Name from OCR (e.g. "Elisabeth Grofmann").
+        candidates: Candidate names (e.g. patients with the same birth date).
+        threshold: Minimum confidence (1 - distance / length).
+        max_distance: Maximum edit distance.
+
+    Returns:
+        Tuple of (candidate, confidence), or None.
+    """
+    folded = fold_name(name)
+    parts = folded.split(" ", 1)
+    variants = {folded, f"{parts[1]} {parts[0]}"} if len(parts) == 2 else {folded}
+    
+    best = None
+    best_confidence = 0.0
+    ambiguous = False
+    
+    for candidate in candidates:
+        folded_candidate = fold_name(candidate)
+        for variant in variants:
+            distance = bounded_edit_distance(variant, folded_candidate, max_distance)
+            if distance is None:
+                continue
+            confidence = 1.0 - distance / max(len(variant), len(folded_candidate), 1)
+            if confidence > best_confidence:
+                best, best_confidence, ambiguous = candidate, confidence, False
+            elif confidence == best_confidence and candidate != best:
+                ambiguous = True
+    
+    if best is None or ambiguous or best_confidence < threshold:
+        return None
+    return best, best_confidence
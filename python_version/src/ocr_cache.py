@@ -0,0 +1,159 @@
+"""
+Persistent OCR result cache.
+
+Stores OCR text in a local SQLite database, keyed by the PDF content hash
+plus the OCR settings that produced it. Entries are evicted least recently
+used first once the stored text exceeds a size limit.
+"""
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from config.settings import OCR_CACHE_DB, OCR_CACHE_MAX_BYTES
+
+# Recount the stored size every N puts: worker processes share the
+# database, and each one only tracks its own writes in between
+RESYNC_PUTS = 256
+
+
+class OCRCache:
+    """
+    SQLite-backed OCR text cache with size-based LRU eviction.
+    """
+    
+    def __init__(self, db_path: Path = OCR_CACHE_DB, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Path to the SQLite file.
+            max_bytes: Maximum total size of cached text in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY,"
+            " text TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used INTEGER NOT NULL)"  # Use sequence number, higher = more recent
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)"
+        )
+        # Running total of the stored text size, so put() needs no SUM()
+        self._total = self.size()
+        self._puts = 0
+    
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        language: str,
+        dpi: int,
+        psm: int,
+        region=None,
+        page: int = 1,
+        threshold: Optional[int] = None
+    ) -> str:
+        """
+        Build a cache key from the PDF hash and the OCR settings.
+
+        Args:
+            content_hash: SHA-256 of the PDF content.
+            language: Tesseract language.
+            dpi: Render resolution.
+            psm: Tesseract page segmentation mode.
+            region: Optional crop box.
+            page: Page number (first-page keys carry no page, so entries
+                written before multi-page support stay valid).
+            threshold: Binarization threshold of the page image, if any.
+
+        Returns:
+            Cache key string.
+        """
+        key = f"{content_hash}|{language}|{dpi}|{psm}|{region}"
+        if page != 1:
+            key += f"|p{page}"
+        if threshold is not None:
+            key += f"|t{threshold}"
+        return key
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up cached OCR text and mark it as recently used.
+
+        Args:
+            key: Cache key from make_key().
+
+        Returns:
+            Cached text or None.
+        """
+        row = self._conn.execute(
+            "SELECT text FROM ocr_cache WHERE key = ?", (key,)
+        ).fetchone()
+        
+        if row is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._conn.execute(
+            "UPDATE ocr_cache SET last_used = (SELECT MAX(last_used) FROM ocr_cache) + 1"
+            " WHERE key = ?",
+            (key,),
+        )
+        return row[0]
+    
+    def put(self, key: str, text: str) -> None:
+        """
+        Store OCR text and evict old entries if the cache is too large.
+
+        Args:
+            key: Cache key from make_key().
+            text: OCR text.
+        """
+        size = len(text.encode("utf-8"))
+        replaced = self._conn.execute(
+            "SELECT size FROM ocr_cache WHERE key = ?", (key,)
+        ).fetchone()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_used)"
+            " VALUES (?, ?, ?, (SELECT COALESCE(MAX(last_used), 0) + 1 FROM ocr_cache))",
+            (key, text, size),
+        )
+        self._total += size - (replaced[0] if replaced else 0)
+        self._puts += 1
+        if self._puts % RESYNC_PUTS == 0:
+            self._total = self.size()
+        self._evict()
+    
+    def size(self) -> int:
+        """Return the total size of cached text in bytes."""
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+    
+    def _evict(self) -> None:
+        """Delete least recently used entries until the size limit is met."""
+        excess = self._total - self.max_bytes
+        if excess <= 0:
+            return
+        
+        stale = []
+        cursor = self._conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_used")
+        for key, size in cursor:
+            if excess <= 0:
+                break
+            stale.append((key,))
+            excess -= size
+            self._total -= size
+        cursor.close()
+        
+        self._conn.executemany("DELETE FROM ocr_cache WHERE key = ?", stale)
+    
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
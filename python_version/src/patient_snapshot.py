@@ -0,0 +1,190 @@
+"""
+Compiled snapshot of the patient mapping.
+
+Parsing the practice software export (45 columns, an APO_ regex per row)
+dominates start-up for large CSVs, although only the name index and the
+birth date index are kept. Both are written to a compact binary file and
+loaded from there as long as the CSV is unchanged.
+
+File layout:
+    b"ERZSNAP1"
+    header length (uint32, little-endian) + JSON header: source CSV, its
+        (mtime_ns, size, sha256), the parsing layout (CSV columns, parser
+        version), entry counts and the APO keys
+    APO key number of every name index entry (uint32 array, native order)
+    UTF-8 text, one entry per line: the name index keys in sorted order,
+        then "birth date<TAB>name<TAB>name..." per birth date
+
+Loading is a few bulk operations (one decode, one split, dict(zip())),
+and all entries of a pharmacy share one APO key string.
+"""
+import json
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.hashing import file_sha256
+
+MAGIC = b"ERZSNAP1"
+VERSION = 1
+
+NameIndex = Dict[str, str]
+DateIndex = Dict[str, Tuple[str, ...]]
+
+
+def save_snapshot(
+    snapshot_file: Path,
+    source: Path,
+    signature: tuple,
+    name_index: NameIndex,
+    date_index: DateIndex,
+    layout: Optional[dict] = None
+) -> bool:
+    """
+    Write the patient indexes to a snapshot file.
+
+    The file is written to a temporary name and renamed, so a reader never
+    sees a partly written snapshot.
+
+    Args:
+        snapshot_file: Target path.
+        source: Patient CSV the indexes were built from.
+        signature: (mtime_ns, size, sha256) of the CSV they were built from.
+        name_index: "normalized name;birth date" -> APO_KEY.
+        date_index: Birth date -> normalized names.
+        layout: JSON-serializable description of how the CSV was parsed
+            (column mapping, parser version); load_snapshot() only accepts
+            the snapshot for an equal layout.
+
+    Returns:
+        True if the snapshot was written.
+    """
+    keys = sorted(name_index)
+    dates = sorted(date_index)
+
+    # Names are whitespace-normalized; birth dates come straight from the CSV
+    if any("\n" in date or "\t" in date for date in dates):
+        print("[WARN] Birth date with line break or tab, patient snapshot not written")
+        return False
+
+    apo_keys = sorted(set(name_index.values()))
+    numbers = {apo_key: number for number, apo_key in enumerate(apo_keys)}
+    apo_numbers = array("I", (numbers[name_index[key]] for key in keys))
+
+    lines = keys + ["\t".join((date,) + date_index[date]) for date in dates]
+    header = json.dumps({
+        "version": VERSION,
+        "byteorder": sys.byteorder,
+        "source": str(source.resolve()),
+        "signature": list(signature),
+        "layout": layout,
+        "names": len(keys),
+        "dates": len(dates),
+        "apo_keys": apo_keys,
+    }).encode("utf-8")
+
+    tmp_file = snapshot_file.with_name(snapshot_file.name + ".tmp")
+    try:
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, "little"))
+            f.write(header)
+            f.write(apo_numbers.tobytes())
+            f.write("\n".join(lines).encode("utf-8"))
+        os.replace(tmp_file, snapshot_file)
+        return True
+    except OSError as e:
+        print(f"[WARN] Could not write patient snapshot: {e}")
+        return False
+
+
+def load_snapshot(
+    snapshot_file: Path,
+    source: Path,
+    layout: Optional[dict] = None
+) -> Optional[Tuple[tuple, NameIndex, DateIndex]]:
+    """
+    Load the patient indexes if the snapshot matches the CSV.
+
+    The snapshot is valid if it was built from the same CSV path with the
+    same layout and the CSV still has the recorded mtime and size. Otherwise the CSV is hashed:
+    a touched but unchanged file keeps the snapshot valid, and the new
+    mtime is written to the snapshot so the next start does not hash again.
+
+    Args:
+        snapshot_file: Snapshot path.
+        source: Patient CSV.
+        layout: Layout the snapshot must have been written with.
+
+    Returns:
+        Tuple of (CSV signature, name index, date index), or None if there
+        is no valid snapshot.
+    """
+    try:
+        data = memoryview(snapshot_file.read_bytes())
+    except OSError:
+        return None
+
+    try:
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            return None
+        offset = len(MAGIC) + 4
+        header_length = int.from_bytes(data[len(MAGIC):offset], "little")
+        header = json.loads(bytes(data[offset:offset + header_length]).decode("utf-8"))
+        offset += header_length
+
+        if (header["version"] != VERSION or header["byteorder"] != sys.byteorder
+                or header["source"] != str(source.resolve()) or header.get("layout") != layout):
+            return None
+
+        stat = source.stat()
+        mtime_ns, size, sha256 = header["signature"]
+        signature = (stat.st_mtime_ns, stat.st_size, sha256)
+        if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+            if stat.st_size != size or file_sha256(source) != sha256:
+                return None
+            _restamp(snapshot_file, dict(header, signature=list(signature)), data[offset:])
+
+        count = header["names"]
+        apo_numbers = array("I")
+        apo_numbers.frombytes(data[offset:offset + count * apo_numbers.itemsize])
+        offset += count * apo_numbers.itemsize
+
+        # Drop each buffer as soon as the next one is built (peak memory)
+        text = str(data[offset:], "utf-8")
+        data.release()
+        lines = text.split("\n") if text else []
+        del text
+        if len(apo_numbers) != count or len(lines) != count + header["dates"]:
+            return None
+
+        apo_keys = header["apo_keys"]
+        name_index = dict(zip(lines[:count], map(apo_keys.__getitem__, apo_numbers)))
+        date_index = {}
+        for line in lines[count:]:
+            date, *names = line.split("\t")
+            date_index[date] = tuple(names)
+
+        return signature, name_index, date_index
+
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+        print(f"[WARN] Ignoring unreadable patient snapshot: {e}")
+        return None
+
+
+def _restamp(snapshot_file: Path, header: dict, body: memoryview) -> None:
+    """Rewrite a snapshot with a new header and the same indexes (temp file + rename)."""
+    encoded = json.dumps(header).encode("utf-8")
+    tmp_file = snapshot_file.with_name(snapshot_file.name + ".tmp")
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(encoded).to_bytes(4, "little"))
+            f.write(encoded)
+            f.write(body)
+        os.replace(tmp_file, snapshot_file)
+    except OSError as e:
+        print(f"[WARN] Could not update patient snapshot: {e}")
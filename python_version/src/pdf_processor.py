@@ -1,53 +1,389 @@
 """
 PDF processing module for OCR extraction.
 
-Uses pdf2image and pytesseract to extract text from PDF files.
+Renders pages with poppler's pdftoppm and extracts text with tesseract.
+PDFs that already carry a text layer are read with pdftotext instead.
+
+Pages are rendered one at a time straight into memory as 8-bit grayscale
+(optionally binarized, OCR_THRESHOLD), which is what tesseract works on
+anyway: a third of the memory of an RGB page and no colour conversion.
+The page image is released as soon as it has been OCRed.
+
+Tesseract is used through an OCR engine (OCR_ENGINE): tesserocr keeps one
+initialized tesseract API per process (and per page OCR thread) and gets
+the rendered images in memory; pytesseract, the fallback, starts a
+tesseract process per image, which reloads the language data every time.
+
+Pillow and the OCR engine are imported on the first OCR call, so
+importing this module (and starting main.py) stays fast.
+
+Multi-page PDFs (MULTI_PAGE_ENABLED) are analyzed page by page: pages
+whose text layer has no patient data are rendered and OCRed one page at a
+time, PAGE_OCR_THREADS pages in parallel, and consecutive pages are grouped
+per patient (see group_pages()). The page OCR threads live as long as the
+process, so their tesserocr APIs are initialized once, not per PDF.
 """
+import io
+import os
 import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-
-try:
-    from pdf2image import convert_from_path
-    import pytesseract
-    from PIL import Image
-except ImportError as e:
-    raise ImportError(
-        f"Missing dependency: {e}. Install with: pip install pdf2image pytesseract Pillow"
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import (
+    OCR_LANGUAGE,
+    OCR_DPI,
+    OCR_PSM,
+    OCR_ENGINE,
+    OCR_THRESHOLD,
+    RENDER_TIMEOUT,
+    OCR_ROI_ENABLED,
+    OCR_ROI_BOX,
+    OCR_ROI_DPI,
+    OCR_ROI_PSM,
+    OCR_CACHE_ENABLED,
+    TEXT_LAYER_FIRST,
+    TEXT_LAYER_TIMEOUT,
+    MULTI_PAGE_ENABLED,
+    PAGE_OCR_THREADS,
+)
+from src.hashing import file_sha256
+from src.metrics import StageTimer
+from src.ocr_cache import OCRCache
+
+# One cache connection per thread (created lazily, so pool workers and page
+# OCR threads open their own; SQLite connections cannot be shared)
+_local = threading.local()
+
+# PIL.Image and this process's OCR engine, set by _load_ocr()
+Image = None
+_ocr_engine: Optional["OCREngine"] = None
+_ocr_load_lock = threading.Lock()
+
+# Page OCR threads of this process, created on the first multi-page PDF
+# (with the pid, so a forked worker does not use its parent's threads)
+_page_executor: Optional[Tuple[int, ThreadPoolExecutor]] = None
+_page_executor_lock = threading.Lock()
+
+
+class OCREngine:
+    """Turns a page image into text."""
+    
+    name = ""
+    
+    def image_to_string(self, image, psm: int) -> str:
+        """
+        OCR an image.
+
+        Args:
+            image: PIL image.
+            psm: Tesseract page segmentation mode.
+
+        Returns:
+            Recognized text.
+        """
+        raise NotImplementedError
+
+
+class PytesseractEngine(OCREngine):
+    """Runs the tesseract command line tool for every image (pytesseract)."""
+    
+    name = "pytesseract"
+    
+    def __init__(self, language: str = OCR_LANGUAGE):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.language = language
+    
+    def image_to_string(self, image, psm: int) -> str:
+        return self._pytesseract.image_to_string(
+            image,
+            lang=self.language,
+            config=f"--psm {psm} --oem 3"
+        )
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Keeps an initialized tesseract API in memory (tesserocr).
+
+    The language data is loaded once per thread instead of once per image,
+    and images are handed over without a temporary file. A tesseract API
+    must not be used by two threads at once, so every thread gets its own.
+    """
+    
+    name = "tesserocr"
+    
+    def __init__(self, language: str = OCR_LANGUAGE):
+        """
+        Load tesserocr and initialize the API for the calling thread.
+
+        Raises:
+            ImportError: If tesserocr is not installed.
+            RuntimeError: If tesseract cannot load the language data.
+        """
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.language = language
+        self._local = threading.local()
+        self._api()
+    
+    def _api(self):
+        """Get the calling thread's API, initializing it on first use."""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._tesserocr.PyTessBaseAPI(lang=self.language, oem=self._tesserocr.OEM.DEFAULT)
+            self._local.api = api
+        return api
+    
+    def image_to_string(self, image, psm: int) -> str:
+        api = self._api()
+        api.SetPageSegMode(psm)
+        api.SetImage(image)
+        try:
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+
+def create_ocr_engine(name: str = OCR_ENGINE, language: str = OCR_LANGUAGE) -> OCREngine:
+    """
+    Create an OCR engine.
+
+    Args:
+        name: "tesserocr", "pytesseract" or "auto" (tesserocr if it can be
+            loaded, else pytesseract).
+        language: Tesseract language.
+
+    Returns:
+        OCREngine instance.
+
+    Raises:
+        ValueError: For an unknown engine name.
+        ImportError: If no usable engine is installed.
+    """
+    if name not in ("auto", "tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown OCR engine: {name}")
+    
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrEngine(language)
+        except ImportError:
+            if name == "tesserocr":
+                print("[WARN] tesserocr is not installed, using pytesseract")
+        except RuntimeError as e:
+            print(f"[WARN] tesserocr could not be initialized ({e}), using pytesseract")
+    
+    return PytesseractEngine(language)
+
+
+def _load_ocr() -> None:
+    """Import Pillow and create the OCR engine on first use."""
+    global Image, _ocr_engine
+    with _ocr_load_lock:
+        if _ocr_engine is not None:
+            return
+        try:
+            from PIL import Image as _Image
+            engine = create_ocr_engine()
+        except ImportError as e:
+            raise ImportError(
+                f"Missing dependency: {e}. Install with: pip install pytesseract Pillow"
+                " (optionally tesserocr)"
+            )
+        Image, _ocr_engine = _Image, engine
+
+
+def render_page(
+    pdf_path: Path,
+    page: int = 1,
+    dpi: int = OCR_DPI,
+    region: Optional[Tuple[float, float, float, float]] = None,
+    threshold: Optional[int] = OCR_THRESHOLD
+):
+    """
+    Render one PDF page into memory as a grayscale image.
+
+    pdftoppm writes the page to a pipe as PGM (-gray), so there is no
+    temporary file and no RGB image at any point. Each intermediate image
+    is closed as soon as the next one exists.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        page: Page number (1-based).
+        dpi: Render resolution.
+        region: Optional (left, top, right, bottom) crop box as fractions
+            of the page.
+        threshold: Binarize: pixels darker than this (0-255) become black,
+            all others white (None = keep grayscale).
+
+    Returns:
+        PIL image in mode "L" (grayscale) or "1" (binarized); the caller
+        closes it.
+
+    Raises:
+        subprocess.CalledProcessError: If pdftoppm fails (e.g. no such page).
+        OSError: If pdftoppm is not installed.
+    """
+    _load_ocr()
+    result = subprocess.run(
+        ["pdftoppm", "-f", str(page), "-l", str(page), "-r", str(dpi), "-gray", str(pdf_path)],
+        capture_output=True,
+        timeout=RENDER_TIMEOUT,
+        check=True,
     )
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    del result
+
+    if region:
+        left, top, right, bottom = region
+        width, height = image.size
+        cropped = image.crop((
+            int(left * width),
+            int(top * height),
+            int(right * width),
+            int(bottom * height),
+        ))
+        image.close()
+        image = cropped
+
+    if threshold is not None:
+        binarized = image.point([0 if value < threshold else 255 for value in range(256)], "1")
+        image.close()
+        image = binarized
+
+    return image
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """
+    Get this thread's OCR cache.
 
-from config.settings import OCR_LANGUAGE, OCR_DPI
+    Returns:
+        OCRCache instance, or None if OCR_CACHE_ENABLED is off.
+    """
+    if not OCR_CACHE_ENABLED:
+        return None
+    cache = getattr(_local, "ocr_cache", None)
+    if cache is None:
+        cache = _local.ocr_cache = OCRCache()
+    return cache
 
 
-def extract_text_from_pdf(pdf_path: Path) -> Optional[str]:
+def get_page_count(pdf_path: Path) -> Optional[int]:
     """
-    Extract text from a PDF file using OCR.
+    Get the number of pages of a PDF with poppler's pdfinfo.
 
     Args:
         pdf_path: Path to the PDF file.
 
     Returns:
-        Extracted text as string, or None if extraction failed.
+        Page count, or None if pdfinfo fails or is unavailable.
     """
     try:
-        # Convert PDF to images (first page only)
-        images = convert_from_path(
-            pdf_path,
-            dpi=OCR_DPI,
-            first_page=1,
-            last_page=1
+        result = subprocess.run(
+            ["pdfinfo", str(pdf_path)],
+            capture_output=True,
+            timeout=TEXT_LAYER_TIMEOUT,
+            check=True,
         )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    match = re.search(rb"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+def extract_text_layer(pdf_path: Path, first_page: int = 1, last_page: int = 1) -> Optional[str]:
+    """
+    Extract the embedded text layer of a page range (default: first page).
+
+    Uses pdftotext, which ships with poppler alongside the pdftoppm
+    renderer. Pages are separated by form feeds.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        first_page: First page (1-based).
+        last_page: Last page.
+
+    Returns:
+        Embedded text, or None if the PDF has no text layer or pdftotext
+        is unavailable.
+    """
+    try:
+        result = subprocess.run(
+            [
+                "pdftotext", "-f", str(first_page), "-l", str(last_page),
+                "-enc", "UTF-8", str(pdf_path), "-",
+            ],
+            capture_output=True,
+            timeout=TEXT_LAYER_TIMEOUT,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    text = result.stdout.decode("utf-8", errors="replace")
+    return text if text.strip() else None
+
+
+def extract_text_from_pdf(
+    pdf_path: Path,
+    dpi: int = OCR_DPI,
+    psm: int = OCR_PSM,
+    region: Optional[Tuple[float, float, float, float]] = None,
+    content_hash: Optional[str] = None,
+    timer: Optional[StageTimer] = None,
+    page: int = 1
+) -> Optional[str]:
+    """
+    Extract text from a PDF page using OCR.
+
+    Only that page is rendered. Results are served from / stored in the
+    OCR cache when it is enabled.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        dpi: Render resolution.
+        psm: Tesseract page segmentation mode.
+        region: Optional (left, top, right, bottom) crop box as fractions
+            of the page; only this part of the page is OCRed.
+        content_hash: SHA-256 of the PDF if already known (cache key).
+        timer: Optional timer for the "cache", "render" and "ocr" stages.
+        page: Page number (1-based).
+
+    Returns:
+        Extracted text as string, or None if extraction failed.
+    """
+    timer = timer or StageTimer()
+    try:
+        cache = get_ocr_cache()
+        if cache:
+            with timer.stage("cache"):
+                cache_key = OCRCache.make_key(
+                    content_hash or file_sha256(pdf_path), OCR_LANGUAGE, dpi, psm, region, page,
+                    OCR_THRESHOLD,
+                )
+                cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        if not images:
-            print(f"[ERROR] No pages found in PDF: {pdf_path}")
-            return None
+        with timer.stage("render"):
+            image = render_page(pdf_path, page, dpi, region)
         
-        # OCR on first page
-        text = pytesseract.image_to_string(
-            images[0],
-            lang=OCR_LANGUAGE,
-            config="--psm 1 --oem 3"  # Auto page segmentation with OSD
-        )
+        try:
+            with timer.stage("ocr"):
+                text = _ocr_engine.image_to_string(image, psm)
+        finally:
+            # Free the page buffer now, not whenever the image is collected
+            image.close()
+        
+        if cache and text:
+            with timer.stage("cache"):
+                cache.put(cache_key, text)
         
         return text
     
@@ -56,6 +392,357 @@ def extract_text_from_pdf(pdf_path: Path) -> Optional[str]:
         return None
 
 
+def analyze_pdf(pdf_path: Path, content_hash: Optional[str] = None) -> dict:
+    """
+    Run OCR and patient extraction for a single PDF.
+
+    This is the CPU-heavy part of the pipeline. It has no side effects on
+    the output folders, so it can run in a worker process.
+
+    Text sources are tried from cheapest to most expensive, and each is
+    accepted only if it yields patient data:
+    1. Embedded text layer (TEXT_LAYER_FIRST)
+    2. OCR of the patient header region at OCR_ROI_DPI (OCR_ROI_ENABLED)
+    3. OCR of the full page at OCR_DPI (always accepted if it yields text)
+
+    For multi-page PDFs (MULTI_PAGE_ENABLED) this runs for every page and
+    the pages are grouped per patient; the top-level fields then describe
+    the first group.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        content_hash: SHA-256 of the PDF if already known (OCR cache key).
+
+    Returns:
+        Dict with 'text_ok' (text was extracted), 'patient_info' (dict or
+        None), 'source' ("text_layer", "ocr_roi", "ocr" or None),
+        'pages' (page count), 'groups' (see group_pages(); more than one
+        means the PDF holds several patients), 'cache_hits' /
+        'cache_misses' (OCR cache lookups for this file), 'timings' (wall /
+        CPU seconds per stage, see StageTimer) and 'error' (message of an
+        unexpected exception, or None).
+    """
+    timer = StageTimer()
+    analysis = {
+        "text_ok": False,
+        "patient_info": None,
+        "source": None,
+        "pages": 1,
+        "groups": [],
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "timings": timer.timings,
+        "error": None,
+    }
+
+    try:
+        page_count = 1
+        if MULTI_PAGE_ENABLED:
+            with timer.stage("text_layer"):
+                page_count = get_page_count(pdf_path) or 1
+        analysis["pages"] = page_count
+
+        results: List[Optional[dict]] = [None] * page_count
+
+        if TEXT_LAYER_FIRST:
+            with timer.stage("text_layer"):
+                if page_count == 1:
+                    texts = [extract_text_layer(pdf_path)]
+                else:
+                    texts = _split_pages(extract_text_layer(pdf_path, 1, page_count), page_count)
+            with timer.stage("parse"):
+                for index, text in enumerate(texts):
+                    patient_info = extract_patient_info(text)
+                    if patient_info:
+                        results[index] = _page_result(True, patient_info, "text_layer")
+
+        pages = [index + 1 for index, result in enumerate(results) if result is None]
+        if pages:
+            if not content_hash and get_ocr_cache():
+                with timer.stage("hash"):
+                    content_hash = file_sha256(pdf_path)
+
+            if len(pages) == 1:
+                results[pages[0] - 1] = _ocr_page(pdf_path, pages[0], content_hash, timer)
+            else:
+                # One page image per thread at a time; the timers are merged
+                # afterwards (StageTimer is not thread-safe)
+                def ocr_page(page: int) -> Tuple[dict, StageTimer]:
+                    page_timer = StageTimer()
+                    return _ocr_page(pdf_path, page, content_hash, page_timer), page_timer
+
+                for page, (result, page_timer) in zip(pages, _get_page_executor().map(ocr_page, pages)):
+                    results[page - 1] = result
+                    timer.merge(page_timer.timings)
+
+        for result in results:
+            analysis["cache_hits"] += result["cache_hits"]
+            analysis["cache_misses"] += result["cache_misses"]
+
+        groups = group_pages(results)
+        analysis["groups"] = groups
+        analysis["text_ok"] = groups[0]["text_ok"]
+        analysis["patient_info"] = groups[0]["patient_info"]
+        analysis["source"] = groups[0]["source"]
+    except Exception as e:
+        analysis["error"] = str(e)
+
+    return analysis
+
+
+def _get_page_executor() -> ThreadPoolExecutor:
+    """Get this process's page OCR threads (PAGE_OCR_THREADS, created on first use)."""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None or _page_executor[0] != os.getpid():
+            executor = ThreadPoolExecutor(max(1, PAGE_OCR_THREADS), thread_name_prefix="page-ocr")
+            _page_executor = (os.getpid(), executor)
+        return _page_executor[1]
+
+
+def _page_result(text_ok: bool, patient_info: Optional[dict], source: Optional[str]) -> dict:
+    """Build the analysis result of one page."""
+    return {
+        "text_ok": text_ok,
+        "patient_info": patient_info,
+        "source": source,
+        "cache_hits": 0,
+        "cache_misses": 0,
+    }
+
+
+def _split_pages(text: Optional[str], page_count: int) -> List[Optional[str]]:
+    """Split pdftotext output into pages (form feed after every page)."""
+    pages = text.split("\f")[:page_count] if text else []
+    return pages + [None] * (page_count - len(pages))
+
+
+def _ocr_page(
+    pdf_path: Path,
+    page: int,
+    content_hash: Optional[str],
+    timer: StageTimer
+) -> dict:
+    """
+    OCR one page: patient header region first, then the full page.
+
+    Args:
+        pdf_path: Path to the PDF file.
+        page: Page number (1-based).
+        content_hash: SHA-256 of the PDF (OCR cache key).
+        timer: Timer for the OCR stages of this page.
+
+    Returns:
+        Page result (see _page_result()) with this thread's OCR cache
+        hits and misses.
+    """
+    cache = get_ocr_cache()
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    result = _page_result(False, None, None)
+
+    try:
+        if OCR_ROI_ENABLED:
+            text = extract_text_from_pdf(
+                pdf_path,
+                dpi=OCR_ROI_DPI,
+                psm=OCR_ROI_PSM,
+                region=OCR_ROI_BOX,
+                content_hash=content_hash,
+                timer=timer,
+                page=page,
+            )
+            with timer.stage("parse"):
+                patient_info = extract_patient_info(text)
+            if patient_info:
+                result.update(text_ok=True, patient_info=patient_info, source="ocr_roi")
+                return result
+
+        text = extract_text_from_pdf(pdf_path, content_hash=content_hash, timer=timer, page=page)
+        if text:
+            with timer.stage("parse"):
+                result.update(text_ok=True, patient_info=extract_patient_info(text), source="ocr")
+        return result
+    finally:
+        if cache:
+            result["cache_hits"] = cache.hits - hits
+            result["cache_misses"] = cache.misses - misses
+
+
+def group_pages(results: List[dict]) -> List[dict]:
+    """
+    Group the pages of a PDF per patient.
+
+    A page with patient data starts a new group unless it names the same
+    patient (name and birth date) as the group before it. Pages without
+    patient data belong to the group before them; leading pages without
+    patient data form a group of their own.
+
+    Args:
+        results: Page results in page order (see _page_result()).
+
+    Returns:
+        List of dicts with 'pages' (1-based page numbers), 'patient_info',
+        'source' (of the page the patient was found on, or of the first
+        page with text if there is no patient) and 'text_ok' (text was
+        extracted from any page of the group).
+    """
+    groups: List[Dict] = []
+    for page, result in enumerate(results, 1):
+        patient_info = result["patient_info"]
+        current = groups[-1] if groups else None
+
+        if current and (not patient_info or _same_patient(patient_info, current["patient_info"])):
+            current["pages"].append(page)
+            if result["text_ok"] and not current["text_ok"]:
+                current["text_ok"] = True
+                current["source"] = result["source"]
+            continue
+
+        groups.append({
+            "pages": [page],
+            "patient_info": patient_info,
+            "source": result["source"],
+            "text_ok": result["text_ok"],
+        })
+    return groups
+
+
+def _same_patient(a: Optional[dict], b: Optional[dict]) -> bool:
+    """Check whether two patient infos name the same patient."""
+    if not a or not b:
+        return False
+    return (
+        " ".join(a["name"].split()).casefold() == " ".join(b["name"].split()).casefold()
+        and a["birth_date"] == b["birth_date"]
+    )
+
+
+# Capitalized name word, e.g. "Heilmann" or "Großmann"
+_NAME_WORD = r"[A-ZÄÖÜ][a-zäöüß]+"
+
+
+class PatientExtractor:
+    """
+    Precompiled, single-pass patient extractor for OCR text.
+
+    The "für" and "geboren" anchors are located with plain substring
+    searches on the lowercased text (much faster than case-insensitive
+    regex scans), and the layout patterns are only tried, anchored, at
+    those positions. This gives the same first match as searching the
+    whole text with each pattern. The birth date is looked up once and
+    shared by layouts B and flexible.
+
+    Layouts, tried in this order:
+    - "A": "für geboren am" on one line, then "Name DD.MM.YYYY" on the next
+    - "B": "für", then "Name" on its own line, "geboren am" and the date later
+    - "flexible": first name after "für" and first date after "geboren am"
+    """
+    
+    _FUER = re.compile(r"für", re.IGNORECASE)
+    _GEBOREN = re.compile(r"geboren", re.IGNORECASE)
+    
+    # Format A: "für geboren am\nHarry Heilmann 29.04.1949"
+    _SAME_LINE = re.compile(
+        rf"für\s+geboren\s+am\s*[\r\n]+\s*({_NAME_WORD}(?:\s+{_NAME_WORD})+)\s+(\d{{2}}\.\d{{2}}\.\d{{4}})",
+        re.IGNORECASE,
+    )
+    # Format B: "für\nAstrid Pföhler\n...\ngeboren am\n27.03.1939"
+    # Name is on the line immediately after "für", before "ausgestellt"
+    _SEPARATE = re.compile(rf"für\s*[\r\n]+\s*({_NAME_WORD}\s+{_NAME_WORD})\s*[\r\n]+")
+    # Flexible: first capitalized name after "für" (just 2 words, no more)
+    _FLEXIBLE_NAME = re.compile(rf"für\s*[\r\n]+\s*({_NAME_WORD}\s+{_NAME_WORD})")
+    _BIRTH_DATE = re.compile(r"geboren\s+am\s*[\r\n]+\s*(\d{2}\.\d{2}\.\d{4})", re.IGNORECASE)
+    # Names that belong to the prescribing doctor, not the patient
+    _DOCTOR = re.compile(r"Frank|Dr\.|med\.", re.IGNORECASE)
+    
+    def extract(self, text: str) -> Optional[dict]:
+        """
+        Extract patient name and birthdate from OCR text.
+
+        Args:
+            text: OCR extracted text.
+
+        Returns:
+            Dict with 'name', 'birth_date', 'full_name' and 'format' (the
+            layout that matched: "A", "B" or "flexible"), or None.
+        """
+        if not text:
+            return None
+        
+        lowered = text.lower()
+        # A few characters (e.g. "İ") lowercase to two, which would shift
+        # positions; such texts fall back to case-insensitive regex scans
+        exact_positions = len(lowered) == len(text)
+        
+        # Every layout starts with "für"
+        if exact_positions:
+            fuer_positions = self._find_all(lowered, "für")
+        else:
+            fuer_positions = [anchor.start() for anchor in self._FUER.finditer(text)]
+        if not fuer_positions:
+            return None
+        
+        match = self._first_match(self._SAME_LINE, text, fuer_positions)
+        if match and not self._is_doctor(match.group(1)):
+            return self._result(match.group(1), match.group(2), "A")
+        
+        if exact_positions:
+            date_positions = self._find_all(lowered, "geboren")
+        else:
+            date_positions = [anchor.start() for anchor in self._GEBOREN.finditer(text)]
+        birth_date = self._first_match(self._BIRTH_DATE, text, date_positions)
+        if not birth_date:
+            return None
+        
+        match = self._first_match(self._SEPARATE, text, fuer_positions)
+        if match and not self._is_doctor(match.group(1)):
+            return self._result(match.group(1), birth_date.group(1), "B")
+        
+        match = self._first_match(self._FLEXIBLE_NAME, text, fuer_positions)
+        if match and not self._is_doctor(match.group(1)):
+            return self._result(match.group(1), birth_date.group(1), "flexible")
+        
+        return None
+    
+    @staticmethod
+    def _find_all(text: str, word: str) -> list:
+        """Return the start positions of all occurrences of word."""
+        positions = []
+        position = text.find(word)
+        while position != -1:
+            positions.append(position)
+            position = text.find(word, position + 1)
+        return positions
+    
+    @staticmethod
+    def _first_match(pattern: "re.Pattern", text: str, positions: list) -> Optional["re.Match"]:
+        """Return the match at the first anchor position where pattern matches."""
+        for position in positions:
+            match = pattern.match(text, position)
+            if match:
+                return match
+        return None
+    
+    def _is_doctor(self, name: str) -> bool:
+        """Check whether a name is the doctor's rather than the patient's."""
+        return self._DOCTOR.search(name) is not None
+    
+    @staticmethod
+    def _result(name: str, birth_date: str, layout: str) -> dict:
+        """Build the patient info dict."""
+        name = name.strip()
+        birth_date = birth_date.strip()
+        return {
+            "name": name,
+            "birth_date": birth_date,
+            "full_name": f"{name} ({birth_date})",
+            "format": layout,
+        }
+
+
+_EXTRACTOR = PatientExtractor()
+
+
 def extract_patient_info(text: str) -> Optional[dict]:
     """
     Extract patient name and birthdate from OCR text.
@@ -64,49 +751,13 @@ def extract_patient_info(text: str) -> Optional[dict]:
     - Format A: "für geboren am" on same line, then "Name DD.MM.YYYY" on next line
     - Format B: "für" then "Name" then "geboren am" then "DD.MM.YYYY" on separate lines
 
+    See PatientExtractor for the matching rules.
+
     Args:
         text: OCR extracted text.
 
     Returns:
-        Dict with 'name' and 'birth_date' keys, or None if not found.
+        Dict with 'name', 'birth_date', 'full_name' and 'format' keys, or
+        None if not found.
     """
-    if not text:
-        return None
-    
-    # Pattern 1: Name and date on SAME line after "für geboren am"
-    # Example: "für geboren am\nHarry Heilmann 29.04.1949"
-    pattern_same_line = r"für\s+geboren\s+am\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+(?:\s+[A-ZÄÖÜ][a-zäöüß]+)+)\s+(\d{2}\.\d{2}\.\d{4})"
-    
-    match = re.search(pattern_same_line, text, re.IGNORECASE)
-    if match:
-        name = match.group(1).strip()
-        birth_date = match.group(2).strip()
-        if not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
-            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
-    
-    # Pattern 2: Name and date on SEPARATE lines
-    # Example: "für\nAstrid Pföhler\n...\ngeboren am\n27.03.1939"
-    # Name is on the line immediately after "für", before "ausgestellt"
-    pattern_separate = r"für\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+\s+[A-ZÄÖÜ][a-zäöüß]+)\s*[\r\n]+"
-    
-    match = re.search(pattern_separate, text)
-    if match:
-        name = match.group(1).strip()
-        # Find date separately
-        date_match = re.search(r"geboren\s+am\s*[\r\n]+\s*(\d{2}\.\d{2}\.\d{4})", text, re.IGNORECASE)
-        if date_match and not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
-            birth_date = date_match.group(1).strip()
-            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
-    
-    # Pattern 3: Flexible - find name after "für" and date after "geboren am"
-    # Extract name: first capitalized name after "für" (just 2 words, no more)
-    name_match = re.search(r"für\s*[\r\n]+\s*([A-ZÄÖÜ][a-zäöüß]+\s+[A-ZÄÖÜ][a-zäöüß]+)", text)
-    date_match = re.search(r"geboren\s+am\s*[\r\n]+\s*(\d{2}\.\d{2}\.\d{4})", text, re.IGNORECASE)
-    
-    if name_match and date_match:
-        name = name_match.group(1).strip()
-        birth_date = date_match.group(1).strip()
-        if not re.search(r"Frank|Dr\.|med\.", name, re.IGNORECASE):
-            return {"name": name, "birth_date": birth_date, "full_name": f"{name} ({birth_date})"}
-    
-    return None
+    return _EXTRACTOR.extract(text)
@@ -0,0 +1,295 @@
+"""
+Staged pipeline for --mode pipeline.
+
+Instead of finishing one file before the next stage of the next file can
+start, the work is split into stages connected by bounded asyncio queues:
+
+    hash -> analyze -> route -> mail
+
+- hash: SHA-256 + duplicate check (threads, I/O bound)
+- analyze: text layer / render + OCR + patient extraction (process pool,
+  CPU bound; rendering and OCR stay fused in analyze_pdf() so page images
+  never have to be shipped between processes)
+- route: lookup + routing (one thread: the routing manifest and the
+  duplicate index are not thread-safe)
+- mail: KIM dispatch of whatever has been routed so far (one thread)
+
+With a batch journal, PDFs routed before a restart are dropped in the hash
+stage, and those with a stored analysis go straight to the route stage.
+
+A full queue blocks the stage in front of it (backpressure), so a slow
+stage never piles up more than `queue_size` files. Queue depths are
+reported periodically and the maximum depth per queue is kept.
+"""
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config.settings import (
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_HASH_WORKERS,
+    PIPELINE_REPORT_INTERVAL,
+)
+from src.hashing import file_sha256
+from src.journal import STAGE_ANALYZED, STAGE_CLAIMED
+from src.metrics import STATUS_DUPLICATE, MetricsLog, StageTimer
+from src.pdf_processor import analyze_pdf
+
+# Marks the end of the input in a queue
+_DONE = object()
+
+
+class StagedPipeline:
+    """
+    Runs PDFs through the hash, analyze, route and mail stages concurrently.
+
+    The pipeline can be run for several batches (watch mode); the executor
+    passed in is reused and not shut down.
+    """
+
+    def __init__(
+        self,
+        handle: Callable[[Path, dict, Optional[str]], None],
+        results: dict,
+        duplicates=None,
+        sender=None,
+        metrics: Optional[MetricsLog] = None,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        analyze: Callable[..., dict] = analyze_pdf,
+        journal=None,
+        status=None,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        hash_workers: int = PIPELINE_HASH_WORKERS,
+        report_interval: float = PIPELINE_REPORT_INTERVAL
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            handle: Route stage, called as handle(pdf_path, analysis,
+                file_hash) in a single worker thread.
+            results: Summary counters, updated in place ('duplicate' and the
+                'kim_*' counters).
+            duplicates: Duplicate index, or None to skip the duplicate check.
+            sender: KIM sender flushed by the mail stage, or None.
+            metrics: Metrics log for the "hash" and "mail" stage timings.
+            workers: Concurrent analyze_pdf() calls (None = CPU count).
+            executor: Executor for the analyze stage (default: a process
+                pool with `workers` processes, created per run).
+            analyze: Analysis function, called as analyze(pdf_path, file_hash).
+            journal: Batch journal (src/journal.py), or None. The route
+                stage (`handle`) records the later stages itself.
+            status: RunStatus (src/status_server.py) that tracks the backlog
+                and the documents in flight, or None.
+            queue_size: Maximum items waiting in front of each stage.
+            hash_workers: Concurrent hashing threads.
+            report_interval: Seconds between queue depth reports (0 = off).
+        """
+        self.handle = handle
+        self.results = results
+        self.duplicates = duplicates
+        self.sender = sender
+        self.metrics = metrics
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.analyze = analyze
+        self.journal = journal
+        self.status = status
+        self.queue_size = max(1, queue_size)
+        self.hash_workers = max(1, hash_workers)
+        self.report_interval = report_interval
+
+        self.max_depths: Dict[str, int] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+
+    def run(self, pdf_files: List[Path]) -> None:
+        """
+        Process the PDFs and return when every stage has finished.
+
+        Args:
+            pdf_files: PDFs to process.
+        """
+        if not pdf_files:
+            return
+
+        if self.executor is not None:
+            asyncio.run(self._run(pdf_files, self.executor))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                asyncio.run(self._run(pdf_files, executor))
+
+    def queue_depths(self) -> Dict[str, int]:
+        """
+        Get the current number of items waiting in front of each stage.
+
+        Returns:
+            Dict with stage names as keys and queue lengths as values
+            (empty while no batch is running).
+        """
+        return {name: queue.qsize() for name, queue in self._queues.items()}
+
+    async def _run(self, pdf_files: List[Path], analyze_executor: Executor) -> None:
+        """Wire up the stages and wait for them to finish."""
+        loop = asyncio.get_running_loop()
+        self._queues = {
+            name: asyncio.Queue(maxsize=self.queue_size)
+            for name in ("hash", "analyze", "route", "mail")
+        }
+        for name in self._queues:
+            self.max_depths.setdefault(name, 0)
+        seen = set()
+
+        async def hash_stage(pdf_path: Path) -> None:
+            if self.status is not None:
+                self.status.start(pdf_path)
+            try:
+                file_hash = await loop.run_in_executor(io_executor, self._hash, pdf_path)
+            except OSError as e:
+                # Let the normal processing report the problem
+                print(f"[WARN] Could not hash {pdf_path.name}: {e}")
+                file_hash = None
+
+            if self.duplicates is not None and file_hash:
+                if file_hash in self.duplicates or file_hash in seen:
+                    print(f"\n[DUPLICATE] {pdf_path.name} was already processed, skipped")
+                    self.results["duplicate"] += 1
+                    if self.metrics:
+                        self.metrics.record(pdf_path, STATUS_DUPLICATE, "Already processed", file_hash=file_hash)
+                    self._finish(pdf_path)
+                    return
+                seen.add(file_hash)
+
+            if self.journal is not None:
+                if self.journal.is_routed(file_hash):
+                    print(f"\n[RESUME] {pdf_path.name} was routed before the restart, skipped")
+                    self.results["resumed"] += 1
+                    if self.metrics:
+                        self.metrics.record(pdf_path, STATUS_DUPLICATE, "Already routed (journal)", file_hash=file_hash)
+                    self._finish(pdf_path)
+                    return
+                analysis = self.journal.analysis(file_hash)
+                if analysis:
+                    print(f"\n[RESUME] {pdf_path.name}: analysis from the journal, no OCR")
+                    await self._put("route", (pdf_path, analysis, file_hash))
+                    return
+                self.journal.record(file_hash, STAGE_CLAIMED, file=pdf_path.name)
+
+            await self._put("analyze", (pdf_path, file_hash))
+
+        async def analyze_stage(item: tuple) -> None:
+            pdf_path, file_hash = item
+            analysis = await loop.run_in_executor(analyze_executor, self.analyze, pdf_path, file_hash)
+            if self.journal is not None and not analysis.get("error"):
+                self.journal.record(file_hash, STAGE_ANALYZED, analysis=analysis)
+            await self._put("route", (pdf_path, analysis, file_hash))
+
+        async def route_stage(item: tuple) -> None:
+            await loop.run_in_executor(route_executor, self.handle, *item)
+            self._finish(item[0])
+            if self.sender is not None:
+                await self._put("mail", True)
+
+        async def mail_stage(_item) -> None:
+            # Everything routed up to now goes out in one flush
+            queue = self._queues["mail"]
+            while not queue.empty():
+                if queue.get_nowait() is _DONE:
+                    queue.put_nowait(_DONE)
+                    break
+            if not self.sender.pending:
+                return
+            stats = await loop.run_in_executor(mail_executor, self._flush)
+            self.results["kim_sent"] += stats["sent"]
+            self.results["kim_failed"] += stats["failed"]
+            self.results["kim_messages"] += stats["messages"]
+
+        with ThreadPoolExecutor(self.hash_workers) as io_executor, \
+                ThreadPoolExecutor(1) as route_executor, \
+                ThreadPoolExecutor(1) as mail_executor:
+            stages = [
+                self._stage("hash", hash_stage, self.hash_workers, "analyze"),
+                self._stage("analyze", analyze_stage, self.workers, "route"),
+                self._stage("route", route_stage, 1, "mail"),
+                self._stage("mail", mail_stage, 1, None),
+                self._feed(pdf_files),
+            ]
+            reporter = asyncio.ensure_future(self._report())
+            try:
+                await asyncio.gather(*stages)
+                # Only the end markers are left
+                self._queues = {}
+            finally:
+                reporter.cancel()
+
+    def _hash(self, pdf_path: Path) -> str:
+        """Hash a file, timed as the "hash" stage (runs in a thread)."""
+        timer = self.metrics.timer(pdf_path) if self.metrics else StageTimer()
+        with timer.stage("hash"):
+            return file_sha256(pdf_path)
+
+    def _flush(self) -> dict:
+        """Flush the KIM sender, timed as the "mail" stage (runs in a thread)."""
+        # Everything that is sent must be on disk as routed first
+        if self.journal is not None:
+            self.journal.flush()
+        timer = StageTimer()
+        with timer.stage("mail"):
+            stats = self.sender.flush()
+        if self.metrics:
+            self.metrics.add_sample("mail", timer.timings["mail"]["wall"])
+        if self.journal is not None:
+            self.journal.mark_sent(stats["done"])
+        return stats
+
+    def _finish(self, pdf_path: Path) -> None:
+        """Report a document as done to the run status."""
+        if self.status is not None:
+            self.status.finish(pdf_path)
+
+    async def _feed(self, pdf_files: List[Path]) -> None:
+        """Put the input files into the first queue, then the end marker."""
+        if self.status is not None:
+            self.status.queue(len(pdf_files))
+        for pdf_path in pdf_files:
+            await self._put("hash", pdf_path)
+        await self._queues["hash"].put(_DONE)
+
+    async def _stage(self, name: str, process, concurrency: int, next_stage: Optional[str]) -> None:
+        """
+        Run `concurrency` workers that take items from the stage's queue.
+
+        When the end marker arrives, it is passed on to the next stage once
+        all workers of this stage are idle.
+        """
+        queue = self._queues[name]
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    # Let the other workers of this stage see it too
+                    await queue.put(_DONE)
+                    return
+                await process(item)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if next_stage:
+            await self._queues[next_stage].put(_DONE)
+
+    async def _put(self, name: str, item) -> None:
+        """Put an item into a stage queue (waits while it is full)."""
+        queue = self._queues[name]
+        await queue.put(item)
+        self.max_depths[name] = max(self.max_depths[name], queue.qsize())
+
+    async def _report(self) -> None:
+        """Print the queue depths every `report_interval` seconds."""
+        if self.report_interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.report_interval)
+            depths = ", ".join(f"{name}={depth}" for name, depth in self.queue_depths().items())
+            print(f"[PIPELINE] Queue depth: {depths}")
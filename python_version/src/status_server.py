@@ -0,0 +1,268 @@
+"""
+Live status of a running main.py as Prometheus metrics over HTTP.
+
+With STATUS_HTTP_PORT (or --status-port) set, main.py serves
+
+    http://STATUS_HTTP_HOST:STATUS_HTTP_PORT/metrics
+
+in the Prometheus text format, so a scrape (or a curl) shows whether the
+service is working, stuck on a document or idle:
+- documents per status, KIM dispatch, text sources and OCR cache counters
+  (the summary counters of the run)
+- backlog, documents in flight and how long the oldest one has been in
+  flight, pipeline queue depths, files the watcher waits on
+- wall time histograms per stage (render, ocr, lookup, ...)
+- size and age of the loaded CSV data
+
+Almost everything is read from the objects the run keeps anyway when a
+scrape comes in; processing only pays for a dict update when a document
+starts and finishes and a histogram bucket increment per stage.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.settings import STATUS_HTTP_HOST, STATUS_HTTP_PORT
+from src.metrics import MetricsLog
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Summary counters exported as documents per status
+DOCUMENT_STATUSES = ["success", "no_patient", "no_pharmacy", "error", "duplicate", "resumed"]
+TEXT_SOURCES = ["text_layer", "ocr_roi", "ocr"]
+
+
+class RunStatus:
+    """
+    Progress of the current run, rendered as Prometheus metrics.
+
+    Thread-safe: documents are started and finished by the processing
+    threads while the status server renders from its own threads.
+    """
+
+    def __init__(self, results: dict, metrics: Optional[MetricsLog] = None, lookup=None):
+        """
+        Initialize the run status.
+
+        Args:
+            results: Summary counters of the run (read, never changed).
+            metrics: Metrics log with the stage histograms, or None.
+            lookup: PatientPharmacyLookup for the CSV data gauges, or None.
+        """
+        self.results = results
+        self.metrics = metrics
+        self.lookup = lookup
+        # Set by the caller when the run uses them
+        self.pipeline = None
+        self.watcher = None
+        self.started = time.time()
+
+        self._queued = 0
+        # PDF path -> monotonic time processing started
+        self._in_flight: Dict[Path, float] = {}
+        self._last_finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def queue(self, count: int) -> None:
+        """Add documents that are waiting to be processed."""
+        with self._lock:
+            self._queued += count
+
+    def start(self, pdf_path: Path) -> None:
+        """Move a queued document to in flight (repeated calls are ignored)."""
+        with self._lock:
+            if pdf_path in self._in_flight:
+                return
+            self._queued = max(0, self._queued - 1)
+            self._in_flight[pdf_path] = time.monotonic()
+
+    def finish(self, pdf_path: Path) -> None:
+        """Mark a document as done (routed, skipped or failed)."""
+        with self._lock:
+            if self._in_flight.pop(pdf_path, None) is None:
+                self._queued = max(0, self._queued - 1)
+            self._last_finished = time.time()
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+
+        Returns:
+            The exposition text, one sample per line.
+        """
+        now = time.monotonic()
+        with self._lock:
+            queued = self._queued
+            oldest = min(self._in_flight.values(), default=None)
+            in_flight = len(self._in_flight)
+            last_finished = self._last_finished
+        results = dict(self.results)
+
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        metric("erezept_start_time_seconds", "gauge", "Start of the run (Unix time).", [({}, self.started)])
+        metric(
+            "erezept_documents_total", "counter", "Processed documents by status.",
+            [({"status": status}, results.get(status, 0)) for status in DOCUMENT_STATUSES],
+        )
+        metric(
+            "erezept_text_source_total", "counter", "Documents by the source of their text.",
+            [({"source": source}, results.get(source, 0)) for source in TEXT_SOURCES],
+        )
+        metric(
+            "erezept_ocr_cache_total", "counter", "OCR cache lookups.",
+            [({"result": "hit"}, results.get("cache_hits", 0)), ({"result": "miss"}, results.get("cache_misses", 0))],
+        )
+        metric(
+            "erezept_kim_pdfs_total", "counter", "PDFs sent via KIM.",
+            [({"result": "sent"}, results.get("kim_sent", 0)), ({"result": "failed"}, results.get("kim_failed", 0))],
+        )
+        metric("erezept_kim_messages_total", "counter", "KIM messages sent.", [({}, results.get("kim_messages", 0))])
+
+        metric("erezept_backlog_documents", "gauge", "Documents waiting to be processed.", [({}, queued)])
+        metric("erezept_in_flight_documents", "gauge", "Documents being processed.", [({}, in_flight)])
+        metric(
+            "erezept_oldest_in_flight_seconds", "gauge",
+            "Time the oldest document in flight has been processed (0 = idle).",
+            [({}, now - oldest if oldest is not None else 0)],
+        )
+        if last_finished is not None:
+            metric(
+                "erezept_last_document_timestamp_seconds", "gauge",
+                "Time the last document was finished (Unix time).", [({}, last_finished)],
+            )
+        if self.pipeline is not None:
+            depths = self.pipeline.queue_depths()
+            metric(
+                "erezept_pipeline_queue_depth", "gauge", "Items waiting in front of each pipeline stage.",
+                [({"stage": stage}, depths.get(stage, 0)) for stage in self.pipeline.max_depths],
+            )
+        if self.watcher is not None:
+            metric(
+                "erezept_watch_pending_files", "gauge", "Input files waiting to become stable.",
+                [({}, self.watcher.pending)],
+            )
+
+        if self.metrics is not None:
+            histograms = self.metrics.histograms()
+            if histograms:
+                name = "erezept_stage_duration_seconds"
+                lines.append(f"# HELP {name} Wall time per document and stage.")
+                lines.append(f"# TYPE {name} histogram")
+                for stage, histogram in histograms.items():
+                    for bound, count in histogram["buckets"]:
+                        le = "+Inf" if bound == float("inf") else _number(bound)
+                        lines.append(f"{name}_bucket{_labels({'stage': stage, 'le': le})} {count}")
+                    lines.append(f"{name}_sum{_labels({'stage': stage})} {_number(histogram['sum'])}")
+                    lines.append(f"{name}_count{_labels({'stage': stage})} {histogram['count']}")
+
+        if self.lookup is not None and self.lookup.loaded_at is not None:
+            metric("erezept_csv_patients", "gauge", "Patients in the loaded CSV data.", [({}, self.lookup.patient_count)])
+            metric(
+                "erezept_csv_kim_addresses", "gauge", "Pharmacies with a KIM address in the loaded CSV data.",
+                [({}, self.lookup.kim_count)],
+            )
+            metric(
+                "erezept_csv_age_seconds", "gauge", "Time since the CSV data was loaded.",
+                [({}, time.time() - self.lookup.loaded_at)],
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+class StatusServer:
+    """
+    Serves RunStatus.render() on /metrics from a background thread.
+    """
+
+    def __init__(self, status: RunStatus, host: str = STATUS_HTTP_HOST, port: Optional[int] = STATUS_HTTP_PORT):
+        """
+        Initialize the server.
+
+        Args:
+            status: Status of the run to serve.
+            host: Interface to listen on.
+            port: TCP port (0 = any free port, see `port` after start()).
+        """
+        self.status = status
+        self.host = host
+        self.port = port or 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """URL of the metrics page."""
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self) -> None:
+        """
+        Start listening.
+
+        Raises:
+            OSError: If the port cannot be bound (e.g. already in use).
+        """
+        status = self.status
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = status.render().encode("utf-8")
+                except Exception as e:
+                    print(f"[ERROR] Status page failed: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes would flood the processing output
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="status-http", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+
+def _labels(labels: dict) -> str:
+    """Format a label set ({} -> "")."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value (backslash, double quote, newline)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    """Format a sample value (integers without a decimal point)."""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,213 @@
+"""
+Input folder watcher for long-running (--watch) mode.
+
+Detects new PDFs in the input folder and hands each one out once it has
+been completely written. File system events come from the optional
+watchdog package (inotify on Linux, ReadDirectoryChangesW on Windows);
+without it, the folder is polled.
+"""
+import fnmatch
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import (
+    FILE_PATTERN,
+    WATCH_POLL_INTERVAL,
+    WATCH_RESCAN_INTERVAL,
+    WATCH_STABLE_SECONDS,
+    WATCH_USE_EVENTS,
+)
+
+
+class _EventHandler:
+    """
+    Minimal watchdog event handler that forwards changed paths to the watcher.
+
+    watchdog only calls dispatch(), so no watchdog base class is needed.
+    """
+
+    def __init__(self, watcher: "InputWatcher"):
+        self._watcher = watcher
+
+    def dispatch(self, event) -> None:
+        if event.is_directory:
+            return
+        paths = [event.src_path, getattr(event, "dest_path", None)]
+        self._watcher.notify([Path(p) for p in paths if p])
+
+
+class InputWatcher:
+    """
+    Watches the input folder and reports PDFs that are ready to process.
+
+    A file is ready once its size and modification time have not changed
+    for `stable_seconds`. Each file is reported only once for a given
+    size/mtime, so files that stay in the input folder (e.g. copy routing)
+    are not processed again.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        pattern: str = FILE_PATTERN,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        stable_seconds: float = WATCH_STABLE_SECONDS,
+        rescan_interval: float = WATCH_RESCAN_INTERVAL,
+        use_events: bool = WATCH_USE_EVENTS
+    ):
+        """
+        Initialize the watcher.
+
+        Args:
+            folder: Folder to watch.
+            pattern: Glob pattern for input files.
+            poll_interval: Seconds between checks while polling or while
+                files are waiting to become stable.
+            stable_seconds: Seconds a file must stay unchanged.
+            rescan_interval: Seconds between full folder scans when file
+                system events are available (safety net for missed events).
+            use_events: Use watchdog for file system events if installed.
+        """
+        self.folder = folder
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+        self.rescan_interval = rescan_interval
+        self.use_events = use_events
+        self.using_events = False
+
+        self._pending: Dict[Path, Tuple[Tuple[int, int], float]] = {}
+        self._done: Dict[Path, Tuple[int, int]] = {}
+        self._changed: Set[Path] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._observer = None
+        self._last_scan: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of files waiting to become stable."""
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start watching (file system events if available, else polling)."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        if self.use_events:
+            try:
+                from watchdog.observers import Observer
+            except ImportError:
+                print("[INFO] watchdog not installed, polling input folder")
+            else:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), str(self.folder), recursive=False)
+                self._observer.start()
+                self.using_events = True
+
+        # Scan immediately on the first wait
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        """Stop watching and wake up a pending wait."""
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self.using_events = False
+        self._wakeup.set()
+
+    def notify(self, paths: List[Path]) -> None:
+        """
+        Record changed paths and wake up the waiting thread.
+
+        Args:
+            paths: Paths reported by a file system event.
+        """
+        with self._lock:
+            self._changed.update(p for p in paths if fnmatch.fnmatch(p.name, self.pattern))
+        self._wakeup.set()
+
+    def forget(self, paths: List[Path]) -> None:
+        """
+        Report files again once they are stable, although they were ready.
+
+        Used for files another node is working on, so they are picked up
+        if that node's lease expires.
+
+        Args:
+            paths: Files reported by wait_for_ready() / check().
+        """
+        for path in paths:
+            self._done.pop(path, None)
+
+    def wait_for_ready(self) -> List[Path]:
+        """
+        Wait for the next check and return files that are ready.
+
+        Blocks for at most `poll_interval` while polling or while files are
+        pending, otherwise until the next event or full rescan.
+
+        Returns:
+            Newly ready files (may be empty).
+        """
+        if self.using_events and not self._pending:
+            timeout = self.rescan_interval
+        else:
+            timeout = self.poll_interval
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+        return self.check()
+
+    def check(self) -> List[Path]:
+        """
+        Check candidate files once without waiting.
+
+        Returns:
+            Newly ready files, sorted by name.
+        """
+        now = time.monotonic()
+        candidates = set(self._pending)
+
+        with self._lock:
+            candidates.update(self._changed)
+            self._changed = set()
+
+        full_scan = (
+            not self.using_events
+            or self._last_scan is None
+            or now - self._last_scan >= self.rescan_interval
+        )
+        if full_scan:
+            listed = set(self.folder.glob(self.pattern))
+            # Forget files that have left the folder
+            for path in list(self._done):
+                if path not in listed:
+                    del self._done[path]
+            candidates.update(listed)
+            self._last_scan = now
+
+        ready = []
+        for path in candidates:
+            try:
+                stat = path.stat()
+            except OSError:
+                self._pending.pop(path, None)
+                self._done.pop(path, None)
+                continue
+
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._done.get(path) == signature:
+                continue
+
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                # New or still being written: (re)start the stability timer
+                self._pending[path] = (signature, now)
+            elif now - pending[1] >= self.stable_seconds:
+                del self._pending[path]
+                self._done[path] = signature
+                ready.append(path)
+
+        return sorted(ready)
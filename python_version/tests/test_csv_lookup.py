@@ -1,6 +1,9 @@
 """
 Tests for CSV lookup module.
 """
+import csv
+import io
+import os
 import pytest
 import sys
 from pathlib import Path
@@ -8,23 +11,24 @@ from pathlib import Path
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.csv_lookup import PatientPharmacyLookup
+from src import csv_lookup, patient_snapshot
+from src.csv_lookup import DecodedLines, PatientPharmacyLookup, iter_records
 
 
 class TestPatientPharmacyLookup:
     """Tests for PatientPharmacyLookup class."""
     
     @pytest.fixture
-    def lookup(self):
+    def lookup(self, tmp_path):
         """Create a lookup instance with loaded data."""
-        lkp = PatientPharmacyLookup()
+        lkp = PatientPharmacyLookup(snapshot_file=tmp_path / "patients.snapshot")
         lkp.load_csv_data()
         return lkp
     
     def test_load_csv_data(self, lookup):
         """Test that CSV data loads successfully."""
         assert lookup._loaded is True
-        assert len(lookup._patient_cache) > 0
+        assert lookup.patient_count > 0
     
     def test_find_pharmacy_existing_patient(self, lookup):
         """Test finding pharmacy for existing patient."""
@@ -57,3 +61,326 @@ class TestPatientPharmacyLookup:
         """Test that wrong birthdate returns None."""
         result = lookup.find_pharmacy("Elisabeth Großmann", "01.01.2000")
         assert result is None
+
+
+def write_patient_csv(path, patients):
+    """
+    Write a patient CSV in the practice export layout.
+
+    Args:
+        path: Target file.
+        patients: List of (last_name, first_name, birth_date, sozialanamnese).
+    """
+    lines = [";".join(f"Spalte{i}" for i in range(45))]
+    for last_name, first_name, birth_date, sozialanamnese in patients:
+        row = [""] * 45
+        row[2], row[4], row[5], row[34] = last_name, first_name, birth_date, sozialanamnese
+        lines.append(";".join(row))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+class TestPatientIndex:
+    """Tests for the name and birth-date indexes on synthetic data."""
+    
+    @pytest.fixture
+    def lookup(self, tmp_path):
+        """Create a lookup from a small synthetic CSV."""
+        write_patient_csv(tmp_path / "patients.csv", [
+            ("Müller", "Anna Maria", "01.02.1930", "Tel: 123, APO_BAEREN"),
+            ("Schmidt", "Hans", "05.05.1940", "APO_FELDTOR (Feldtor)"),
+            ("Schulz", "Erika", "05.05.1940", "APO_MUEHLEN"),
+            ("Weber", "Karl", "09.09.1950", "keine Apotheke"),
+            ("Großmann", "Elisabeth", "16.08.1946", "APO_BURG_BOVENDEN"),
+            ("Pföhler", "Astrid", "16.08.1946", "APO_MUEHLEN"),
+        ])
+        (tmp_path / "kim.csv").write_text("KIM_APO;KIM_ADDR;APO_NAME\n", encoding="utf-8")
+        lkp = PatientPharmacyLookup(tmp_path / "patients.csv", tmp_path / "kim.csv", None)
+        lkp.load_csv_data()
+        return lkp
+    
+    def test_patient_count(self, lookup):
+        """Test that rows without APO_KEY are skipped."""
+        assert lookup.patient_count == 5
+    
+    def test_multi_part_first_name(self, lookup):
+        """Test that a two-word first name matches when OCR splits it."""
+        assert lookup.find_pharmacy("Anna Maria Müller", "01.02.1930") == "APO_BAEREN"
+    
+    def test_reversed_name_order(self, lookup):
+        """Test that "Nachname Vorname" order matches."""
+        assert lookup.find_pharmacy("Schmidt Hans", "05.05.1940") == "APO_FELDTOR"
+    
+    def test_case_and_whitespace_insensitive(self, lookup):
+        """Test that case and extra whitespace are ignored."""
+        assert lookup.find_pharmacy("HANS  schmidt", "05.05.1940") == "APO_FELDTOR"
+    
+    def test_unknown_name_not_matched_by_date(self, lookup):
+        """Test that an unknown name with a unique birth date is not matched by default."""
+        assert lookup.find_pharmacy("Unbekannt Name", "01.02.1930") is None
+    
+    def test_unique_birth_date_fallback(self, lookup, monkeypatch):
+        """Test that the enabled fallback matches the only patient with that date."""
+        monkeypatch.setattr(csv_lookup, "BIRTH_DATE_FALLBACK_ENABLED", True)
+        assert lookup.find_pharmacy("Unbekannt Name", "01.02.1930") == "APO_BAEREN"
+    
+    def test_ambiguous_birth_date(self, lookup, monkeypatch):
+        """Test that a shared birth date is not used as fallback."""
+        monkeypatch.setattr(csv_lookup, "BIRTH_DATE_FALLBACK_ENABLED", True)
+        assert lookup.find_pharmacy("Unbekannt Name", "05.05.1940") is None
+    
+    def test_fuzzy_eszett(self, lookup):
+        """Test that an OCR'd "Grofmann" is matched among same-date patients."""
+        assert lookup.find_pharmacy("Elisabeth Grofmann", "16.08.1946") == "APO_BURG_BOVENDEN"
+    
+    def test_fuzzy_umlaut(self, lookup):
+        """Test that an OCR'd "Pfohler" is matched among same-date patients."""
+        assert lookup.find_pharmacy("Astrid Pfohler", "16.08.1946") == "APO_MUEHLEN"
+    
+    def test_fuzzy_requires_birth_date(self, lookup):
+        """Test that fuzzy matching does not cross birth dates."""
+        assert lookup.find_pharmacy("Astrid Pfohler", "05.05.1940") is None
+
+
+class TestHotReload:
+    """Tests for reloading changed CSV files."""
+    
+    @pytest.fixture
+    def paths(self, tmp_path):
+        """Write a one-patient CSV and an empty KIM CSV."""
+        write_patient_csv(tmp_path / "patients.csv", [
+            ("Hartje", "Reinhold", "14.12.1936", "APO_BAEREN"),
+        ])
+        (tmp_path / "kim.csv").write_text("KIM_APO;KIM_ADDR;APO_NAME\n", encoding="utf-8")
+        return tmp_path / "patients.csv", tmp_path / "kim.csv"
+    
+    def test_unchanged_files_not_reloaded(self, paths):
+        """Test that nothing is rebuilt without a change."""
+        lookup = PatientPharmacyLookup(*paths, None)
+        lookup.load_csv_data()
+        
+        assert lookup.reload_if_changed() is False
+    
+    def test_touched_file_not_reloaded(self, paths):
+        """Test that a new mtime with identical content does not rebuild."""
+        lookup = PatientPharmacyLookup(*paths, None)
+        lookup.load_csv_data()
+        stat = paths[0].stat()
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        
+        assert lookup.reload_if_changed() is False
+    
+    def test_changed_file_swaps_index(self, paths):
+        """Test that a changed CSV is picked up by lookups."""
+        lookup = PatientPharmacyLookup(*paths, None)
+        lookup.load_csv_data()
+        old_index = lookup._index
+        write_patient_csv(paths[0], [
+            ("Hartje", "Reinhold", "14.12.1936", "APO_FELDTOR"),
+            ("Heilmann", "Harry", "29.04.1949", "APO_FELDTOR"),
+        ])
+        
+        assert lookup.reload_if_changed() is True
+        assert lookup._index is not old_index
+        assert lookup.patient_count == 2
+        assert lookup.find_pharmacy("Reinhold Hartje", "14.12.1936") == "APO_FELDTOR"
+    
+    def test_failed_reload_keeps_index(self, paths):
+        """Test that a missing CSV does not replace the loaded data."""
+        lookup = PatientPharmacyLookup(*paths, None)
+        lookup.load_csv_data()
+        paths[1].write_text("KIM_APO;KIM_ADDR;APO_NAME\nAPO_BAEREN;a@kim.de;Bären\n", encoding="utf-8")
+        paths[0].unlink()
+        
+        assert lookup.reload_if_changed() is False
+        assert lookup.find_pharmacy("Reinhold Hartje", "14.12.1936") == "APO_BAEREN"
+
+
+class TestPatientSnapshot:
+    """Tests for the compiled snapshot of the patient CSV."""
+    
+    @pytest.fixture
+    def paths(self, tmp_path):
+        """Write a patient CSV and an empty KIM CSV; return them with a snapshot path."""
+        write_patient_csv(tmp_path / "patients.csv", [
+            ("Müller", "Anna Maria", "01.02.1930", "Tel: 123, APO_BAEREN"),
+            ("Schmidt", "Hans", "05.05.1940", "APO_FELDTOR (Feldtor)"),
+            ("Schulz", "Erika", "05.05.1940", "APO_MUEHLEN"),
+        ])
+        (tmp_path / "kim.csv").write_text("KIM_APO;KIM_ADDR;APO_NAME\n", encoding="utf-8")
+        return tmp_path / "patients.csv", tmp_path / "kim.csv", tmp_path / "patients.snapshot"
+    
+    def load(self, paths):
+        """Create and load a lookup using the snapshot."""
+        lookup = PatientPharmacyLookup(*paths)
+        assert lookup.load_csv_data() is True
+        return lookup
+    
+    def test_snapshot_matches_csv(self, paths, capsys):
+        """Test that a lookup loaded from the snapshot has the same indexes."""
+        parsed = self.load(paths)
+        assert paths[2].exists()
+        capsys.readouterr()
+        
+        loaded = self.load(paths)
+        
+        assert "(snapshot)" in capsys.readouterr().out
+        assert loaded._index.name_index == parsed._index.name_index
+        assert loaded._index.date_index == parsed._index.date_index
+        assert loaded._index.signatures == parsed._index.signatures
+        assert loaded.find_pharmacy("Anna Maria Müller", "01.02.1930") == "APO_BAEREN"
+        assert loaded.find_pharmacy("Schulz Erika", "05.05.1940") == "APO_MUEHLEN"
+    
+    def test_changed_csv_invalidates_snapshot(self, paths, capsys):
+        """Test that a changed CSV is parsed again."""
+        self.load(paths)
+        write_patient_csv(paths[0], [("Schmidt", "Hans", "05.05.1940", "APO_BAEREN")])
+        capsys.readouterr()
+        
+        lookup = self.load(paths)
+        
+        assert "(snapshot)" not in capsys.readouterr().out
+        assert lookup.patient_count == 1
+        assert lookup.find_pharmacy("Hans Schmidt", "05.05.1940") == "APO_BAEREN"
+    
+    def test_touched_csv_keeps_snapshot(self, paths, capsys):
+        """Test that a new mtime with identical content still uses the snapshot."""
+        self.load(paths)
+        stat = paths[0].stat()
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        capsys.readouterr()
+        
+        lookup = self.load(paths)
+        
+        assert "(snapshot)" in capsys.readouterr().out
+        assert lookup._index.signatures[paths[0]][0] == stat.st_mtime_ns + 10**9
+    
+    def test_touched_csv_hashed_once(self, paths, capsys, monkeypatch):
+        """Test that the snapshot takes the new mtime, so the next start does not hash the CSV."""
+        self.load(paths)
+        stat = paths[0].stat()
+        os.utime(paths[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.load(paths)
+        
+        def no_hashing(path):
+            raise AssertionError("CSV hashed again")
+        
+        monkeypatch.setattr(patient_snapshot, "file_sha256", no_hashing)
+        capsys.readouterr()
+        lookup = self.load(paths)
+        
+        assert "(snapshot)" in capsys.readouterr().out
+        assert lookup.find_pharmacy("Schulz Erika", "05.05.1940") == "APO_MUEHLEN"
+    
+    @pytest.mark.parametrize("setting, value", [
+        ("CSV_COLUMNS", {"last_name": 4, "first_name": 2, "birth_date": 5, "apo_key": 34}),
+        ("PARSER_VERSION", 0),
+    ])
+    def test_changed_layout_invalidates_snapshot(self, paths, capsys, monkeypatch, setting, value):
+        """Test that a snapshot built with other columns or another parser is not used."""
+        self.load(paths)
+        monkeypatch.setattr(csv_lookup, setting, value)
+        capsys.readouterr()
+        
+        self.load(paths)
+        
+        assert "(snapshot)" not in capsys.readouterr().out
+    
+    def test_corrupt_snapshot_falls_back_to_csv(self, paths):
+        """Test that an unreadable snapshot is ignored."""
+        self.load(paths)
+        paths[2].write_bytes(paths[2].read_bytes()[:40])
+        
+        lookup = self.load(paths)
+        
+        assert lookup.patient_count == 3
+        assert lookup.find_pharmacy("Hans Schmidt", "05.05.1940") == "APO_FELDTOR"
+
+
+class TestStreamingLoader:
+    """Tests for encoding detection and record splitting of the patient CSV."""
+    
+    def write_csv(self, path, rows, encoding, line_end="\r\n"):
+        """Write rows in the export layout in the given encoding."""
+        lines = [";".join(f"Spalte{i}" for i in range(45))]
+        for last_name, first_name, birth_date, sozialanamnese in rows:
+            row = [""] * 45
+            row[2], row[4], row[5], row[34] = last_name, first_name, birth_date, sozialanamnese
+            lines.append(";".join(row))
+        path.write_bytes(line_end.join(lines).encode(encoding) + line_end.encode())
+    
+    def load(self, tmp_path):
+        """Load the patient CSV without snapshot."""
+        (tmp_path / "kim.csv").write_text("KIM_APO;KIM_ADDR;APO_NAME\n", encoding="utf-8")
+        lookup = PatientPharmacyLookup(tmp_path / "patients.csv", tmp_path / "kim.csv", None)
+        assert lookup.load_csv_data() is True
+        return lookup
+    
+    @pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "cp1252"])
+    def test_encodings(self, tmp_path, capsys, encoding):
+        """Test that UTF-8, UTF-8 with BOM and cp1252 exports load the same."""
+        self.write_csv(tmp_path / "patients.csv", [
+            ("Hartje", "Reinhold", "14.12.1936", "APO_BAEREN"),
+            ("Pföhler", "Astrid", "27.03.1939", "Mühlen-Apotheke, APO_MUEHLEN"),
+            ("Großmann", "Elisabeth", "16.08.1946", "APO_BURG_BOVENDEN"),
+        ], encoding)
+        
+        lookup = self.load(tmp_path)
+        
+        assert lookup.find_pharmacy("Astrid Pföhler", "27.03.1939") == "APO_MUEHLEN"
+        assert lookup.find_pharmacy("Elisabeth Großmann", "16.08.1946") == "APO_BURG_BOVENDEN"
+        assert f"{encoding})" in capsys.readouterr().out
+    
+    def test_cp1252_after_ascii_lines(self, tmp_path):
+        """Test that the switch to cp1252 happens at the first non-UTF-8 line."""
+        path = tmp_path / "lines.txt"
+        path.write_bytes("Hartje\nPföhler\nGroßmann\n".encode("cp1252"))
+        
+        with open(path, "rb") as f:
+            lines = DecodedLines(f)
+            assert list(lines) == ["Hartje\n", "Pföhler\n", "Großmann\n"]
+        assert lines.encoding == "cp1252"
+        assert lines.count == 3
+    
+    def test_quoted_field_spanning_lines(self, tmp_path):
+        """Test that a quoted multi-line Sozialanamnese is read as one record."""
+        header = ";".join(f"Spalte{i}" for i in range(45))
+        row = [""] * 45
+        row[2], row[4], row[5] = "Hartje", "Reinhold", "14.12.1936"
+        row[34] = '"Heim; Zi. 12\nApotheke: APO_BAEREN"'
+        (tmp_path / "patients.csv").write_text(header + "\n" + ";".join(row) + "\n", encoding="utf-8")
+        
+        lookup = self.load(tmp_path)
+        
+        assert lookup.find_pharmacy("Reinhold Hartje", "14.12.1936") == "APO_BAEREN"
+    
+    def test_stray_quote_in_free_text(self, tmp_path):
+        """Test that a quote inside an unquoted field does not swallow later rows."""
+        self.write_csv(tmp_path / "patients.csv", [
+            ("Hartje", "Reinhold", "14.12.1936", 'Verband 5" APO_BAEREN'),
+            ("Pföhler", "Astrid", "27.03.1939", "APO_MUEHLEN"),
+            ("Großmann", "Elisabeth", "16.08.1946", "APO_BURG_BOVENDEN"),
+        ], "utf-8")
+    
+        lookup = self.load(tmp_path)
+    
+        assert lookup.patient_count == 3
+        assert lookup.find_pharmacy("Reinhold Hartje", "14.12.1936") == "APO_BAEREN"
+        assert lookup.find_pharmacy("Elisabeth Großmann", "16.08.1946") == "APO_BURG_BOVENDEN"
+    
+    def test_records_match_csv_reader(self):
+        """Test that stray, escaped and multi-line quotes split like csv.reader."""
+        text = 'a;b;c\n1;5" Verband;x\n2;"zwei\nZeilen";y\n3;"sagt ""hallo""";z\n4;x"y;"a;b"\n'
+        # Even number of quotes, but the quoted field spans two lines
+        text += '5;5" Verband;"zeile eins\nzeile zwei";APO_X\n'
+    
+        records = list(iter_records(text.splitlines(keepends=True), ";"))
+    
+        assert records == list(csv.reader(io.StringIO(text), delimiter=";"))
+    
+    def test_prefilter_skips_rows_without_apo(self):
+        """Test that only the header and rows containing the marker are split."""
+        lines = ["a;b;c\n", "x;y;z\n", "1;APO_X;3;4;5\n"]
+        
+        records = list(iter_records(lines, ";", max_column=1, contains="APO_"))
+        
+        assert records == [["a", "b", "c"], ["1", "APO_X", "3;4;5"]]
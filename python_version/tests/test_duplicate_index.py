@@ -0,0 +1,75 @@
+"""
+Tests for duplicate index module.
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from main import new_results, skip_duplicates
+from src.duplicate_index import DuplicateIndex
+from src.hashing import file_sha256
+
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+
+
+class TestDuplicateIndex:
+    """Tests for DuplicateIndex class."""
+    
+    def test_add_and_contains(self, tmp_path):
+        """Test that added hashes are found."""
+        index = DuplicateIndex(tmp_path / "state" / "hashes.txt")
+        index.load()
+        index.add(HASH_A)
+        
+        assert HASH_A in index
+        assert HASH_B not in index
+        assert None not in index
+    
+    def test_persists_across_loads(self, tmp_path):
+        """Test that hashes are reloaded from the append-only file."""
+        index_file = tmp_path / "hashes.txt"
+        index = DuplicateIndex(index_file)
+        index.add(HASH_A)
+        index.add(HASH_B)
+        index.add(HASH_A)
+        
+        reloaded = DuplicateIndex(index_file)
+        assert reloaded.load() == 2
+        assert HASH_A in reloaded and HASH_B in reloaded
+        assert len(index_file.read_text().splitlines()) == 2
+    
+    def test_ignores_partial_line(self, tmp_path):
+        """Test that a truncated last line (crash while writing) is ignored."""
+        index_file = tmp_path / "hashes.txt"
+        index_file.write_text(HASH_A + "\n" + HASH_B[:20])
+        
+        index = DuplicateIndex(index_file)
+        assert index.load() == 1
+        assert HASH_A in index
+
+
+class TestSkipDuplicates:
+    """Tests for the duplicate check before OCR."""
+    
+    def test_skips_processed_and_repeated_files(self, tmp_path):
+        """Test that known and repeated content is skipped before analysis."""
+        first = tmp_path / "first.pdf"
+        copy = tmp_path / "copy.pdf"
+        known = tmp_path / "known.pdf"
+        first.write_bytes(b"%PDF-1.4 first")
+        copy.write_bytes(b"%PDF-1.4 first")
+        known.write_bytes(b"%PDF-1.4 known")
+        
+        index = DuplicateIndex(tmp_path / "hashes.txt")
+        index.add(file_sha256(known))
+        results = new_results()
+        
+        remaining, hashes = skip_duplicates([first, copy, known], index, results)
+        
+        assert remaining == [first]
+        assert hashes == [file_sha256(first)]
+        assert results["duplicate"] == 2
+        assert known.exists() and copy.exists()
@@ -0,0 +1,166 @@
+"""
+Tests for file router module.
+"""
+import io
+import shutil
+import pytest
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.file_router import RoutingManifest, get_routing_summary, route_pdf, split_pdf
+
+
+class TestRoutePdf:
+    """Tests for route_pdf function."""
+    
+    @pytest.fixture
+    def pdf_path(self, tmp_path):
+        """Create a PDF in a temporary input folder."""
+        input_folder = tmp_path / "input"
+        input_folder.mkdir()
+        path = input_folder / "rezept.pdf"
+        path.write_bytes(b"%PDF-1.4 rezept")
+        return path
+    
+    def test_move_drains_input(self, pdf_path, tmp_path):
+        """Test that move mode removes the PDF from the input folder."""
+        dest = route_pdf(pdf_path, "APO_BAEREN", output_folder=tmp_path / "output", mode="move")
+        
+        assert dest == tmp_path / "output" / "APO_BAEREN" / "rezept.pdf"
+        assert dest.read_bytes() == b"%PDF-1.4 rezept"
+        assert not pdf_path.exists()
+    
+    def test_unklar_without_pharmacy(self, pdf_path, tmp_path):
+        """Test that PDFs without pharmacy go to 'unklar'."""
+        dest = route_pdf(pdf_path, None, output_folder=tmp_path / "output", mode="move")
+        
+        assert dest.parent.name == "unklar"
+    
+    def test_copy_keeps_original(self, pdf_path, tmp_path):
+        """Test that copy mode leaves the input file in place."""
+        dest = route_pdf(pdf_path, "APO_BAEREN", output_folder=tmp_path / "output", mode="copy")
+        
+        assert dest.read_bytes() == pdf_path.read_bytes()
+        assert pdf_path.exists()
+    
+    def test_link_shares_file(self, pdf_path, tmp_path):
+        """Test that link mode creates a hard link instead of a copy."""
+        dest = route_pdf(pdf_path, "APO_BAEREN", output_folder=tmp_path / "output", mode="link")
+        
+        assert pdf_path.exists()
+        assert dest.stat().st_ino == pdf_path.stat().st_ino
+    
+    @pytest.mark.parametrize("mode", ["move", "link", "copy"])
+    def test_name_collision(self, pdf_path, tmp_path, mode):
+        """Test that an existing file with the same name is not overwritten."""
+        existing = tmp_path / "output" / "APO_BAEREN" / "rezept.pdf"
+        existing.parent.mkdir(parents=True)
+        existing.write_bytes(b"%PDF-1.4 older")
+        
+        dest = route_pdf(pdf_path, "APO_BAEREN", output_folder=tmp_path / "output", mode=mode)
+        
+        assert dest.name == "rezept_1.pdf"
+        assert dest.read_bytes() == b"%PDF-1.4 rezept"
+        assert existing.read_bytes() == b"%PDF-1.4 older"
+
+
+class TestRoutingManifest:
+    """Tests for the routing manifest and get_routing_summary."""
+    
+    @staticmethod
+    def make_pdf(folder, name):
+        """Create a small PDF file in folder."""
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / name
+        path.write_bytes(b"%PDF-1.4 " + name.encode())
+        return path
+    
+    def test_route_updates_summary(self, tmp_path):
+        """Test that every routed file is counted."""
+        output = tmp_path / "output"
+        for name in ["a.pdf", "b.pdf", "c.pdf"]:
+            route_pdf(self.make_pdf(tmp_path / "input", name), "APO_BAEREN", output_folder=output)
+        route_pdf(self.make_pdf(tmp_path / "input", "d.pdf"), None, output_folder=output)
+        
+        assert get_routing_summary(output) == {"APO_BAEREN": 3, "unklar": 1}
+        assert (output / ".routing_manifest.json").exists()
+    
+    def test_summary_does_not_list_folders(self, tmp_path):
+        """Test that the summary comes from the manifest, not the disk."""
+        output = tmp_path / "output"
+        route_pdf(self.make_pdf(tmp_path / "input", "a.pdf"), "APO_BAEREN", output_folder=output)
+        self.make_pdf(output / "APO_BAEREN", "manual.pdf")
+        
+        assert get_routing_summary(output) == {"APO_BAEREN": 1}
+    
+    def test_existing_archive_is_counted(self, tmp_path):
+        """Test that a missing manifest is rebuilt from the files on disk."""
+        output = tmp_path / "output"
+        self.make_pdf(output / "APO_BAEREN", "old1.pdf")
+        self.make_pdf(output / "APO_BAEREN", "old2.pdf")
+        
+        route_pdf(self.make_pdf(tmp_path / "input", "new.pdf"), "APO_BAEREN", output_folder=output)
+        
+        assert get_routing_summary(output) == {"APO_BAEREN": 3}
+    
+    def test_verify_and_rebuild(self, tmp_path):
+        """Test that verify() reports drift and rebuild() fixes it."""
+        output = tmp_path / "output"
+        route_pdf(self.make_pdf(tmp_path / "input", "a.pdf"), "APO_BAEREN", output_folder=output)
+        route_pdf(self.make_pdf(tmp_path / "input", "b.pdf"), "APO_BAEREN", output_folder=output)
+        (output / "APO_BAEREN" / "a.pdf").unlink()
+        self.make_pdf(output / "unklar", "manual.pdf")
+        
+        manifest = RoutingManifest(output)
+        assert manifest.verify() == {"APO_BAEREN": (2, 1), "unklar": (0, 1)}
+        
+        manifest.rebuild()
+        assert manifest.verify() == {}
+        assert get_routing_summary(output) == {"APO_BAEREN": 1, "unklar": 1}
+    
+    def test_corrupt_manifest_is_rebuilt(self, tmp_path):
+        """Test that an unreadable manifest is recounted from the disk."""
+        output = tmp_path / "output"
+        self.make_pdf(output / "APO_BAEREN", "a.pdf")
+        (output / ".routing_manifest.json").write_text("{not json")
+        
+        assert get_routing_summary(output) == {"APO_BAEREN": 1}
+
+
+@pytest.mark.skipif(
+    not (shutil.which("pdfseparate") and shutil.which("pdfunite") and shutil.which("pdfinfo")),
+    reason="poppler not installed",
+)
+class TestSplitPdf:
+    """Tests for split_pdf (needs poppler)."""
+    
+    def test_split_into_page_groups(self, tmp_path):
+        """Test that every page group becomes its own PDF."""
+        from PIL import Image
+        
+        from src.pdf_processor import get_page_count
+        
+        pages = [Image.new("L", (200, 280), shade) for shade in (0, 80, 160)]
+        out = io.BytesIO()
+        pages[0].save(out, format="PDF", save_all=True, append_images=pages[1:])
+        pdf_path = tmp_path / "sammel.pdf"
+        pdf_path.write_bytes(out.getvalue())
+        
+        parts = split_pdf(pdf_path, [[1, 2], [3]], tmp_path / "split")
+        
+        assert [part.name for part in parts] == ["sammel_p1-2.pdf", "sammel_p3.pdf"]
+        assert [get_page_count(part) for part in parts] == [2, 1]
+        assert pdf_path.exists()
+    
+    def test_failure_removes_parts(self, tmp_path):
+        """Test that a failed split leaves no parts behind."""
+        pdf_path = tmp_path / "kaputt.pdf"
+        pdf_path.write_bytes(b"not a pdf")
+        
+        with pytest.raises(Exception):
+            split_pdf(pdf_path, [[1]], tmp_path / "split")
+        
+        assert list((tmp_path / "split").glob("*.pdf")) == []
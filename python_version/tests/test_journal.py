@@ -0,0 +1,294 @@
+"""
+Tests for the batch journal and resuming an interrupted batch.
+"""
+import functools
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+from main import handle_analysis, new_results, process_batch, requeue_unsent, send_queued
+from src.file_router import find_routed
+from src.hashing import file_sha256
+from src.journal import BatchJournal, STAGE_ANALYZED, STAGE_CLAIMED, STAGE_ROUTED, STAGE_ROUTING, STAGE_SENT
+
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+HASH_C = "c" * 64
+HASH_D = "d" * 64
+
+ANALYSIS = {
+    "text_ok": True,
+    "patient_info": {"name": "Harry Heilmann", "full_name": "Harry Heilmann", "birth_date": "29.04.1949"},
+    "source": "text_layer",
+    "pages": 1,
+    "groups": None,
+    "cache_hits": 1,
+    "cache_misses": 0,
+    "timings": {"text_layer": {"wall": 0.1, "cpu": 0.1}},
+    "error": None,
+}
+
+
+class FakeLookup:
+    """Patient lookup that knows one patient with a KIM address."""
+
+    def find_pharmacy(self, name, birth_date):
+        return "APO_FELDTOR" if name == "Harry Heilmann" else None
+
+    def get_kim_address(self, apo_key):
+        return {"kim_address": "feldtor@kim.test"}
+
+
+class FakeSender:
+    """Collects queued PDFs like KIMSender and reports them all as sent."""
+
+    def __init__(self):
+        self.queued = []
+
+    @property
+    def pending(self):
+        return len(self.queued)
+
+    def add(self, pdf_path, apo_key, kim_address, patient_name, key=None):
+        self.queued.append((pdf_path, key))
+
+    def flush(self):
+        batch, self.queued = self.queued, []
+        done = [key for _, key in batch if key]
+        return {"sent": len(batch), "failed": 0, "messages": 1, "done": done}
+
+
+class TestBatchJournal:
+    """Tests for BatchJournal class."""
+
+    def test_records_survive_reload(self, tmp_path):
+        """Test that the last stage and the data of each PDF are reloaded."""
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=1)
+        journal.record(HASH_A, STAGE_CLAIMED, file="a.pdf")
+        journal.record(HASH_A, STAGE_ANALYZED, analysis=ANALYSIS)
+        journal.record(HASH_B, STAGE_CLAIMED, file="b.pdf")
+
+        reloaded = BatchJournal(journal_file)
+        assert reloaded.load() == 2
+        assert reloaded.stage(HASH_A) == STAGE_ANALYZED
+        assert reloaded.stage(HASH_B) == STAGE_CLAIMED
+        assert reloaded.analysis(HASH_B) is None
+        # Timings of the original run are not replayed
+        analysis = reloaded.analysis(HASH_A)
+        assert analysis["patient_info"] == ANALYSIS["patient_info"]
+        assert analysis["timings"] == {}
+        assert analysis["cache_hits"] == 0
+
+    def test_writes_in_batches(self, tmp_path):
+        """Test that records are buffered until the batch is full."""
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=3, flush_interval=0)
+        journal.record(HASH_A, STAGE_CLAIMED)
+        journal.record(HASH_B, STAGE_CLAIMED)
+
+        assert not journal_file.exists()
+        journal.record(HASH_A, STAGE_ANALYZED, analysis=ANALYSIS)
+        assert len(journal_file.read_text().splitlines()) == 3
+
+        journal.record(HASH_B, STAGE_ANALYZED, analysis=ANALYSIS)
+        journal.flush()
+        assert len(journal_file.read_text().splitlines()) == 4
+
+    def test_ignores_partial_line(self, tmp_path):
+        """Test that a line cut off by a crash is ignored."""
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=1)
+        journal.record(HASH_A, STAGE_ROUTED, dest="x.pdf")
+        with open(journal_file, "a", encoding="utf-8") as f:
+            f.write('{"hash": "' + HASH_B + '", "stage": "rou')
+
+        reloaded = BatchJournal(journal_file)
+        assert reloaded.load() == 1
+        assert reloaded.is_routed(HASH_A)
+        assert reloaded.stage(HASH_B) is None
+
+    def test_compact_keeps_unfinished(self, tmp_path):
+        """Test that compacting leaves one line per unfinished PDF without analyses of routed PDFs."""
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=100)
+        journal.record(HASH_A, STAGE_CLAIMED)
+        journal.record(HASH_A, STAGE_ANALYZED, analysis=ANALYSIS)
+        journal.record(HASH_A, STAGE_ROUTED, dest="x.pdf", kim_address="feldtor@kim.test", apo_key="APO_FELDTOR")
+        journal.record(HASH_B, STAGE_ANALYZED, analysis=ANALYSIS)
+        # Finished: routed to 'unklar', and routed + sent
+        journal.record(HASH_C, STAGE_ROUTED, dest="unklar/c.pdf", status="UNKLAR", kim_address=None)
+        journal.record(HASH_D, STAGE_ROUTED, dest="d.pdf", kim_address="feldtor@kim.test")
+        journal.record(HASH_D, STAGE_SENT)
+        journal.close()
+
+        lines = journal_file.read_text().splitlines()
+        assert len(lines) == 2
+        reloaded = BatchJournal(journal_file)
+        assert reloaded.load() == 2
+        assert [entry["hash"] for entry in reloaded.unsent()] == [HASH_A]
+        assert "analysis" not in reloaded.unsent()[0]
+        assert reloaded.analysis(HASH_B) is not None
+        assert reloaded.stage(HASH_C) is None
+        assert reloaded.stage(HASH_D) is None
+
+    def test_compacts_when_large(self, tmp_path):
+        """Test that the journal is compacted while it runs once it has grown."""
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=1, compact_records=10)
+        for i in range(30):
+            file_hash = f"{i:064x}"
+            journal.record(file_hash, STAGE_CLAIMED)
+            journal.record(file_hash, STAGE_ROUTED, dest=f"unklar/{i}.pdf")
+        journal.record(HASH_A, STAGE_CLAIMED)
+
+        assert len(journal_file.read_text().splitlines()) < 10
+        assert len(journal) < 10
+        assert journal.stage(HASH_A) == STAGE_CLAIMED
+
+
+class TestResume:
+    """Tests for resuming an interrupted batch in main.py."""
+
+    def make_pdf(self, folder, name, content):
+        """Create a small PDF in folder/input."""
+        path = folder / "input" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(content)
+        return path
+
+    def test_routed_pdfs_skipped(self, tmp_path, monkeypatch):
+        """Test that a PDF the journal has as routed is not processed again."""
+        done = self.make_pdf(tmp_path, "done.pdf", b"%PDF-1.4 done")
+        new = self.make_pdf(tmp_path, "new.pdf", b"%PDF-1.4 new")
+        journal = BatchJournal(tmp_path / "journal.jsonl")
+        journal.record(file_sha256(done), STAGE_ROUTED, dest=str(tmp_path / "out" / "done.pdf"))
+        analyzed = []
+
+        def fake_analyze(pdf_path, file_hash=None):
+            analyzed.append(pdf_path.name)
+            return dict(ANALYSIS)
+
+        monkeypatch.setattr(main, "analyze_pdf", fake_analyze)
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: tmp_path / "out" / path.name)
+        results = new_results()
+
+        process_batch([done, new], FakeLookup(), results, journal=journal)
+
+        assert analyzed == ["new.pdf"]
+        assert results["resumed"] == 1
+        assert results["success"] == 1
+        assert journal.is_routed(file_sha256(new))
+
+    def test_unklar_pdf_moved_back_processed(self, tmp_path, monkeypatch):
+        """Test that a PDF routed to 'unklar' and put back into input is processed by the next run."""
+        pdf_path = self.make_pdf(tmp_path, "rezept.pdf", b"%PDF-1.4 rezept")
+        unknown = dict(ANALYSIS, patient_info={"name": "Unbekannt", "full_name": "Unbekannt", "birth_date": "01.01.1950"})
+        monkeypatch.setattr(main, "analyze_pdf", lambda pdf_path, file_hash=None: dict(unknown))
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: tmp_path / (apo_key or "unklar") / path.name)
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file)
+        results = new_results()
+        process_batch([pdf_path], FakeLookup(), results, journal=journal)
+        journal.close()
+        assert results["no_pharmacy"] == 1
+
+        # Patient added to the CSV, PDF moved back from 'unklar'
+        monkeypatch.setattr(main, "analyze_pdf", lambda pdf_path, file_hash=None: dict(ANALYSIS))
+        restarted = BatchJournal(journal_file)
+        restarted.load()
+        results = new_results()
+        process_batch([pdf_path], FakeLookup(), results, journal=restarted)
+
+        assert results["resumed"] == 0
+        assert results["success"] == 1
+
+    def test_stored_analysis_reused(self, tmp_path, monkeypatch):
+        """Test that a PDF analysed before the crash is routed without OCR."""
+        pdf_path = self.make_pdf(tmp_path, "rezept.pdf", b"%PDF-1.4 rezept")
+        journal = BatchJournal(tmp_path / "journal.jsonl")
+        journal.record(file_sha256(pdf_path), STAGE_ANALYZED, analysis=ANALYSIS)
+
+        def failing_analyze(pdf_path, file_hash=None):
+            raise AssertionError("analyze_pdf called")
+
+        monkeypatch.setattr(main, "analyze_pdf", failing_analyze)
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: tmp_path / apo_key / path.name)
+        sender = FakeSender()
+        results = new_results()
+
+        process_batch([pdf_path], FakeLookup(), results, sender=sender, journal=journal)
+
+        assert results["success"] == 1
+        assert results["kim_sent"] == 1
+        assert journal.stage(file_sha256(pdf_path)) == STAGE_SENT
+
+    def test_unsent_pdfs_requeued(self, tmp_path):
+        """Test that routed but unsent PDFs are sent by the next run."""
+        routed = tmp_path / "APO_FELDTOR" / "rezept.pdf"
+        routed.parent.mkdir()
+        routed.write_bytes(b"%PDF-1.4 rezept")
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=1)
+        journal.record(
+            HASH_A, STAGE_ROUTED, dest=str(routed), apo_key="APO_FELDTOR",
+            kim_address="feldtor@kim.test", patient="Harry Heilmann",
+        )
+        journal.record(
+            HASH_B, STAGE_ROUTED, dest=str(tmp_path / "gone.pdf"), apo_key="APO_FELDTOR",
+            kim_address="feldtor@kim.test", patient="Astrid Pföhler",
+        )
+
+        restarted = BatchJournal(journal_file)
+        restarted.load()
+        sender = FakeSender()
+
+        assert requeue_unsent(restarted, sender) == 1
+        send_queued(sender, new_results(), journal=restarted)
+
+        assert restarted.unsent() == []
+        reloaded = BatchJournal(journal_file)
+        reloaded.load()
+        assert reloaded.stage(HASH_A) == STAGE_SENT
+
+    @pytest.mark.parametrize("moved", [True, False])
+    def test_crash_while_routing(self, tmp_path, monkeypatch, moved):
+        """Test that a PDF with a KIM address is re-sent or re-processed after dying in route_pdf()."""
+        pdf_path = self.make_pdf(tmp_path, "rezept.pdf", b"%PDF-1.4 rezept")
+        file_hash = file_sha256(pdf_path)
+        output_folder = tmp_path / "output"
+
+        def crashing_route(path, apo_key, *args):
+            if moved:
+                dest = output_folder / apo_key / path.name
+                dest.parent.mkdir(parents=True)
+                path.rename(dest)
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr(main, "route_pdf", crashing_route)
+        monkeypatch.setattr(main, "find_routed", functools.partial(find_routed, output_folder=output_folder))
+        monkeypatch.setattr(main, "INPUT_FOLDER", pdf_path.parent)
+        journal_file = tmp_path / "journal.jsonl"
+        journal = BatchJournal(journal_file, batch_size=100)
+        journal.record(file_hash, STAGE_ANALYZED, analysis=ANALYSIS)
+        with pytest.raises(KeyboardInterrupt):
+            handle_analysis(pdf_path, dict(ANALYSIS), FakeLookup(), new_results(), file_hash,
+                            sender=FakeSender(), journal=journal)
+
+        restarted = BatchJournal(journal_file)
+        restarted.load()
+        assert restarted.stage(file_hash) == STAGE_ROUTING
+        sender = FakeSender()
+
+        if moved:
+            assert requeue_unsent(restarted, sender) == 1
+            assert sender.queued == [(output_folder / "APO_FELDTOR" / "rezept.pdf", file_hash)]
+            assert restarted.unsent()[0]["dest"] == str(output_folder / "APO_FELDTOR" / "rezept.pdf")
+        else:
+            assert requeue_unsent(restarted, sender) == 0
+            assert restarted.analysis(file_hash) is not None
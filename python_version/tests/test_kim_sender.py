@@ -0,0 +1,179 @@
+"""
+Tests for KIM sender module.
+"""
+import email
+import email.policy
+import socketserver
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.kim_sender import KIMSender
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost stand-in SMTP")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                for data_line in iter(self.rfile.readline, b".\r\n"):
+                    data += data_line
+                if server.temporary_failures > 0:
+                    server.temporary_failures -= 1
+                    self.reply("451 Try again later")
+                else:
+                    server.messages.append(email.message_from_bytes(data, policy=email.policy.default))
+                    self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp_server():
+    """Run a stand-in SMTP server on a free local port."""
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.temporary_failures = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_sender(server, **kwargs):
+    """Create a sender for the stand-in server (no TLS, no login, no delay)."""
+    options = {
+        "host": "127.0.0.1",
+        "port": server.server_address[1],
+        "use_ssl": False,
+        "username": None,
+        "retry_delay": 0,
+        "dry_run": False,
+    }
+    options.update(kwargs)
+    return KIMSender(**options)
+
+
+def make_pdfs(folder, count):
+    """Create small PDF files."""
+    paths = []
+    for i in range(count):
+        path = folder / f"rezept_{i}.pdf"
+        path.write_bytes(b"%PDF-1.4 rezept " + str(i).encode())
+        paths.append(path)
+    return paths
+
+
+class TestKIMSender:
+    """Tests for KIMSender class."""
+
+    def test_groups_per_pharmacy_on_one_connection(self, smtp_server, tmp_path):
+        """Test that PDFs are batched per pharmacy over a single connection."""
+        pdfs = make_pdfs(tmp_path, 5)
+
+        with make_sender(smtp_server, attachments_per_message=2) as sender:
+            for pdf in pdfs[:3]:
+                sender.add(pdf, "APO_BAEREN", "baeren@kim.test", "Harry Heilmann")
+            for pdf in pdfs[3:]:
+                sender.add(pdf, "APO_FELDTOR", "feldtor@kim.test", "Astrid Pföhler")
+            stats = sender.flush()
+
+        assert stats == {"sent": 5, "failed": 0, "messages": 3, "done": []}
+        assert smtp_server.connections == 1
+
+        recipients = [message["To"] for message in smtp_server.messages]
+        assert recipients == ["baeren@kim.test", "baeren@kim.test", "feldtor@kim.test"]
+
+        attachments = [
+            part.get_filename()
+            for message in smtp_server.messages
+            for part in message.iter_attachments()
+        ]
+        assert attachments == [pdf.name for pdf in pdfs]
+
+    def test_connection_reused_across_flushes(self, smtp_server, tmp_path):
+        """Test that a later batch reuses the open connection."""
+        pdfs = make_pdfs(tmp_path, 2)
+
+        with make_sender(smtp_server) as sender:
+            sender.add(pdfs[0], "APO_BAEREN", "baeren@kim.test", "Harry Heilmann")
+            sender.flush()
+            sender.add(pdfs[1], "APO_BAEREN", "baeren@kim.test", "Reinhold Hartje")
+            sender.flush()
+
+        assert len(smtp_server.messages) == 2
+        assert smtp_server.connections == 1
+
+    def test_retries_temporary_failure(self, smtp_server, tmp_path):
+        """Test that a 4xx reply is retried."""
+        smtp_server.temporary_failures = 1
+
+        with make_sender(smtp_server) as sender:
+            sender.add(make_pdfs(tmp_path, 1)[0], "APO_BAEREN", "baeren@kim.test", "Harry Heilmann")
+            stats = sender.flush()
+
+        assert stats["sent"] == 1
+        assert len(smtp_server.messages) == 1
+
+    def test_gives_up_after_retry_attempts(self, smtp_server, tmp_path):
+        """Test that a message is reported as failed after all attempts."""
+        smtp_server.temporary_failures = 3
+
+        with make_sender(smtp_server, retry_attempts=3) as sender:
+            sender.add(make_pdfs(tmp_path, 1)[0], "APO_BAEREN", "baeren@kim.test", "Harry Heilmann")
+            stats = sender.flush()
+
+        assert stats == {"sent": 0, "failed": 1, "messages": 0, "done": []}
+        assert smtp_server.messages == []
+
+    def test_reports_keys_of_sent_pdfs(self, smtp_server, tmp_path):
+        """Test that flush() reports the keys of sent PDFs, not of failed ones."""
+        pdfs = make_pdfs(tmp_path, 2)
+        smtp_server.temporary_failures = 1
+
+        with make_sender(smtp_server, retry_attempts=1) as sender:
+            sender.add(pdfs[0], "APO_BAEREN", "baeren@kim.test", "Harry Heilmann", key="a")
+            sender.add(pdfs[1], "APO_FELDTOR", "feldtor@kim.test", "Astrid Pföhler", key="b")
+            stats = sender.flush()
+
+        assert stats["failed"] == 1
+        assert stats["done"] == ["b"]
+
+    def test_dry_run_does_not_connect(self, smtp_server, tmp_path):
+        """Test that nothing is sent in dry-run mode."""
+        with make_sender(smtp_server, dry_run=True) as sender:
+            sender.add(make_pdfs(tmp_path, 1)[0], "APO_BAEREN", "baeren@kim.test", "Harry Heilmann")
+            stats = sender.flush()
+
+        assert stats == {"sent": 0, "failed": 0, "messages": 1, "done": []}
+        assert smtp_server.connections == 0
@@ -0,0 +1,290 @@
+"""
+Tests for lease-based claiming of input PDFs (multi-node mode).
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.file_router import RoutingManifest, route_pdf
+from src.lease import LeaseManager, exclusive_lock
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+def make_pdfs(folder, count):
+    """Create small PDF files with distinct content."""
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = folder / f"rezept_{i:03d}.pdf"
+        path.write_bytes(b"%PDF-1.4 rezept " + str(i).encode())
+        paths.append(path)
+    return paths
+
+
+def claim_worker(input_folder, lease_folder, done_folder, node_id):
+    """
+    One node: claim, "process" (record and move away) and release PDFs.
+
+    Processing a PDF a second time fails to create its record.
+    """
+    claims = LeaseManager(Path(lease_folder), node_id, ttl=30, renew_interval=0)
+    pdf_files = sorted(Path(input_folder).glob("*.pdf"))
+    for batch in claims.claim_batches(pdf_files, 2):
+        for pdf_path in batch:
+            with open(Path(done_folder) / (pdf_path.name + ".txt"), "x") as f:
+                f.write(node_id)
+            time.sleep(0.005)
+            pdf_path.rename(Path(done_folder) / pdf_path.name)
+        claims.release(batch)
+
+
+def route_worker(input_folder, output_folder, start, count):
+    """Route PDFs by copying them, updating the shared routing manifest."""
+    for i in range(start, start + count):
+        route_pdf(Path(input_folder) / f"rezept_{i:03d}.pdf", "APO_FELDTOR", output_folder=Path(output_folder), mode="copy")
+
+
+class TestLeaseManager:
+    """Tests for LeaseManager class."""
+
+    def test_one_node_wins(self, tmp_path):
+        """Test that a claimed PDF cannot be claimed by another node."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        first = LeaseManager(tmp_path / "leases", "node-a")
+        second = LeaseManager(tmp_path / "leases", "node-b")
+
+        assert first.claim(pdf_path)
+        assert not second.claim(pdf_path)
+        assert first.held() == [pdf_path]
+        assert second.held() == []
+
+    def test_release_of_moved_pdf_removes_lease(self, tmp_path):
+        """Test that the lease of a PDF that left the input folder is removed."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        claims = LeaseManager(tmp_path / "leases", "node-a")
+        claims.claim(pdf_path)
+        pdf_path.unlink()
+
+        claims.release([pdf_path])
+
+        assert list((tmp_path / "leases").iterdir()) == []
+
+    def test_done_marker_blocks_until_file_changes(self, tmp_path):
+        """Test that a processed PDF left in input is only claimed again once changed."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        first = LeaseManager(tmp_path / "leases", "node-a")
+        second = LeaseManager(tmp_path / "leases", "node-b")
+        first.claim(pdf_path)
+        first.release([pdf_path])
+
+        assert second.is_done(pdf_path)
+        assert not second.claim(pdf_path)
+
+        pdf_path.write_bytes(b"%PDF-1.4 new content")
+        assert second.claim(pdf_path)
+        assert second.taken_over == 0
+
+    def test_expired_lease_taken_over(self, tmp_path):
+        """Test that another node takes over a lease that was not renewed."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        dead = LeaseManager(tmp_path / "leases", "node-a", ttl=0.05)
+        alive = LeaseManager(tmp_path / "leases", "node-b", ttl=30)
+        dead.claim(pdf_path)
+        time.sleep(0.1)
+
+        assert alive.claim(pdf_path)
+        assert alive.taken_over == 1
+        # The old owner notices and leaves the new lease alone
+        assert dead.renew() == 0
+        dead.release([pdf_path])
+        lease = json.loads(alive.lease_path(pdf_path).read_text())
+        assert lease["owner"] == "node-b"
+
+    def test_renewed_lease_not_taken_over(self, tmp_path):
+        """Test that renewing keeps a lease valid past its original expiry."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        owner = LeaseManager(tmp_path / "leases", "node-a", ttl=0.5)
+        other = LeaseManager(tmp_path / "leases", "node-b")
+        owner.claim(pdf_path)
+        time.sleep(0.3)
+
+        assert owner.renew() == 1
+        time.sleep(0.3)
+        assert not other.claim(pdf_path)
+
+    def test_renewal_does_not_overwrite_done_marker(self, tmp_path):
+        """Test that a release during a renewal keeps its done marker."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        claims = LeaseManager(tmp_path / "leases", "node-a", ttl=30)
+        claims.claim(pdf_path)
+        read = claims._read
+        releases = []
+
+        def read_and_release(lease_path):
+            # The processing thread releases the PDF while the renewal
+            # thread is between reading and rewriting the lease
+            lease = read(lease_path)
+            if not releases:
+                releases.append(threading.Thread(target=claims.release, args=([pdf_path],)))
+                releases[0].start()
+                releases[0].join(0.2)
+            return lease
+
+        claims._read = read_and_release
+        claims.renew()
+        releases[0].join()
+
+        lease = json.loads(claims.lease_path(pdf_path).read_text())
+        assert "done" in lease
+        assert "expires" not in lease
+        assert claims.held() == []
+
+    def test_renewal_excludes_takeover(self, tmp_path):
+        """Test that another node cannot take over a lease while it is being renewed."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        owner = LeaseManager(tmp_path / "leases", "node-a", ttl=0.05)
+        other = LeaseManager(tmp_path / "leases", "node-b")
+        owner.claim(pdf_path)
+        time.sleep(0.1)
+        read = owner._read
+        takeovers = []
+
+        def read_and_take_over(lease_path):
+            # The lease has expired: node B tries to take it over between
+            # node A reading and rewriting it
+            lease = read(lease_path)
+            if not takeovers:
+                takeovers.append(other.claim(pdf_path))
+            return lease
+
+        owner._read = read_and_take_over
+
+        assert owner.renew() == 1
+        assert takeovers == [False]
+        assert other.held() == []
+        lease = json.loads(owner.lease_path(pdf_path).read_text())
+        assert lease["owner"] == "node-a"
+
+    def test_abandon_frees_unprocessed_pdfs(self, tmp_path):
+        """Test that claimed but unprocessed PDFs can be claimed right away."""
+        pdf_path = make_pdfs(tmp_path / "input", 1)[0]
+        first = LeaseManager(tmp_path / "leases", "node-a")
+        second = LeaseManager(tmp_path / "leases", "node-b")
+        first.claim(pdf_path)
+
+        first.abandon()
+
+        assert second.claim(pdf_path)
+
+    def test_prune_removes_markers_of_gone_pdfs(self, tmp_path):
+        """Test that done markers of PDFs no longer in input are removed."""
+        pdf_files = make_pdfs(tmp_path / "input", 2)
+        claims = LeaseManager(tmp_path / "leases", "node-a")
+        for pdf_path in pdf_files:
+            claims.claim(pdf_path)
+        claims.release(pdf_files)
+        pdf_files[0].unlink()
+
+        assert claims.prune(tmp_path / "input") == 1
+        assert claims.is_done(pdf_files[1])
+
+    def test_each_pdf_processed_once_by_several_processes(self, tmp_path):
+        """Test that four processes sharing a folder process every PDF exactly once."""
+        pdf_files = make_pdfs(tmp_path / "input", 60)
+        done_folder = tmp_path / "done"
+        done_folder.mkdir()
+
+        processes = [
+            multiprocessing.Process(
+                target=claim_worker,
+                args=(str(tmp_path / "input"), str(tmp_path / "leases"), str(done_folder), f"node-{i}"),
+            )
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+
+        assert [process.exitcode for process in processes] == [0] * 4
+        records = sorted(done_folder.glob("*.txt"))
+        assert len(records) == len(pdf_files)
+        assert list((tmp_path / "input").glob("*.pdf")) == []
+        # The work was shared
+        assert len({record.read_text() for record in records}) > 1
+
+
+class TestSharedRouting:
+    """Tests for routing from several processes into one output folder."""
+
+    def test_exclusive_lock_serializes_threads(self, tmp_path):
+        """Test that read-modify-write under the lock loses no updates."""
+        counter = tmp_path / "counter.txt"
+        counter.write_text("0")
+
+        def increment():
+            for _ in range(50):
+                with exclusive_lock(tmp_path / "counter.lock"):
+                    counter.write_text(str(int(counter.read_text()) + 1))
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert counter.read_text() == "200"
+
+    def test_manifest_counts_all_processes(self, tmp_path):
+        """Test that the routing manifest counts files routed by concurrent processes."""
+        make_pdfs(tmp_path / "input", 40)
+        output = tmp_path / "output"
+
+        processes = [
+            multiprocessing.Process(target=route_worker, args=(str(tmp_path / "input"), str(output), i * 10, 10))
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+
+        assert [process.exitcode for process in processes] == [0] * 4
+        assert RoutingManifest(output).counts() == {"APO_FELDTOR": 40}
+        assert RoutingManifest(output).verify() == {}
+
+    def test_main_nodes_share_input_folder(self, tmp_path):
+        """Test that several main.py --node processes route every PDF exactly once."""
+        pdf_files = make_pdfs(tmp_path / "input", 30)
+        (tmp_path / "data").mkdir()
+        (tmp_path / "data" / "patient_apo_mapping.csv").write_text("Nachname;Vorname\n", encoding="utf-8")
+        (tmp_path / "data" / "KIM_apo_mapping.CSV").write_text("KIM_APO;KIM_ADDR;APO_NAME\n", encoding="utf-8")
+        env = dict(os.environ, EREZEPT_BASE_DIR=str(tmp_path))
+
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "main.py", "--node", "--node-id", f"node-{i}"],
+                cwd=PROJECT_DIR,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+            for i in range(3)
+        ]
+        outputs = [process.communicate(timeout=120)[0] for process in processes]
+
+        routed = sorted(path.name for path in (tmp_path / "output").rglob("*.pdf"))
+        assert routed == sorted(path.name for path in pdf_files), "\n".join(outputs)
+        assert list((tmp_path / "input").glob("*.pdf")) == []
+        assert list((tmp_path / "input" / ".leases").glob("*.lease")) == []
+        assert RoutingManifest(tmp_path / "output").verify() == {}
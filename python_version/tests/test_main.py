@@ -0,0 +1,218 @@
+"""
+Tests for the routing steps in main.py.
+"""
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+from main import handle_analysis, new_results, process_batch
+from src.duplicate_index import DuplicateIndex
+from src.pdf_processor import extract_patient_info
+
+
+PATIENTS = ["Harry Heilmann", "Astrid Pföhler", "Unbekannt Person"]
+
+
+def stub_analyze(pdf_path, file_hash=None):
+    """
+    analyze_pdf() stand-in for serial and pool runs (module level, so it pickles).
+    
+    The PDF holds "<patient index> <delay>"; earlier files take longer, so
+    the pool finishes them out of input order.
+    """
+    index, delay = pdf_path.read_text().split()
+    time.sleep(float(delay))
+    name = PATIENTS[int(index)]
+    return {
+        "text_ok": True,
+        "patient_info": {"name": name, "full_name": name, "birth_date": "01.01.1950"},
+        "source": "text_layer" if int(index) else "ocr",
+        "pages": 1,
+        "groups": None,
+        "cache_hits": 0,
+        "cache_misses": 1,
+        "timings": {"ocr": {"wall": 0.01, "cpu": 0.01}},
+        "error": None,
+    }
+
+
+class FakeLookup:
+    """Patient lookup with a fixed name -> pharmacy table."""
+    
+    PHARMACIES = {"Harry Heilmann": "APO_FELDTOR", "Astrid Pföhler": "APO_MUEHLEN"}
+    
+    def find_pharmacy(self, name, birth_date):
+        return self.PHARMACIES.get(name)
+    
+    def get_kim_address(self, apo_key):
+        return None
+
+
+def group(pages, name=None, birth_date=None):
+    """Page group as produced by analyze_pdf."""
+    info = extract_patient_info(f"für geboren am\n{name} {birth_date}\n") if name else None
+    return {"pages": pages, "patient_info": info, "source": "text_layer", "text_ok": True}
+
+
+def multi_patient_analysis(groups):
+    """analyze_pdf result for a PDF with several patients."""
+    return {
+        "text_ok": True,
+        "patient_info": groups[0]["patient_info"],
+        "source": "text_layer",
+        "pages": groups[-1]["pages"][-1],
+        "groups": groups,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "timings": {},
+        "error": None,
+    }
+
+
+class TestHandleSplit:
+    """Tests for routing PDFs with several patients."""
+    
+    def test_parts_routed_per_patient(self, tmp_path, monkeypatch):
+        """Test that each part goes to its patient's pharmacy."""
+        pdf_path = tmp_path / "sammel.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 sammel")
+        routed = []
+        
+        def fake_split(path, page_groups):
+            parts = []
+            for pages in page_groups:
+                part = tmp_path / f"{path.stem}_p{pages[0]}.pdf"
+                part.write_bytes(b"%PDF-1.4 part")
+                parts.append(part)
+            return parts
+        
+        def fake_route(path, apo_key, patient_info=None):
+            routed.append((path.name, apo_key))
+            return tmp_path / (apo_key or "unklar") / path.name
+        
+        monkeypatch.setattr(main, "split_pdf", fake_split)
+        monkeypatch.setattr(main, "route_pdf", fake_route)
+        duplicates = DuplicateIndex(tmp_path / "hashes.txt")
+        results = new_results()
+        analysis = multi_patient_analysis([
+            group([1, 2], "Harry Heilmann", "29.04.1949"),
+            group([3], "Astrid Pföhler", "27.03.1939"),
+            group([4], "Unbekannt Person", "01.01.1900"),
+        ])
+        
+        handle_analysis(pdf_path, analysis, FakeLookup(), results, "a" * 64, duplicates)
+        
+        assert routed == [
+            ("sammel_p1.pdf", "APO_FELDTOR"),
+            ("sammel_p3.pdf", "APO_MUEHLEN"),
+            ("sammel_p4.pdf", None),
+        ]
+        assert results["success"] == 2
+        assert results["no_pharmacy"] == 1
+        assert "a" * 64 in duplicates
+        assert not pdf_path.exists()
+    
+    def test_parts_removed_in_copy_mode(self, tmp_path, monkeypatch):
+        """Test that routed copies of the parts leave nothing in the split folder."""
+        pdf_path = tmp_path / "sammel.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 sammel")
+        split_folder = tmp_path / "split"
+        split_folder.mkdir()
+        
+        def fake_split(path, page_groups):
+            parts = []
+            for pages in page_groups:
+                part = split_folder / f"{path.stem}_p{pages[0]}.pdf"
+                part.write_bytes(b"%PDF-1.4 part")
+                parts.append(part)
+            return parts
+        
+        def copy_route(path, apo_key, patient_info=None):
+            dest = tmp_path / (apo_key or "unklar") / path.name
+            dest.parent.mkdir(exist_ok=True)
+            dest.write_bytes(path.read_bytes())
+            return dest
+        
+        monkeypatch.setattr(main, "ROUTING_MODE", "copy")
+        monkeypatch.setattr(main, "split_pdf", fake_split)
+        monkeypatch.setattr(main, "route_pdf", copy_route)
+        results = new_results()
+        analysis = multi_patient_analysis([
+            group([1], "Harry Heilmann", "29.04.1949"),
+            group([2], "Unbekannt Person", "01.01.1900"),
+        ])
+        
+        handle_analysis(pdf_path, analysis, FakeLookup(), results)
+        
+        assert list(split_folder.iterdir()) == []
+        assert (tmp_path / "APO_FELDTOR" / "sammel_p1.pdf").exists()
+        assert (tmp_path / "unklar" / "sammel_p2.pdf").exists()
+        assert pdf_path.exists()
+    
+    def test_failed_split_routes_whole_pdf(self, tmp_path, monkeypatch):
+        """Test that the unsplit PDF goes to 'unklar' when splitting fails."""
+        pdf_path = tmp_path / "sammel.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 sammel")
+        routed = []
+        
+        def failing_split(path, page_groups):
+            raise FileNotFoundError("pdfseparate")
+        
+        monkeypatch.setattr(main, "split_pdf", failing_split)
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: routed.append((path.name, apo_key)))
+        results = new_results()
+        analysis = multi_patient_analysis([
+            group([1], "Harry Heilmann", "29.04.1949"),
+            group([2], "Astrid Pföhler", "27.03.1939"),
+        ])
+        
+        handle_analysis(pdf_path, analysis, FakeLookup(), results)
+        
+        assert routed == [("sammel.pdf", None)]
+        assert results["error"] == 1
+
+
+class TestProcessBatch:
+    """Tests for serial and parallel batches."""
+    
+    def run_batch(self, tmp_path, monkeypatch, pool):
+        """Process the same eight PDFs and return (routed files, results)."""
+        input_folder = tmp_path / "input"
+        input_folder.mkdir(exist_ok=True)
+        pdf_files = []
+        for i in range(8):
+            pdf_path = input_folder / f"rezept_{i}.pdf"
+            pdf_path.write_text(f"{i % 3} {0.01 * (8 - i)}")
+            pdf_files.append(pdf_path)
+        routed = []
+        
+        def fake_route(path, apo_key, *args):
+            routed.append((path.name, apo_key))
+            return tmp_path / (apo_key or "unklar") / path.name
+        
+        monkeypatch.setattr(main, "analyze_pdf", stub_analyze)
+        monkeypatch.setattr(main, "route_pdf", fake_route)
+        results = new_results()
+        
+        process_batch(pdf_files, FakeLookup(), results, pool)
+        
+        return routed, results
+    
+    def test_parallel_matches_serial(self, tmp_path, monkeypatch):
+        """Test that a process pool routes in input order with the same counters."""
+        serial = self.run_batch(tmp_path, monkeypatch, None)
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            parallel = self.run_batch(tmp_path, monkeypatch, pool)
+        
+        routed, results = serial
+        assert [name for name, _ in routed] == [f"rezept_{i}.pdf" for i in range(8)]
+        assert results["success"] == 6
+        assert results["no_pharmacy"] == 2
+        assert results["ocr"] == 3
+        assert results["cache_misses"] == 8
+        assert parallel == serial
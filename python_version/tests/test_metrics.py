@@ -0,0 +1,108 @@
+"""
+Tests for metrics module.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.metrics import MetricsLog, StageTimer, STATUS_ROUTED, percentile
+
+
+class TestStageTimer:
+    """Tests for StageTimer class."""
+    
+    def test_repeated_stages_are_summed(self):
+        """Test that timing a stage twice adds up both runs."""
+        timer = StageTimer()
+        with timer.stage("ocr"):
+            time.sleep(0.01)
+        with timer.stage("ocr"):
+            time.sleep(0.01)
+        
+        assert timer.timings["ocr"]["wall"] >= 0.02
+    
+    def test_cpu_time_of_busy_loop(self):
+        """Test that CPU-bound work shows up as CPU time."""
+        timer = StageTimer()
+        with timer.stage("parse"):
+            # Spin for 50 ms of this thread's CPU time, however busy the machine is
+            end = time.thread_time() + 0.05
+            while time.thread_time() < end:
+                pass
+        
+        assert timer.timings["parse"]["cpu"] >= 0.05
+        assert timer.timings["parse"]["wall"] >= 0.05
+    
+    def test_merge(self):
+        """Test merging timings from a worker process."""
+        timer = StageTimer()
+        timer.add("ocr", 1.0, 0.5)
+        timer.merge({"ocr": {"wall": 2.0, "cpu": 1.5}, "render": {"wall": 0.5, "cpu": 0.4}})
+        
+        assert timer.timings["ocr"] == {"wall": 3.0, "cpu": 2.0}
+        assert timer.timings["render"] == {"wall": 0.5, "cpu": 0.4}
+
+
+class TestMetricsLog:
+    """Tests for MetricsLog class."""
+    
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile([7], 0.95) == 7
+    
+    def test_record_writes_jsonl(self, tmp_path):
+        """Test that an entry uses the PowerShell log fields plus the stages."""
+        metrics = MetricsLog(tmp_path)
+        metrics.timer(Path("a.pdf")).add("ocr", 1.25, 1.0)
+        metrics.record(Path("a.pdf"), STATUS_ROUTED, "Routed", "Harry Heilmann", "APO_BAEREN", "ab" * 32, "ocr_roi")
+        
+        lines = next(tmp_path.glob("metrics_*.jsonl")).read_text(encoding="utf-8").splitlines()
+        entry = json.loads(lines[0])
+        
+        assert len(lines) == 1
+        assert entry["status"] == "ROUTED"
+        assert entry["pharmacy"] == "APO_BAEREN"
+        assert entry["file_hash"] == "ab" * 32
+        assert entry["source"] == "ocr_roi"
+        assert entry["timestamp"].endswith("Z")
+        assert entry["stages"] == {"ocr": {"wall_ms": 1250.0, "cpu_ms": 1000.0}}
+    
+    def test_stage_summary(self, tmp_path):
+        """Test p50 / p95 / max per stage over several documents."""
+        metrics = MetricsLog(tmp_path, enabled=False)
+        for i in range(1, 21):
+            pdf_path = Path(f"{i}.pdf")
+            metrics.timer(pdf_path).add("ocr", i / 10, 0.0)
+            metrics.timer(pdf_path).add("route", 0.001, 0.0)
+            metrics.record(pdf_path, STATUS_ROUTED, "Routed")
+        
+        summary = metrics.stage_summary()
+        
+        assert list(summary) == ["ocr", "route"]
+        assert summary["ocr"]["count"] == 20
+        assert summary["ocr"]["p50"] == 1.0
+        assert summary["ocr"]["p95"] == 1.9
+        assert summary["ocr"]["max"] == 2.0
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_summary_samples_bounded(self, tmp_path):
+        """Test that only the last timings are kept, while count and max cover all."""
+        metrics = MetricsLog(tmp_path, enabled=False, max_samples=10)
+        for i in range(1, 101):
+            metrics.add_sample("mail", 10.0 if i == 5 else i / 1000)
+        
+        summary = metrics.stage_summary()
+        
+        assert len(metrics._samples["mail"]) == 10
+        assert summary["mail"]["count"] == 100
+        assert summary["mail"]["max"] == 10.0
+        assert summary["mail"]["p50"] == 0.095
+        assert metrics.histograms()["mail"]["count"] == 100
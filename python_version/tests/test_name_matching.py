@@ -0,0 +1,72 @@
+"""
+Tests for fuzzy name matching module.
+"""
+import pytest
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.name_matching import best_fuzzy_match, bounded_edit_distance, fold_name
+
+
+class TestFoldName:
+    """Tests for fold_name function."""
+    
+    def test_umlauts_and_eszett(self):
+        """Test that umlauts lose their dots and ß becomes s."""
+        assert fold_name("Pföhler") == "pfohler"
+        assert fold_name("Großmann") == "grosmann"
+    
+    def test_punctuation_and_spacing(self):
+        """Test that punctuation and extra spaces are dropped."""
+        assert fold_name("  Anna-Lena   Müller ") == "anna lena muller"
+
+
+class TestBoundedEditDistance:
+    """Tests for bounded_edit_distance function."""
+    
+    def test_distances(self):
+        """Test plain Levenshtein distances within the bound."""
+        assert bounded_edit_distance("grosmann", "grofmann", 2) == 1
+        assert bounded_edit_distance("heilmann", "heilmann", 2) == 0
+        assert bounded_edit_distance("hartje", "harte", 2) == 1
+    
+    def test_exceeds_bound(self):
+        """Test that distances above the bound return None."""
+        assert bounded_edit_distance("schmidt", "meier", 2) is None
+        assert bounded_edit_distance("a", "abcd", 2) is None
+
+
+class TestBestFuzzyMatch:
+    """Tests for best_fuzzy_match function."""
+    
+    CANDIDATES = ["elisabeth großmann", "astrid pföhler", "harry heilmann"]
+    
+    def test_ocr_eszett_error(self):
+        """Test that "Grofmann" matches "Großmann"."""
+        name, confidence = best_fuzzy_match("Elisabeth Grofmann", self.CANDIDATES)
+        assert name == "elisabeth großmann"
+        assert confidence > 0.9
+    
+    def test_missing_umlaut(self):
+        """Test that "Pfohler" matches "Pföhler" with full confidence."""
+        assert best_fuzzy_match("Astrid Pfohler", self.CANDIDATES) == ("astrid pföhler", 1.0)
+    
+    def test_reversed_order(self):
+        """Test that "Nachname Vorname" order matches."""
+        name, _ = best_fuzzy_match("Heilman Harry", self.CANDIDATES)
+        assert name == "harry heilmann"
+    
+    def test_no_match(self):
+        """Test that a different name does not match."""
+        assert best_fuzzy_match("Bernd Messerschmidt", self.CANDIDATES) is None
+    
+    def test_ambiguous(self):
+        """Test that two equally close candidates return None."""
+        assert best_fuzzy_match("Hans Maier", ["hans meier", "hans mayer"]) is None
+    
+    def test_threshold(self):
+        """Test that a distant match is rejected by the threshold."""
+        assert best_fuzzy_match("Ute Bar", ["ute baum"], threshold=0.9) is None
@@ -0,0 +1,75 @@
+"""
+Tests for OCR cache module.
+"""
+import pytest
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.ocr_cache import OCRCache
+
+
+class TestOCRCache:
+    """Tests for OCRCache class."""
+    
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Create an empty cache in a temporary folder."""
+        ocr_cache = OCRCache(tmp_path / "ocr_cache.sqlite3", max_bytes=100)
+        yield ocr_cache
+        ocr_cache.close()
+    
+    def test_miss_then_hit(self, cache):
+        """Test that stored text is returned and counted as a hit."""
+        key = OCRCache.make_key("abc", "deu", 300, 1)
+        
+        assert cache.get(key) is None
+        cache.put(key, "für geboren am")
+        assert cache.get(key) == "für geboren am"
+        assert (cache.hits, cache.misses) == (1, 1)
+    
+    def test_key_includes_settings(self, cache):
+        """Test that different OCR settings do not share entries."""
+        cache.put(OCRCache.make_key("abc", "deu", 300, 1), "full page")
+        
+        assert cache.get(OCRCache.make_key("abc", "deu", 200, 6, (0, 0, 1, 0.35))) is None
+        assert cache.get(OCRCache.make_key("abc", "deu", 300, 1, threshold=160)) is None
+    
+    def test_lru_eviction(self, cache):
+        """Test that the least recently used entry is evicted first."""
+        cache.put("a", "x" * 40)
+        cache.put("b", "x" * 40)
+        cache.get("a")
+        cache.put("c", "x" * 40)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.size() <= 100
+    
+    def test_put_keeps_running_size(self, cache):
+        """Test that put() tracks the size without summing the table."""
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        cache.put("a", "x" * 30)
+        cache.put("a", "x" * 20)
+        cache.put("b", "x" * 50)
+        cache.put("c", "x" * 50)
+        cache._conn.set_trace_callback(None)
+        
+        assert not any("SUM(" in statement for statement in statements)
+        assert cache._total == cache.size() == 100
+        assert cache.get("a") is None
+    
+    def test_persistent(self, tmp_path):
+        """Test that entries survive reopening the database."""
+        db_path = tmp_path / "ocr_cache.sqlite3"
+        first = OCRCache(db_path)
+        first.put("key", "text")
+        first.close()
+        
+        second = OCRCache(db_path)
+        assert second.get("key") == "text"
+        second.close()
@@ -2,13 +2,23 @@
 Tests for PDF processor module.
 """
 import pytest
+import shutil
 import sys
+import threading
+import time
 from pathlib import Path
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.pdf_processor import extract_patient_info
+from src import pdf_processor
+from src.pdf_processor import (
+    analyze_pdf,
+    create_ocr_engine,
+    extract_patient_info,
+    group_pages,
+    render_page,
+)
 
 
 class TestExtractPatientInfo:
@@ -89,6 +99,29 @@ geboren am
         # Should return None because "Frank" is in the exclusion list
         assert result is None
     
+    def test_layout_format(self):
+        """Test that the matched layout is reported."""
+        same_line = extract_patient_info("für geboren am\nHarry Heilmann 29.04.1949\n")
+        separate = extract_patient_info("für\nAstrid Pföhler\nausgestellt von\ngeboren am\n27.03.1939\n")
+        flexible = extract_patient_info("für\nAstrid Pföhler ausgestellt\ngeboren am\n27.03.1939\n")
+        
+        assert same_line["format"] == "A"
+        assert separate["format"] == "B"
+        assert flexible["format"] == "flexible"
+        assert flexible["name"] == "Astrid Pföhler"
+    
+    def test_uppercase_anchors(self):
+        """Test that the "für geboren am" anchor is matched in any case."""
+        result = extract_patient_info("FÜR GEBOREN AM\nHarry Heilmann 29.04.1949\n")
+        
+        assert result["name"] == "Harry Heilmann"
+    
+    def test_text_with_expanding_lowercase(self):
+        """Test texts where lowercasing changes the length (e.g. "İ")."""
+        result = extract_patient_info("Praxis İstanbul\nfür geboren am\nHarry Heilmann 29.04.1949\n")
+        
+        assert result["birth_date"] == "29.04.1949"
+    
     def test_empty_text(self):
         """Test with empty text."""
         result = extract_patient_info("")
@@ -102,3 +135,280 @@ geboren am
         text = "This is just random text without any patient information."
         result = extract_patient_info(text)
         assert result is None
+
+
+class TestAnalyzePdf:
+    """Tests for analyze_pdf function."""
+    
+    TEXT = """für geboren am
+Harry Heilmann 29.04.1949
+"""
+    
+    @pytest.fixture(autouse=True)
+    def no_ocr_cache(self, monkeypatch):
+        """Run without the on-disk OCR cache."""
+        monkeypatch.setattr(pdf_processor, "get_ocr_cache", lambda: None)
+    
+    def test_text_layer_skips_ocr(self, monkeypatch):
+        """Test that a usable text layer is accepted without OCR."""
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path: self.TEXT)
+        monkeypatch.setattr(
+            pdf_processor, "extract_text_from_pdf",
+            lambda path: pytest.fail("OCR must not run")
+        )
+        
+        result = analyze_pdf(Path("rezept.pdf"))
+        
+        assert result["source"] == "text_layer"
+        assert result["patient_info"]["name"] == "Harry Heilmann"
+    
+    def test_falls_back_to_region_ocr(self, monkeypatch):
+        """Test that region OCR runs when the text layer has no patient data."""
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path: "Seite 1")
+        monkeypatch.setattr(
+            pdf_processor, "extract_text_from_pdf", lambda path, **kwargs: self.TEXT
+        )
+        
+        result = analyze_pdf(Path("rezept.pdf"))
+        
+        assert result["source"] == "ocr_roi"
+        assert result["patient_info"]["birth_date"] == "29.04.1949"
+    
+    def test_falls_back_to_full_page_ocr(self, monkeypatch):
+        """Test that the full page is OCRed when the region finds nothing."""
+        calls = []
+        
+        def fake_ocr(path, region=None, **kwargs):
+            calls.append(region)
+            return "Kopfzeile" if region else self.TEXT
+        
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path: None)
+        monkeypatch.setattr(pdf_processor, "extract_text_from_pdf", fake_ocr)
+        
+        result = analyze_pdf(Path("rezept.pdf"))
+        
+        assert result["source"] == "ocr"
+        assert result["patient_info"]["name"] == "Harry Heilmann"
+        assert calls == [pdf_processor.OCR_ROI_BOX, None]
+    
+    def test_reports_stage_timings(self, monkeypatch):
+        """Test that the analysis returns per-stage timings."""
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path: self.TEXT)
+        
+        result = analyze_pdf(Path("rezept.pdf"))
+        
+        assert set(result["timings"]) == {"text_layer", "parse"}
+        assert all(entry["wall"] >= 0 and entry["cpu"] >= 0 for entry in result["timings"].values())
+
+
+def prescription(name, birth_date):
+    """Text of a layout A prescription page."""
+    return f"für geboren am\n{name} {birth_date}\n"
+
+
+def page_result(name=None, birth_date=None):
+    """Page result as produced by analyze_pdf for one page."""
+    info = extract_patient_info(prescription(name, birth_date)) if name else None
+    return {"text_ok": True, "patient_info": info, "source": "text_layer" if info else "ocr"}
+
+
+class TestGroupPages:
+    """Tests for grouping pages per patient."""
+    
+    def test_consecutive_pages_of_one_patient(self):
+        """Test that repeated and patient-less pages join the patient before them."""
+        groups = group_pages([
+            page_result("Harry Heilmann", "29.04.1949"),
+            page_result(),
+            page_result("Harry  Heilmann", "29.04.1949"),
+            page_result("Astrid Pföhler", "27.03.1939"),
+        ])
+        
+        assert [group["pages"] for group in groups] == [[1, 2, 3], [4]]
+        assert groups[1]["patient_info"]["name"] == "Astrid Pföhler"
+    
+    def test_same_name_other_birth_date(self):
+        """Test that a different birth date starts a new group."""
+        groups = group_pages([
+            page_result("Harry Heilmann", "29.04.1949"),
+            page_result("Harry Heilmann", "01.01.1950"),
+        ])
+        
+        assert [group["pages"] for group in groups] == [[1], [2]]
+    
+    def test_leading_pages_without_patient(self):
+        """Test that pages before the first patient form their own group."""
+        groups = group_pages([page_result(), page_result("Astrid Pföhler", "27.03.1939")])
+        
+        assert [group["pages"] for group in groups] == [[1], [2]]
+        assert groups[0]["patient_info"] is None
+    
+    def test_text_source_of_group_after_failed_first_page(self):
+        """Test that a group whose first page failed OCR takes the source of a later page."""
+        failed = {"text_ok": False, "patient_info": None, "source": None}
+        
+        groups = group_pages([failed, page_result()])
+        
+        assert groups[0]["text_ok"] is True
+        assert groups[0]["source"] == "ocr"
+
+
+class TestMultiPageAnalysis:
+    """Tests for analyze_pdf on multi-page PDFs."""
+    
+    @pytest.fixture(autouse=True)
+    def no_ocr_cache(self, monkeypatch):
+        """Run without the on-disk OCR cache."""
+        monkeypatch.setattr(pdf_processor, "get_ocr_cache", lambda: None)
+    
+    def test_text_layer_pages_grouped(self, monkeypatch):
+        """Test that only pages without patient data in the text layer are OCRed."""
+        pages = [
+            prescription("Harry Heilmann", "29.04.1949"),
+            "Seite 2",
+            prescription("Astrid Pföhler", "27.03.1939"),
+        ]
+        ocr_calls = []
+        
+        def fake_ocr(path, page=1, **kwargs):
+            ocr_calls.append(page)
+            return "Seite 2"
+        
+        monkeypatch.setattr(pdf_processor, "get_page_count", lambda path: 3)
+        monkeypatch.setattr(
+            pdf_processor, "extract_text_layer",
+            lambda path, first_page=1, last_page=1: "\f".join(pages[first_page - 1:last_page]) + "\f"
+        )
+        monkeypatch.setattr(pdf_processor, "extract_text_from_pdf", fake_ocr)
+        
+        result = analyze_pdf(Path("sammel.pdf"))
+        
+        assert result["pages"] == 3
+        assert [group["pages"] for group in result["groups"]] == [[1, 2], [3]]
+        assert result["patient_info"]["name"] == "Harry Heilmann"
+        assert result["groups"][1]["source"] == "text_layer"
+        # Region and full page OCR of page 2 only
+        assert ocr_calls == [2, 2]
+    
+    def test_scanned_pages_ocred_in_threads(self, monkeypatch):
+        """Test that every page of a scan is OCRed and grouped."""
+        patients = [
+            ("Harry Heilmann", "29.04.1949"),
+            ("Astrid Pföhler", "27.03.1939"),
+            ("Astrid Pföhler", "27.03.1939"),
+            ("Reinhold Hartje", "14.12.1936"),
+        ]
+        
+        def fake_ocr(path, page=1, timer=None, **kwargs):
+            with timer.stage("ocr"):
+                return prescription(*patients[page - 1])
+        
+        monkeypatch.setattr(pdf_processor, "get_page_count", lambda path: len(patients))
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path, *pages: None)
+        monkeypatch.setattr(pdf_processor, "extract_text_from_pdf", fake_ocr)
+        
+        result = analyze_pdf(Path("scan.pdf"))
+        
+        assert result["error"] is None
+        assert [group["pages"] for group in result["groups"]] == [[1], [2, 3], [4]]
+        assert [group["source"] for group in result["groups"]] == ["ocr_roi"] * 3
+        assert result["timings"]["ocr"]["wall"] >= 0
+    
+    def test_page_threads_reused_across_pdfs(self, monkeypatch):
+        """Test that later PDFs are OCRed by the same threads (one OCR API each)."""
+        threads = set()
+        
+        def fake_ocr(path, page=1, **kwargs):
+            threads.add(threading.current_thread())
+            time.sleep(0.01)
+            return "Seite"
+        
+        monkeypatch.setattr(pdf_processor, "get_page_count", lambda path: 4)
+        monkeypatch.setattr(pdf_processor, "extract_text_layer", lambda path, *pages: None)
+        monkeypatch.setattr(pdf_processor, "extract_text_from_pdf", fake_ocr)
+        
+        analyze_pdf(Path("scan_1.pdf"))
+        first = set(threads)
+        for number in range(2, 6):
+            analyze_pdf(Path(f"scan_{number}.pdf"))
+        
+        assert threads == first
+        assert len(threads) <= pdf_processor.PAGE_OCR_THREADS
+
+
+class TestOCREngine:
+    """Tests for the OCR engine selection."""
+    
+    def test_unknown_engine(self):
+        """Test that a misspelled engine name is rejected."""
+        with pytest.raises(ValueError):
+            create_ocr_engine("tesseract")
+    
+    def test_tesserocr_reads_prescription(self):
+        """Test that the in-process engine reads a rendered prescription."""
+        pytest.importorskip("tesserocr")
+        from PIL import Image, ImageDraw, ImageFont
+        
+        try:
+            engine = create_ocr_engine("tesserocr")
+        except ImportError:
+            pytest.skip("no OCR engine installed")
+        if engine.name != "tesserocr":
+            pytest.skip("tesserocr could not be initialized")
+        
+        image = Image.new("L", (1400, 300), 255)
+        draw = ImageDraw.Draw(image)
+        try:
+            font = ImageFont.truetype("DejaVuSans.ttf", size=36)
+        except OSError:
+            pytest.skip("DejaVuSans font not available")
+        draw.text((40, 40), "für geboren am", fill=0, font=font)
+        draw.text((40, 120), "Harry Heilmann 29.04.1949", fill=0, font=font)
+        
+        # The same engine (and API) serves repeated calls
+        texts = [engine.image_to_string(image, 6) for _ in range(2)]
+        
+        assert texts[0] == texts[1]
+        assert extract_patient_info(texts[0])["name"] == "Harry Heilmann"
+
+
+@pytest.mark.skipif(not shutil.which("pdftoppm"), reason="poppler (pdftoppm) not installed")
+class TestRenderPage:
+    """Tests for rendering pages into memory."""
+    
+    @pytest.fixture
+    def pdf_path(self, tmp_path):
+        """Two-page image PDF: a black bar on white, then a gray page."""
+        from PIL import Image, ImageDraw
+        
+        first = Image.new("RGB", (400, 200), "white")
+        ImageDraw.Draw(first).rectangle((0, 0, 399, 49), fill="black")
+        second = Image.new("RGB", (400, 200), (128, 128, 128))
+        path = tmp_path / "pages.pdf"
+        first.save(path, save_all=True, append_images=[second], resolution=100)
+        return path
+    
+    def test_grayscale(self, pdf_path):
+        """Test that a page is rendered as a single-channel image."""
+        image = render_page(pdf_path, 1, 100)
+        
+        assert image.mode == "L"
+        assert image.size == (400, 200)
+        assert image.getpixel((200, 10)) < 64
+        assert image.getpixel((200, 150)) > 192
+    
+    def test_page_and_region(self, pdf_path):
+        """Test that the requested page is rendered and cropped."""
+        image = render_page(pdf_path, 2, 100, region=(0, 0, 0.5, 0.25))
+        
+        assert image.size == (200, 50)
+        assert 96 < image.getpixel((10, 10)) < 160
+    
+    def test_threshold(self, pdf_path):
+        """Test that a threshold binarizes the page."""
+        dark = render_page(pdf_path, 2, 100, threshold=200)
+        light = render_page(pdf_path, 2, 100, threshold=50)
+        
+        assert dark.mode == "1"
+        assert set(dark.getdata()) == {0}
+        assert set(light.getdata()) == {255}
@@ -0,0 +1,208 @@
+"""
+Tests for the staged pipeline.
+"""
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+from main import new_results
+from src.duplicate_index import DuplicateIndex
+from src.hashing import file_sha256
+from src.metrics import MetricsLog, STATUS_DUPLICATE, STATUS_ROUTED
+from src.pipeline import StagedPipeline
+
+
+def make_pdfs(folder, count, content=None):
+    """Create small PDF files (distinct content unless given)."""
+    paths = []
+    for i in range(count):
+        path = folder / f"rezept_{i:03d}.pdf"
+        path.write_bytes(content or b"%PDF-1.4 rezept " + str(i).encode())
+        paths.append(path)
+    return paths
+
+
+def fake_analyze(pdf_path, file_hash):
+    """Stand-in for analyze_pdf that does no OCR."""
+    return {"pdf": pdf_path.name, "hash": file_hash}
+
+
+class FakeSender:
+    """Records flushes like KIMSender without sending."""
+    
+    def __init__(self):
+        self.queued = []
+        self.flushed = []
+        self._lock = threading.Lock()
+    
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self.queued)
+    
+    def add(self, pdf_path):
+        with self._lock:
+            self.queued.append(pdf_path)
+    
+    def flush(self):
+        with self._lock:
+            batch, self.queued = self.queued, []
+        self.flushed.append(batch)
+        return {"sent": len(batch), "failed": 0, "messages": 1}
+
+
+class FakeLookup:
+    """Patient lookup that knows one patient with a KIM address."""
+    
+    def find_pharmacy(self, name, birth_date):
+        return "APO_FELDTOR"
+    
+    def get_kim_address(self, apo_key):
+        return {"kim_address": "feldtor@kim.test"}
+
+
+class FakeKIMSender(FakeSender):
+    """FakeSender with the KIMSender.add() signature used by main.py."""
+    
+    def add(self, pdf_path, apo_key, kim_address, patient_name, key=None):
+        super().add(pdf_path)
+    
+    def flush(self):
+        stats = super().flush()
+        stats["done"] = []
+        return stats
+
+
+def analyze_patient(pdf_path, file_hash):
+    """Stand-in for analyze_pdf that finds one patient without OCR."""
+    return {
+        "text_ok": True,
+        "patient_info": {"name": "Harry Heilmann", "full_name": "Harry Heilmann", "birth_date": "29.04.1949"},
+        "source": "text_layer",
+        "pages": 1,
+        "groups": None,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "timings": {"text_layer": {"wall": 0.01, "cpu": 0.01}},
+        "error": None,
+    }
+
+
+def make_pipeline(handle, results, **kwargs):
+    """Create a pipeline running the analysis in threads."""
+    options = {
+        "workers": 4,
+        "executor": ThreadPoolExecutor(4),
+        "analyze": fake_analyze,
+        "report_interval": 0,
+    }
+    options.update(kwargs)
+    return StagedPipeline(handle, results, **options)
+
+
+class TestStagedPipeline:
+    """Tests for StagedPipeline class."""
+    
+    def test_every_file_routed_once(self, tmp_path):
+        """Test that each input reaches the route stage exactly once."""
+        pdfs = make_pdfs(tmp_path, 25)
+        routed = []
+        
+        pipeline = make_pipeline(lambda pdf, analysis, file_hash: routed.append(analysis), new_results())
+        pipeline.run(pdfs)
+        
+        assert sorted(item["pdf"] for item in routed) == [pdf.name for pdf in pdfs]
+        assert all(item["hash"] == file_sha256(tmp_path / item["pdf"]) for item in routed)
+    
+    def test_skips_duplicates(self, tmp_path):
+        """Test that known and repeated content never reaches the analysis."""
+        known = tmp_path / "known.pdf"
+        known.write_bytes(b"%PDF-1.4 known")
+        pdfs = make_pdfs(tmp_path, 3, content=b"%PDF-1.4 same") + [known]
+        duplicates = DuplicateIndex(tmp_path / "hashes.txt")
+        duplicates.add(file_sha256(known))
+        results = new_results()
+        routed = []
+        
+        pipeline = make_pipeline(lambda pdf, analysis, file_hash: routed.append(pdf), results, duplicates=duplicates)
+        pipeline.run(pdfs)
+        
+        assert len(routed) == 1
+        assert results["duplicate"] == 3
+    
+    def test_backpressure_bounds_queues(self, tmp_path):
+        """Test that a slow route stage never lets a queue grow past its limit."""
+        pdfs = make_pdfs(tmp_path, 30)
+        routed = []
+        
+        def slow_route(pdf, analysis, file_hash):
+            time.sleep(0.002)
+            routed.append(pdf)
+        
+        pipeline = make_pipeline(slow_route, new_results(), queue_size=3)
+        pipeline.run(pdfs)
+        
+        assert len(routed) == 30
+        assert pipeline.max_depths["route"] <= 3
+        assert all(depth <= 3 for depth in pipeline.max_depths.values())
+    
+    def test_mail_stage_sends_everything(self, tmp_path):
+        """Test that the mail stage flushes all routed files."""
+        pdfs = make_pdfs(tmp_path, 12)
+        sender = FakeSender()
+        results = new_results()
+        
+        pipeline = make_pipeline(lambda pdf, analysis, file_hash: sender.add(pdf), results, sender=sender)
+        pipeline.run(pdfs)
+        
+        assert sorted(pdf for batch in sender.flushed for pdf in batch) == pdfs
+        assert results["kim_sent"] == 12
+        assert sender.pending == 0
+    
+    def test_pipeline_reusable(self, tmp_path):
+        """Test that one pipeline can run several batches (watch mode)."""
+        pdfs = make_pdfs(tmp_path, 6)
+        routed = []
+        
+        pipeline = make_pipeline(lambda pdf, analysis, file_hash: routed.append(pdf), new_results())
+        pipeline.run(pdfs[:3])
+        pipeline.run(pdfs[3:])
+        
+        assert sorted(routed) == pdfs
+    
+    def test_main_pipeline_records_metrics(self, tmp_path, monkeypatch):
+        """Test that main.py's pipeline logs skipped duplicates and the hash and mail stages."""
+        input_folder = tmp_path / "input"
+        input_folder.mkdir()
+        known, new = make_pdfs(input_folder, 2)
+        duplicates = DuplicateIndex(tmp_path / "hashes.txt")
+        duplicates.add(file_sha256(known))
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: tmp_path / apo_key / path.name)
+        results = new_results()
+        metrics = MetricsLog(tmp_path / "logs")
+        
+        with ThreadPoolExecutor(2) as pool:
+            pipeline = main.make_pipeline(FakeLookup(), results, duplicates, FakeKIMSender(), metrics, 2, pool)
+            pipeline.analyze = analyze_patient
+            pipeline.report_interval = 0
+            pipeline.run([known, new])
+        
+        entries = [
+            json.loads(line)
+            for metrics_file in (tmp_path / "logs").glob("metrics_*.jsonl")
+            for line in metrics_file.read_text(encoding="utf-8").splitlines()
+        ]
+        statuses = {entry["file"]: entry["status"] for entry in entries}
+        assert results["duplicate"] == 1
+        assert statuses == {known.name: STATUS_DUPLICATE, new.name: STATUS_ROUTED}
+        assert {"hash", "mail"} <= set(metrics.stage_summary())
+        routed = [entry for entry in entries if entry["file"] == new.name][0]
+        assert "hash" in routed["stages"]
+        assert routed["source"] == "text_layer"
@@ -0,0 +1,58 @@
+"""
+Tests for the start-up path of main.py.
+"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+# Generous budget for an empty run, so slow CI machines do not flake
+STARTUP_BUDGET_SECONDS = 5.0
+
+
+def run_python(args, base_dir):
+    """Run the project's Python code in a fresh interpreter."""
+    env = dict(os.environ, EREZEPT_BASE_DIR=str(base_dir))
+    return subprocess.run(
+        [sys.executable] + args,
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+class TestStartup:
+    """Tests for lazy imports and the empty-folder fast path."""
+
+    def test_import_does_not_load_ocr_dependencies(self, tmp_path):
+        """Test that importing main does not import the OCR and mail stack."""
+        code = (
+            "import sys, main; "
+            "heavy = ['PIL', 'pdf2image', 'pytesseract', 'tesserocr', 'smtplib', 'asyncio', 'cProfile', "
+            "'concurrent.futures.process', 'http.server']; "
+            "print(','.join(name for name in heavy if name in sys.modules))"
+        )
+        completed = run_python(["-c", code], tmp_path)
+
+        assert completed.returncode == 0, completed.stderr
+        assert completed.stdout.strip() == ""
+
+    def test_empty_input_exits_fast_without_csv(self, tmp_path):
+        """Test that an empty input folder exits before the CSV files are read."""
+        start = time.perf_counter()
+        completed = run_python(["main.py"], tmp_path)
+        elapsed = time.perf_counter() - start
+
+        assert completed.returncode == 0, completed.stdout + completed.stderr
+        assert "No PDF files found" in completed.stdout
+        # data/ does not exist, so loading the CSV would have failed
+        assert "[ERROR]" not in completed.stdout
+        assert elapsed < STARTUP_BUDGET_SECONDS
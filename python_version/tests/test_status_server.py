@@ -0,0 +1,195 @@
+"""
+Tests for the live status endpoint (Prometheus metrics).
+"""
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+from main import new_results, process_batch
+from src.metrics import MetricsLog, STATUS_ROUTED
+from src.status_server import RunStatus, StatusServer
+
+ANALYSIS = {
+    "text_ok": True,
+    "patient_info": {"name": "Harry Heilmann", "full_name": "Harry Heilmann", "birth_date": "29.04.1949"},
+    "source": "ocr",
+    "pages": 1,
+    "groups": None,
+    "cache_hits": 0,
+    "cache_misses": 1,
+    "timings": {"ocr": {"wall": 0.3, "cpu": 0.3}},
+    "error": None,
+}
+
+
+def slow_analyze(pdf_path, file_hash=None):
+    """analyze_pdf() stand-in for a process pool (module level, so it pickles)."""
+    time.sleep(0.05)
+    return dict(ANALYSIS)
+
+
+class FakeLookup:
+    """Patient lookup with fixed CSV data."""
+
+    patient_count = 1200
+    kim_count = 7
+
+    def __init__(self):
+        self.loaded_at = time.time() - 30
+
+    def find_pharmacy(self, name, birth_date):
+        return "APO_FELDTOR" if name == "Harry Heilmann" else None
+
+    def get_kim_address(self, apo_key):
+        return None
+
+
+def samples(text):
+    """Parse the exposition text into {"name{labels}": value}."""
+    return {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line and not line.startswith("#")
+    }
+
+
+class TestRunStatus:
+    """Tests for RunStatus class."""
+
+    def test_backlog_and_in_flight(self):
+        """Test that documents move from the backlog to in flight to done."""
+        status = RunStatus(new_results())
+        status.queue(3)
+        status.start(Path("a.pdf"))
+        status.start(Path("a.pdf"))
+
+        values = samples(status.render())
+        assert values["erezept_backlog_documents"] == 2
+        assert values["erezept_in_flight_documents"] == 1
+        assert values["erezept_oldest_in_flight_seconds"] >= 0
+        assert "erezept_last_document_timestamp_seconds" not in values
+
+        status.finish(Path("a.pdf"))
+        values = samples(status.render())
+        assert values["erezept_in_flight_documents"] == 0
+        assert values["erezept_oldest_in_flight_seconds"] == 0
+        assert values["erezept_last_document_timestamp_seconds"] > 0
+
+    def test_counters_from_results(self):
+        """Test that documents per status are read from the summary counters."""
+        results = new_results()
+        results.update(success=5, no_patient=2, error=1, kim_sent=4)
+        status = RunStatus(results, lookup=FakeLookup())
+
+        values = samples(status.render())
+        assert values['erezept_documents_total{status="success"}'] == 5
+        assert values['erezept_documents_total{status="no_patient"}'] == 2
+        assert values['erezept_documents_total{status="no_pharmacy"}'] == 0
+        assert values['erezept_documents_total{status="error"}'] == 1
+        assert values['erezept_kim_pdfs_total{result="sent"}'] == 4
+        assert values["erezept_csv_patients"] == 1200
+        assert values["erezept_csv_kim_addresses"] == 7
+        assert 29 <= values["erezept_csv_age_seconds"] < 60
+
+    def test_stage_histograms(self, tmp_path):
+        """Test that stage timings are exported as cumulative histograms."""
+        metrics = MetricsLog(tmp_path, enabled=False, buckets=(0.1, 1.0))
+        for wall in (0.05, 0.5, 0.7, 3.0):
+            metrics.timer(Path(f"{wall}.pdf")).add("ocr", wall, wall)
+            metrics.record(Path(f"{wall}.pdf"), STATUS_ROUTED, "Routed")
+        status = RunStatus(new_results(), metrics)
+
+        text = status.render()
+        values = samples(text)
+        assert "# TYPE erezept_stage_duration_seconds histogram" in text
+        assert values['erezept_stage_duration_seconds_bucket{stage="ocr",le="0.1"}'] == 1
+        assert values['erezept_stage_duration_seconds_bucket{stage="ocr",le="1"}'] == 3
+        assert values['erezept_stage_duration_seconds_bucket{stage="ocr",le="+Inf"}'] == 4
+        assert values['erezept_stage_duration_seconds_count{stage="ocr"}'] == 4
+        assert values['erezept_stage_duration_seconds_sum{stage="ocr"}'] == pytest.approx(4.25)
+
+    def test_process_batch_reports_progress(self, tmp_path, monkeypatch):
+        """Test that process_batch leaves nothing in the backlog or in flight."""
+        input_folder = tmp_path / "input"
+        input_folder.mkdir()
+        pdf_files = []
+        for i in range(3):
+            pdf_path = input_folder / f"rezept_{i}.pdf"
+            pdf_path.write_bytes(b"%PDF-1.4 rezept " + str(i).encode())
+            pdf_files.append(pdf_path)
+        monkeypatch.setattr(main, "analyze_pdf", lambda pdf_path, file_hash=None: dict(ANALYSIS))
+        monkeypatch.setattr(main, "route_pdf", lambda path, apo_key, *args: tmp_path / "out" / path.name)
+        results = new_results()
+        metrics = MetricsLog(tmp_path, enabled=False)
+        status = RunStatus(results, metrics)
+
+        process_batch(pdf_files, FakeLookup(), results, metrics=metrics, status=status)
+
+        values = samples(status.render())
+        assert values['erezept_documents_total{status="success"}'] == 3
+        assert values["erezept_backlog_documents"] == 0
+        assert values["erezept_in_flight_documents"] == 0
+        assert values['erezept_stage_duration_seconds_count{stage="ocr"}'] == 3
+
+    def test_parallel_batch_keeps_backlog(self, tmp_path, monkeypatch):
+        """Test that PDFs the pool has not started on stay in the backlog."""
+        input_folder = tmp_path / "input"
+        input_folder.mkdir()
+        pdf_files = []
+        for i in range(6):
+            pdf_path = input_folder / f"rezept_{i}.pdf"
+            pdf_path.write_bytes(b"%PDF-1.4 rezept " + str(i).encode())
+            pdf_files.append(pdf_path)
+        results = new_results()
+        status = RunStatus(results)
+        backlog = []
+
+        def fake_route(path, apo_key, *args):
+            backlog.append(samples(status.render())["erezept_backlog_documents"])
+            return tmp_path / "out" / path.name
+
+        monkeypatch.setattr(main, "analyze_pdf", slow_analyze)
+        monkeypatch.setattr(main, "route_pdf", fake_route)
+
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            process_batch(pdf_files, FakeLookup(), results, pool, status=status)
+
+        values = samples(status.render())
+        assert results["success"] == 6
+        assert backlog[0] > 0
+        assert backlog == sorted(backlog, reverse=True)
+        assert values["erezept_backlog_documents"] == 0
+        assert values["erezept_in_flight_documents"] == 0
+
+
+class TestStatusServer:
+    """Tests for StatusServer class."""
+
+    def test_serves_metrics(self):
+        """Test that /metrics is served in the Prometheus text format."""
+        results = new_results()
+        results["success"] = 2
+        server = StatusServer(RunStatus(results), host="127.0.0.1", port=0)
+        server.start()
+        try:
+            with urllib.request.urlopen(server.url, timeout=5) as response:
+                body = response.read().decode("utf-8")
+                content_type = response.headers["Content-Type"]
+
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=5)
+        finally:
+            server.stop()
+
+        assert content_type.startswith("text/plain; version=0.0.4")
+        assert samples(body)['erezept_documents_total{status="success"}'] == 2
+        assert error.value.code == 404
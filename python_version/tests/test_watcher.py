@@ -0,0 +1,65 @@
+"""
+Tests for input folder watcher.
+"""
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.watcher import InputWatcher
+
+
+class TestInputWatcher:
+    """Tests for InputWatcher class (polling mode)."""
+    
+    @pytest.fixture
+    def watcher(self, tmp_path):
+        """Create a polling watcher with a short stability window."""
+        input_watcher = InputWatcher(
+            tmp_path, "*.pdf", poll_interval=0.01, stable_seconds=0.05, use_events=False
+        )
+        input_watcher.start()
+        yield input_watcher
+        input_watcher.stop()
+    
+    def test_file_ready_after_stable(self, watcher, tmp_path):
+        """Test that a new file is reported once it stops changing."""
+        pdf_path = tmp_path / "rezept.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4")
+        
+        assert watcher.check() == []
+        time.sleep(0.06)
+        assert watcher.check() == [pdf_path]
+    
+    def test_growing_file_not_ready(self, watcher, tmp_path):
+        """Test that a file still being written is not reported."""
+        pdf_path = tmp_path / "rezept.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4")
+        watcher.check()
+        time.sleep(0.06)
+        pdf_path.write_bytes(b"%PDF-1.4 more data")
+        
+        assert watcher.check() == []
+    
+    def test_file_reported_once(self, watcher, tmp_path):
+        """Test that an unchanged file is not handed out twice."""
+        pdf_path = tmp_path / "rezept.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4")
+        watcher.check()
+        time.sleep(0.06)
+        watcher.check()
+        time.sleep(0.06)
+        
+        assert watcher.check() == []
+        assert watcher.check() == []
+    
+    def test_ignores_other_files(self, watcher, tmp_path):
+        """Test that files not matching the pattern are ignored."""
+        (tmp_path / "notiz.txt").write_text("x")
+        watcher.check()
+        time.sleep(0.06)
+        
+        assert watcher.check() == []